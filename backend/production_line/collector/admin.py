@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Machine, Location, Telemetry, Warning, WarningRule, ServiceRecord, Route, RouteStop
+from .models import Machine, Location, MachineParameterState, RuleWindowState, Telemetry, TelemetryRollup, Warning, WarningRule, ServiceRecord, Route, RouteStop
 
 @admin.register(Machine)
 class MachineAdmin(admin.ModelAdmin):
@@ -14,8 +14,8 @@ class LocationAdmin(admin.ModelAdmin):
 
 @admin.register(WarningRule)
 class WarningRuleAdmin(admin.ModelAdmin):
-    list_display = ('name', 'parameter', 'comparison_operator', 'threshold_value', 'severity')
-    list_filter = ('severity', 'created_by')
+    list_display = ('name', 'parameter', 'rule_type', 'comparison_operator', 'threshold_value', 'clear_threshold', 'severity')
+    list_filter = ('severity', 'rule_type', 'created_by')
     search_fields = ('name', 'parameter')
 
 @admin.register(Telemetry)
@@ -24,9 +24,26 @@ class TelemetryAdmin(admin.ModelAdmin):
     list_filter = ('parameter', 'machine')
     date_hierarchy = 'timestamp'
 
+@admin.register(TelemetryRollup)
+class TelemetryRollupAdmin(admin.ModelAdmin):
+    list_display = ('machine', 'parameter', 'resolution', 'bucket', 'count', 'min_value', 'max_value')
+    list_filter = ('resolution', 'parameter')
+    date_hierarchy = 'bucket'
+
+@admin.register(MachineParameterState)
+class MachineParameterStateAdmin(admin.ModelAdmin):
+    list_display = ('machine', 'parameter', 'value', 'timestamp', 'sample_count')
+    list_filter = ('parameter',)
+    search_fields = ('machine__name', 'machine__serial_number')
+
+@admin.register(RuleWindowState)
+class RuleWindowStateAdmin(admin.ModelAdmin):
+    list_display = ('machine', 'rule', 'updated_at')
+    list_filter = ('rule',)
+
 @admin.register(Warning)
 class WarningAdmin(admin.ModelAdmin):
-    list_display = ('machine', 'description', 'created_at', 'resolved_at', 'is_active')
+    list_display = ('machine', 'description', 'occurrence_count', 'created_at', 'last_seen_at', 'resolved_at', 'is_active')
     list_filter = ('created_at', 'resolved_at')
     search_fields = ('description', 'machine__name')
 
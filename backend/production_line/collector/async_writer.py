@@ -0,0 +1,176 @@
+import asyncio
+import logging
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from .ingestion import ingest_validated
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class QueueFull(Exception):
+    """Raised when the writer cannot accept more samples right now."""
+
+
+class TelemetryWriter:
+    """
+    Buffers validated telemetry samples on a bounded asyncio queue and writes
+    them in batches from a background task.
+
+    A batch is flushed once it reaches ``TELEMETRY_FLUSH_BATCH_SIZE`` samples
+    or ``TELEMETRY_FLUSH_INTERVAL`` seconds after its first sample arrived,
+    whichever comes first. The writer starts lazily on the event loop of the
+    first submit() call and must be stopped with stop() to flush what is
+    still queued.
+    """
+
+    def __init__(self):
+        self._queue = None
+        self._task = None
+        self._loop = None
+        self._closing = False
+        self._sequence = 0
+
+        self.accepted = 0
+        self.rejected = 0
+        self.written = 0
+        self.not_found = 0
+        self.duplicates = 0
+        self.rate_limited = 0
+        self.failed = 0
+        self.flushes = 0
+        self.last_batch_size = 0
+        self.last_flush_latency = None
+        self.max_flush_latency = None
+        self._total_flush_latency = 0.0
+
+    def _ensure_started(self):
+        loop = asyncio.get_running_loop()
+        if self._task is not None and self._loop is loop and not self._task.done():
+            return
+
+        self._loop = loop
+        self._closing = False
+        self._queue = asyncio.Queue(maxsize=settings.TELEMETRY_QUEUE_SIZE)
+        self._task = loop.create_task(self._run())
+
+    def submit(self, samples):
+        """
+        Queue validated samples for writing.
+
+        All samples are accepted or none are. Returns the sequence ids
+        assigned to them, in order; raises QueueFull when the queue has no
+        room for the whole list.
+        """
+        if self._closing:
+            raise QueueFull('Writer is shutting down')
+        self._ensure_started()
+
+        if self._queue.qsize() + len(samples) > self._queue.maxsize:
+            self.rejected += len(samples)
+            raise QueueFull(f'Telemetry queue is full ({self._queue.maxsize} samples)')
+
+        sequences = []
+        for sample in samples:
+            self._sequence += 1
+            sequences.append(self._sequence)
+            self._queue.put_nowait(sample)
+
+        self.accepted += len(samples)
+        return sequences
+
+    async def stop(self):
+        """Flush everything still queued and stop the background task."""
+        if self._task is None or self._task.done():
+            return
+
+        self._closing = True
+        await self._queue.put(_STOP)
+        await self._task
+        self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        batch_size = settings.TELEMETRY_FLUSH_BATCH_SIZE
+        stopping = False
+
+        while not stopping:
+            item = await self._queue.get()
+            if item is _STOP:
+                break
+
+            batch = [item]
+            deadline = loop.time() + settings.TELEMETRY_FLUSH_INTERVAL
+            while len(batch) < batch_size:
+                try:
+                    item = self._queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(self._queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            await self._flush(batch)
+
+    async def _flush(self, batch):
+        started = time.monotonic()
+        try:
+            results = await sync_to_async(ingest_validated)(batch)
+        except Exception:
+            logger.exception('Failed to write %d telemetry samples', len(batch))
+            self.failed += len(batch)
+            return
+        finally:
+            latency = time.monotonic() - started
+            self.flushes += 1
+            self.last_batch_size = len(batch)
+            self.last_flush_latency = latency
+            self.max_flush_latency = max(self.max_flush_latency or 0.0, latency)
+            self._total_flush_latency += latency
+
+        for result in results:
+            if result['status'] == 'created':
+                self.written += 1
+            elif result['status'] == 'duplicate':
+                self.duplicates += 1
+            elif result['status'] == 'rate_limited':
+                self.rate_limited += 1
+            else:
+                self.not_found += 1
+
+    def stats(self):
+        def ms(seconds):
+            return round(seconds * 1000, 3) if seconds is not None else None
+
+        return {
+            'running': self._task is not None and not self._task.done(),
+            'queue_depth': self._queue.qsize() if self._queue is not None else 0,
+            'queue_capacity': settings.TELEMETRY_QUEUE_SIZE,
+            'accepted': self.accepted,
+            'rejected': self.rejected,
+            'written': self.written,
+            'not_found': self.not_found,
+            'duplicates': self.duplicates,
+            'rate_limited': self.rate_limited,
+            'failed': self.failed,
+            'flushes': self.flushes,
+            'last_batch_size': self.last_batch_size,
+            'last_flush_latency_ms': ms(self.last_flush_latency),
+            'avg_flush_latency_ms': ms(self._total_flush_latency / self.flushes) if self.flushes else None,
+            'max_flush_latency_ms': ms(self.max_flush_latency),
+        }
+
+
+telemetry_writer = TelemetryWriter()
@@ -0,0 +1,64 @@
+import io
+
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+
+from .models import Telemetry
+
+COPY_COLUMNS = ('id', 'machine_id', 'timestamp', 'parameter', 'value')
+
+
+def _escape(text):
+    # COPY text format: backslash escapes for the delimiter and line breaks
+    return text.replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+
+def copy_buffer(rows):
+    """Serialize Telemetry instances into an in-memory COPY text-format buffer."""
+    buffer = io.StringIO()
+    write = buffer.write
+    for row in rows:
+        write(f"{row.id}\t{row.machine_id}\t{row.timestamp.isoformat()}\t{_escape(row.parameter)}\t{row.value!r}\n")
+    buffer.seek(0)
+    return buffer
+
+
+def load_telemetry(rows, using='default'):
+    """
+    Insert unsaved Telemetry instances and set their ids.
+
+    On PostgreSQL, batches of at least ``TELEMETRY_COPY_THRESHOLD`` rows are
+    streamed with COPY: ids are reserved from the table's sequence up front so
+    callers can still reference the new rows. Every other case falls back to
+    bulk_create. Rows without a timestamp are stamped with the current time.
+    """
+    now = timezone.now()
+    for row in rows:
+        if row.timestamp is None:
+            row.timestamp = now
+
+    connection = connections[using]
+    if connection.vendor != 'postgresql' or len(rows) < settings.TELEMETRY_COPY_THRESHOLD:
+        return Telemetry.objects.using(using).bulk_create(rows)
+
+    table = Telemetry._meta.db_table
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT nextval(pg_get_serial_sequence(%s, 'id')) FROM generate_series(1, %s)",
+            [table, len(rows)]
+        )
+        for row, (row_id,) in zip(rows, cursor.fetchall()):
+            row.id = row_id
+
+        columns = ', '.join(connection.ops.quote_name(column) for column in COPY_COLUMNS)
+        cursor.copy_expert(
+            f"COPY {connection.ops.quote_name(table)} ({columns}) FROM STDIN",
+            copy_buffer(rows)
+        )
+
+    for row in rows:
+        row._state.adding = False
+        row._state.db = using
+    return rows
@@ -0,0 +1,60 @@
+"""
+Data behind the dashboard page.
+
+Counts come from one grouped aggregate, machine cards from one annotated
+query plus one for readings, and active warnings a page at a time. The
+view hands these over as lazy objects and the template caches its
+fragments under the machine state version, so a load whose fragments are
+all cached runs no query at all.
+"""
+from django.conf import settings
+from django.db.models import Count, FilteredRelation, Q
+
+from .models import Machine, Warning
+from .parameter_states import current_readings
+
+
+def _with_open_warnings(queryset):
+    # The join only reaches open warnings (the partial index), not the whole warning history
+    return queryset.annotate(
+        open_warnings=FilteredRelation('warnings', condition=Q(warnings__resolved_at__isnull=True)),
+    )
+
+
+def dashboard_summary():
+    """
+    Machines per status and active warnings, with one grouped query.
+
+    Returns {'machines': total, 'statuses': {status: machines}, 'active_warnings': total}.
+    """
+    rows = _with_open_warnings(Machine.objects.order_by()).values('status').annotate(
+        machines=Count('id', distinct=True),
+        active_warnings=Count('open_warnings'),
+    )
+    statuses = {status: 0 for status, _ in Machine.STATUS_CHOICES}
+    active_warnings = 0
+    for row in rows:
+        statuses[row['status']] = row['machines']
+        active_warnings += row['active_warnings']
+    return {'machines': sum(statuses.values()), 'statuses': statuses, 'active_warnings': active_warnings}
+
+
+def machine_cards():
+    """Machines with their open warning count and current readings, in two queries."""
+    machines = list(_with_open_warnings(Machine.objects.all()).annotate(
+        active_warnings_count=Count('open_warnings'),
+    ).order_by('id'))
+    readings = current_readings([machine.id for machine in machines])
+    for machine in machines:
+        machine.current_readings = readings[machine.id]
+    return machines
+
+
+def active_warnings_page(page):
+    """The 1-based ``page`` of active warnings, newest first, with their machines."""
+    size = settings.DASHBOARD_WARNINGS_PAGE_SIZE
+    offset = (page - 1) * size
+    return list(
+        Warning.objects.filter(resolved_at__isnull=True).select_related('machine')
+        .order_by('-created_at', '-id')[offset:offset + size]
+    )
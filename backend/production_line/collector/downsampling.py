@@ -0,0 +1,47 @@
+"""
+Largest-Triangle-Three-Buckets downsampling (Steinarsson, 2013).
+
+Keeps the first and last point and, from each of ``threshold - 2`` equal
+buckets in between, the point forming the largest triangle with the point
+kept from the previous bucket and the average of the next bucket. Peaks and
+troughs survive, unlike with plain averaging or striding.
+"""
+
+
+def lttb_indices(xs, ys, threshold):
+    """
+    Return the indices of the points LTTB keeps out of ``xs``/``ys``
+    (``xs`` ascending). Everything is kept when ``threshold`` is not smaller
+    than the number of points.
+    """
+    n = len(xs)
+    if threshold >= n:
+        return list(range(n))
+    if threshold < 3:
+        return [0, n - 1][:max(threshold, 0)]
+
+    selected = [0]
+    every = (n - 2) / (threshold - 2)
+    a = 0
+
+    for i in range(threshold - 2):
+        # Average of the next bucket (the last point for the final bucket)
+        next_start = int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, n)
+        span = next_end - next_start
+        avg_x = sum(xs[next_start:next_end]) / span
+        avg_y = sum(ys[next_start:next_end]) / span
+
+        ax, ay = xs[a], ys[a]
+        best_area = -1.0
+        best = start = int(i * every) + 1
+        for j in range(start, int((i + 1) * every) + 1):
+            area = abs((ax - avg_x) * (ys[j] - ay) - (ax - xs[j]) * (avg_y - ay))
+            if area > best_area:
+                best_area, best = area, j
+
+        selected.append(best)
+        a = best
+
+    selected.append(n - 1)
+    return selected
@@ -0,0 +1,158 @@
+"""
+In-process pub/sub for live dashboard updates.
+
+Ingestion publishes ``warning_opened``, ``warning_resolved`` and
+``machine_status_changed`` events once its transaction commits. Each event
+is encoded once as a Server-Sent Events frame and kept in a bounded replay
+buffer; every subscribed stream gets the same frame through its event loop
+(``call_soon_threadsafe``, as publishers run in worker threads), so a
+hundred open dashboards cost one encode and a hundred queue puts.
+
+Event ids increase within a process and start from the boot time in
+milliseconds, so they also increase across restarts. A client resuming
+with ``Last-Event-ID`` gets the buffered events after it, or a ``reset``
+event when some of them are no longer buffered and it should reload.
+
+The bus only sees what this process ingests: run the event stream in the
+process that ingests, or in every ingesting process.
+"""
+import json
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+
+EVENT_TYPES = ('warning_opened', 'warning_resolved', 'machine_status_changed')
+
+
+def encode_event(event_id, event_type, data):
+    """Encode an event as an SSE frame."""
+    payload = json.dumps(data, cls=DjangoJSONEncoder, separators=(',', ':'))
+    return f'id: {event_id}\nevent: {event_type}\ndata: {payload}\n\n'
+
+
+def id_frame(event_id):
+    """A frame that only moves the client's Last-Event-ID; nothing is dispatched."""
+    return f'id: {event_id}\n\n'
+
+
+def reset_frame(event_id):
+    return encode_event(event_id, 'reset', {'reason': 'Missed events are no longer buffered; reload'})
+
+
+class Subscription:
+    """One stream's queue; filled on its own event loop."""
+
+    def __init__(self, loop, queue, types):
+        self.loop = loop
+        self.queue = queue
+        self.types = types
+        self.overflowed = False
+
+    def deliver(self, event_type, frame):
+        if self.types and event_type not in self.types:
+            return
+        if self.queue.full():
+            # A stream this far behind is ended; the client resumes from the replay buffer
+            self.overflowed = True
+        else:
+            self.queue.put_nowait(frame)
+
+
+class EventBus:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buffer = deque()
+        self._subscribers = set()
+        self._last_id = int(time.time() * 1000)
+        self.published = 0
+        self.overflows = 0
+
+    def clear(self):
+        with self._lock:
+            self._buffer.clear()
+            self._subscribers.clear()
+
+    @property
+    def last_id(self):
+        return self._last_id
+
+    def publish(self, event_type, data):
+        with self._lock:
+            self._last_id += 1
+            frame = encode_event(self._last_id, event_type, data)
+            self._buffer.append((self._last_id, event_type, frame))
+            while len(self._buffer) > settings.EVENTS_BUFFER_SIZE:
+                self._buffer.popleft()
+            self.published += 1
+            subscribers = list(self._subscribers)
+
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.deliver, event_type, frame)
+            except RuntimeError:
+                # The stream's loop has closed
+                self.unsubscribe(subscription)
+
+    def replay(self, last_event_id, types=None):
+        """
+        Frames published after ``last_event_id``, as a list. Starts with a
+        reset frame when events after it were already dropped from the buffer
+        (or it belongs to another process).
+        """
+        with self._lock:
+            buffer = list(self._buffer)
+            last_id = self._last_id
+        if last_event_id is None:
+            return []
+
+        frames = []
+        oldest = buffer[0][0] if buffer else last_id + 1
+        if last_event_id > last_id or last_event_id + 1 < oldest:
+            frames.append(reset_frame(last_id))
+            return frames
+        frames.extend(frame for event_id, event_type, frame in buffer
+                      if event_id > last_event_id and (not types or event_type in types))
+        return frames
+
+    def subscribe(self, loop, queue, last_event_id=None, types=None):
+        """
+        Register a stream on ``loop``; returns the subscription and the frames
+        to send before the live ones. A new client (no ``last_event_id``) is
+        given the current id to resume from.
+        """
+        subscription = Subscription(loop, queue, types)
+        with self._lock:
+            self._subscribers.add(subscription)
+            current = self._last_id
+        if last_event_id is None:
+            return subscription, [id_frame(current)]
+        # Events published since the lock was released are in both the replay and the queue;
+        # the stream skips ids it has already sent
+        return subscription, self.replay(last_event_id, types)
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+            if subscription.overflowed:
+                self.overflows += 1
+
+    def stats(self):
+        return {
+            'subscribers': len(self._subscribers),
+            'published': self.published,
+            'last_event_id': self._last_id,
+            'buffered': len(self._buffer),
+            'buffer_size': settings.EVENTS_BUFFER_SIZE,
+            'overflows': self.overflows,
+        }
+
+
+event_bus = EventBus()
+
+
+def frame_id(frame):
+    """The id of an encoded frame."""
+    return int(frame[4:frame.index('\n')])
@@ -0,0 +1,114 @@
+"""
+Streaming telemetry export.
+
+Rows are read with ``QuerySet.iterator(chunk_size=...)``, which on
+PostgreSQL uses a named server-side cursor, and encoded chunk by chunk, so
+memory stays flat however large the range is. Under ASGI the chunks are
+pulled through ``async_chunks``: Django would otherwise read a sync
+iterator to the end before sending anything. The columns match what
+``import_telemetry`` reads: serial_number, parameter, value, timestamp.
+"""
+import csv
+import io
+import json
+import zlib
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from .models import Telemetry
+
+EXPORT_COLUMNS = ('serial_number', 'parameter', 'value', 'timestamp')
+FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+def export_rows(machine_ids=None, parameters=None, start=None, end=None, chunk_size=None):
+    """Yield (serial_number, parameter, value, timestamp) tuples in timestamp order."""
+    telemetry = Telemetry.objects.all()
+    if machine_ids:
+        telemetry = telemetry.filter(machine_id__in=machine_ids)
+    if parameters:
+        telemetry = telemetry.filter(parameter__in=parameters)
+    if start is not None:
+        telemetry = telemetry.filter(timestamp__gte=start)
+    if end is not None:
+        telemetry = telemetry.filter(timestamp__lt=end)
+
+    return telemetry.order_by('timestamp').values_list(
+        'machine__serial_number', 'parameter', 'value', 'timestamp'
+    ).iterator(chunk_size=chunk_size or settings.TELEMETRY_EXPORT_CHUNK_SIZE)
+
+
+def _batched(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def encode_csv(rows, batch_size=1000):
+    """Yield CSV text, a header and then one string per batch of rows."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    yield buffer.getvalue()
+
+    for batch in _batched(rows, batch_size):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(
+            (serial_number, parameter, repr(value), timestamp.isoformat())
+            for serial_number, parameter, value, timestamp in batch
+        )
+        yield buffer.getvalue()
+
+
+def encode_ndjson(rows, batch_size=1000):
+    """Yield NDJSON text, one string per batch of rows."""
+    for batch in _batched(rows, batch_size):
+        yield ''.join(
+            json.dumps(dict(zip(EXPORT_COLUMNS, (serial_number, parameter, value, timestamp.isoformat())))) + '\n'
+            for serial_number, parameter, value, timestamp in batch
+        )
+
+
+ENCODERS = {
+    'csv': encode_csv,
+    'ndjson': encode_ndjson,
+}
+
+
+def gzip_stream(chunks):
+    """Compress a stream of text chunks into a gzip file on the fly."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+async def async_chunks(chunks):
+    """
+    Yield the chunks of a sync generator from async code, one thread hop per
+    chunk. The hops all run in the same thread, so a server-side cursor
+    behind the generator stays on its connection.
+    """
+    end = object()
+    get_next = sync_to_async(next, thread_sensitive=True)
+    try:
+        while True:
+            chunk = await get_next(chunks, end)
+            if chunk is end:
+                return
+            yield chunk
+    finally:
+        # Also on client disconnect, so the cursor is released right away
+        await sync_to_async(chunks.close, thread_sensitive=True)()
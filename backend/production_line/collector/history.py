@@ -0,0 +1,89 @@
+"""
+Telemetry history queries for charts.
+
+A series is read from raw telemetry for short ranges and from the finest
+rollup resolution that keeps the number of buckets within reach of the
+requested point count otherwise, then reduced with LTTB. The same budget
+caps raw reads: a short range holding more samples than that is read from
+the rollups instead. Tiers already compacted away for the start of the
+range are skipped.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+
+from .downsampling import lttb_indices
+from .models import Telemetry, TelemetryRollup
+from .partitions import today_utc
+from .retention import cutoff_for, policy_for
+from .rollups import RESOLUTIONS, bucket_start
+
+
+def choose_source(parameter, start, end, points, today=None, raw=True):
+    """
+    Return 'raw' or the rollup resolution to read the range from; with
+    ``raw`` false, always a rollup resolution.
+    """
+    policy = policy_for(parameter)
+    today = today or today_utc()
+
+    def available(tier):
+        cutoff = cutoff_for(policy.get(tier), today)
+        return cutoff is None or cutoff <= start
+
+    span = end - start
+    if raw and span <= timedelta(hours=settings.TELEMETRY_HISTORY_RAW_MAX_HOURS) and available('raw'):
+        return 'raw'
+
+    budget = points * settings.TELEMETRY_HISTORY_OVERSAMPLING
+    resolutions = [resolution for resolution in RESOLUTIONS if available(resolution)] or ['1d']
+    for resolution in resolutions:
+        if span / RESOLUTIONS[resolution] <= budget:
+            return resolution
+    return resolutions[-1]
+
+
+def load_series(machine_id, parameter, start, end, points):
+    """
+    Return the series of ``parameter`` for [start, end) with at most
+    ``points`` points. Rollup points carry the bucket start as timestamp,
+    the mean as value and the bucket's min, max and sample count.
+    """
+    source = choose_source(parameter, start, end, points)
+
+    if source == 'raw':
+        budget = points * settings.TELEMETRY_HISTORY_OVERSAMPLING
+        # One row past the budget tells whether the range is too dense to read raw
+        rows = list(
+            Telemetry.objects.filter(
+                machine_id=machine_id, parameter=parameter, timestamp__gte=start, timestamp__lt=end
+            ).order_by('timestamp').values_list('timestamp', 'value')[:budget + 1]
+        )
+        if len(rows) > budget:
+            source = choose_source(parameter, start, end, points, raw=False)
+
+    if source == 'raw':
+        xs = [timestamp.timestamp() for timestamp, _ in rows]
+        ys = [value for _, value in rows]
+        series = [{'timestamp': timestamp, 'value': value} for timestamp, value in rows]
+    else:
+        rows = list(
+            TelemetryRollup.objects.filter(
+                machine_id=machine_id, parameter=parameter, resolution=source,
+                bucket__gte=bucket_start(start, source), bucket__lt=end
+            ).order_by('bucket').values_list('bucket', 'count', 'min_value', 'max_value', 'sum_value')
+        )
+        xs = [bucket.timestamp() for bucket, *_ in rows]
+        ys = [sum_value / count for _, count, _, _, sum_value in rows]
+        series = [
+            {'timestamp': bucket, 'value': mean, 'min': min_value, 'max': max_value, 'count': count}
+            for (bucket, count, min_value, max_value, _), mean in zip(rows, ys)
+        ]
+
+    indices = lttb_indices(xs, ys, points)
+    return {
+        'source': source,
+        'total': len(series),
+        'downsampled': len(indices) < len(series),
+        'points': [series[index] for index in indices],
+    }
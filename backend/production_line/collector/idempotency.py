@@ -0,0 +1,124 @@
+"""
+Idempotent telemetry ingestion.
+
+A sample may carry an ``idempotency_key`` or a ``(gateway_id, sequence)``
+pair. The first sample with a key claims it in ``IngestionKey``, whose
+unique constraint is authoritative across workers; later samples with the
+same key are answered as duplicates of the stored one and write nothing.
+Keys claimed by this worker are also kept, with their telemetry id, in a
+bounded LRU, so a retry that comes back to the same worker costs no query.
+"""
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import connections
+
+from .models import IngestionKey
+
+_CHUNK_SIZE = 500
+
+
+def sample_key(data):
+    """Return the idempotency key of a validated sample, or None."""
+    if data.get('idempotency_key'):
+        return f"k:{data['idempotency_key']}"
+    if data.get('gateway_id') is not None and data.get('sequence') is not None:
+        return f"g:{data['gateway_id']}:{data['sequence']}"
+    return None
+
+
+class RecentKeys:
+    """Bounded LRU of recently claimed keys and the telemetry ids they produced."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get_many(self, keys):
+        found = {}
+        with self._lock:
+            for key in keys:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    found[key] = self._entries[key]
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def add_many(self, items):
+        with self._lock:
+            for key, telemetry_id in items.items():
+                self._entries[key] = telemetry_id
+                self._entries.move_to_end(key)
+            while len(self._entries) > settings.TELEMETRY_IDEMPOTENCY_CACHE_SIZE:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'max_size': settings.TELEMETRY_IDEMPOTENCY_CACHE_SIZE,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': round(self.hits / lookups, 4) if lookups else None,
+        }
+
+
+recent_keys = RecentKeys()
+
+
+def claim_keys(keys, created_at, using='default'):
+    """
+    Insert ``keys`` unless they exist, returning {key: IngestionKey id} for
+    the ones this call inserted. A key claimed by a concurrent, uncommitted
+    transaction blocks until that transaction ends.
+    """
+    connection = connections[using]
+    quote = connection.ops.quote_name
+    table = quote(IngestionKey._meta.db_table)
+    created_at = connection.ops.adapt_datetimefield_value(created_at)
+
+    claimed = {}
+    keys = sorted(keys)
+    with connection.cursor() as cursor:
+        for offset in range(0, len(keys), _CHUNK_SIZE):
+            chunk = keys[offset:offset + _CHUNK_SIZE]
+            placeholders = ', '.join(['(%s, %s)'] * len(chunk))
+            params = []
+            for key in chunk:
+                params.extend([key, created_at])
+            cursor.execute(
+                f"INSERT INTO {table} ({quote('key')}, {quote('created_at')}) VALUES {placeholders} "
+                f"ON CONFLICT ({quote('key')}) DO NOTHING RETURNING {quote('id')}, {quote('key')}",
+                params
+            )
+            claimed.update((key, claim_id) for claim_id, key in cursor.fetchall())
+    return claimed
+
+
+def stored_telemetry_ids(keys):
+    """Return {key: telemetry_id} for keys claimed earlier."""
+    return dict(IngestionKey.objects.filter(key__in=keys).values_list('key', 'telemetry_id'))
+
+
+def attach_telemetry(claims):
+    """Record the telemetry id produced for each claim, given as {claim id: telemetry id}."""
+    IngestionKey.objects.bulk_update(
+        [IngestionKey(id=claim_id, telemetry_id=telemetry_id) for claim_id, telemetry_id in sorted(claims.items())],
+        ['telemetry'], batch_size=_CHUNK_SIZE
+    )
+
+
+def prune_keys(cutoff, batch_size):
+    """Delete up to ``batch_size`` keys claimed before ``cutoff``; returns the number deleted."""
+    ids = list(IngestionKey.objects.filter(created_at__lt=cutoff).values_list('id', flat=True)[:batch_size])
+    if not ids:
+        return 0
+    return IngestionKey.objects.filter(id__in=ids).delete()[0]
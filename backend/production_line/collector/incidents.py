@@ -0,0 +1,173 @@
+"""
+Warning incidents: at most one open Warning per (machine, rule).
+
+The first violation opens an incident. Later violations update its
+occurrence count, last value and last-seen time in place instead of
+inserting a new row. Samples back past the rule's clear level extend a
+clear streak, samples inside the hysteresis band reset it, and the incident
+closes once the streak reaches the rule's ``clear_after_samples``. Windowed
+rules are judged on their window (see ``rule_windows``) instead of the
+sample value. Opened and resolved incidents are published on the event bus,
+and bump the machine state version, once the transaction commits.
+"""
+from collections import defaultdict
+
+from django.db import IntegrityError, transaction
+
+from .events import event_bus
+from .models import Warning
+from .rule_windows import window_store
+from .rules import is_cleared, rule_engine
+from .versions import MACHINE_STATE_VERSION, bump_version
+
+INCIDENT_UPDATE_FIELDS = ['occurrence_count', 'last_value', 'last_seen_at', 'clear_streak', 'resolved_at']
+
+
+def describe(parameter, rule, value):
+    """``value`` is the sample value, or the window metric for windowed rules."""
+    condition = f"{rule.comparison_operator} {rule.threshold_value}"
+    if rule.rule_type == 'moving_average':
+        return f"Warning: {rule.window_seconds}s average of {parameter} {condition} (Actual: {value:.4g})"
+    if rule.rule_type == 'rate_of_change':
+        return f"Warning: {parameter} change within {rule.window_seconds}s {condition} (Actual: {value:.4g})"
+    if rule.rule_type == 'count_in_window':
+        return f"Warning: {parameter} {condition} in {value} of the last {rule.window_samples} samples"
+    return f"Warning: {parameter} {condition} (Actual: {value})"
+
+
+def apply_incidents(samples):
+    """
+    Open, update and close incidents for saved samples, given as
+    (index, machine_id, parameter, value, telemetry).
+
+    Instantaneous rules are evaluated for the whole batch at once, with
+    NumPy for large batches. Costs one query for the open incidents of the
+    batch, one bulk update and one bulk insert, plus a window checkpoint after
+    commit when one is due. Returns {index: [(rule, warning), ...]} with the rules each
+    sample violated and the incident it was recorded on.
+    """
+    parameters = {parameter for _, _, parameter, _, _ in samples if rule_engine.rules_for(parameter) is not None}
+    if not parameters:
+        return {}
+    # Rules see the batch in sample time order, whatever order it arrived in
+    samples = sorted(samples, key=lambda sample: sample[4].timestamp)
+
+    # Windows are advanced once, outside the retry below
+    windowed = window_store.observe(samples)
+    try:
+        with transaction.atomic():
+            violations = _apply(samples, parameters, windowed)
+    except IntegrityError:
+        # Another writer opened one of these incidents concurrently; start over from its state
+        with transaction.atomic():
+            violations = _apply(samples, parameters, windowed)
+    return violations
+
+
+def _apply(samples, parameters, windowed):
+    machine_ids = {machine_id for _, machine_id, parameter, _, _ in samples if parameter in parameters}
+
+    open_incidents = defaultdict(dict)
+    for warning in Warning.objects.filter(
+        resolved_at__isnull=True, machine_id__in=machine_ids, rule__parameter__in=parameters
+    ):
+        rule = rule_engine.rule(warning.rule_id)
+        if rule is not None:
+            open_incidents[(warning.machine_id, rule.parameter)][rule.id] = warning
+
+    created = []
+    changed = {}
+    violations = defaultdict(list)
+
+    evaluated = [sample for sample in samples if sample[2] in parameters]
+    instantaneous = rule_engine.evaluate_batch([(parameter, value) for _, _, parameter, value, _ in evaluated])
+
+    for (index, machine_id, parameter, value, telemetry), violated in zip(evaluated, instantaneous):
+        incidents = open_incidents[(machine_id, parameter)]
+        triggered = [(rule, value) for rule in violated]
+        window_cleared = {}
+        for rule, metric, violated, cleared in windowed.get(index, ()):
+            if violated:
+                triggered.append((rule, metric))
+            window_cleared[rule.id] = cleared
+
+        for rule, metric in triggered:
+            warning = incidents.get(rule.id)
+            if warning is None:
+                warning = Warning(
+                    machine_id=machine_id,
+                    rule=rule,
+                    telemetry=telemetry,
+                    description=describe(parameter, rule, metric),
+                    last_value=value,
+                    last_seen_at=telemetry.timestamp,
+                )
+                created.append(warning)
+                incidents[rule.id] = warning
+            else:
+                warning.occurrence_count += 1
+                if warning.last_seen_at is None or telemetry.timestamp >= warning.last_seen_at:
+                    warning.last_value = value
+                    warning.last_seen_at = telemetry.timestamp
+                warning.clear_streak = 0
+                if warning.pk:
+                    changed[warning.pk] = warning
+            violations[index].append((rule, warning))
+
+        triggered_ids = {rule.id for rule, _ in triggered}
+        for rule_id, warning in list(incidents.items()):
+            # A late sample from before the last violation says nothing about clearing
+            if rule_id in triggered_ids or (warning.last_seen_at and telemetry.timestamp < warning.last_seen_at):
+                continue
+            rule = rule_engine.rule(rule_id)
+            cleared = window_cleared[rule_id] if rule_id in window_cleared else is_cleared(rule, value)
+            if cleared:
+                warning.clear_streak += 1
+                if warning.clear_streak >= rule.clear_after_samples:
+                    warning.resolved_at = telemetry.timestamp
+                    del incidents[rule_id]
+            elif warning.clear_streak:
+                # Inside the hysteresis band: not violating, but not clear either
+                warning.clear_streak = 0
+            else:
+                continue
+            if warning.pk:
+                changed[warning.pk] = warning
+
+    # Closing comes first so a rule re-opened in the same batch does not clash with its old incident
+    if changed:
+        Warning.objects.bulk_update([changed[pk] for pk in sorted(changed)], INCIDENT_UPDATE_FIELDS)
+    Warning.objects.bulk_create(created)
+    _publish(created, changed.values())
+    return violations
+
+
+def warning_event(warning):
+    rule = rule_engine.rule(warning.rule_id)
+    return {
+        'id': warning.id,
+        'machine_id': warning.machine_id,
+        'rule_id': warning.rule_id,
+        'parameter': rule.parameter if rule else None,
+        'severity': rule.severity if rule else None,
+        'description': warning.description,
+        'occurrence_count': warning.occurrence_count,
+        'last_value': warning.last_value,
+        'last_seen_at': warning.last_seen_at,
+        'resolved_at': warning.resolved_at,
+    }
+
+
+def _publish(created, changed):
+    # Only incidents open before this batch are loaded, so any resolved_at was set now
+    events = [('warning_opened', warning_event(warning)) for warning in created]
+    events.extend(('warning_resolved', warning_event(warning))
+                  for warning in [*created, *changed] if warning.resolved_at is not None)
+    if events:
+        transaction.on_commit(lambda: _committed(events))
+
+
+def _committed(events):
+    bump_version(MACHINE_STATE_VERSION)
+    for event_type, data in events:
+        event_bus.publish(event_type, data)
@@ -0,0 +1,284 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .copy_loader import load_telemetry
+from .events import event_bus
+from .idempotency import attach_telemetry, claim_keys, recent_keys, sample_key, stored_telemetry_ids
+from .machine_cache import machine_cache
+from .incidents import apply_incidents
+from .models import Machine, Telemetry
+from .parameter_states import update_parameter_states
+from .rate_limit import limited_result, machine_limit, rate_limiter
+from .rollups import apply_rollups
+from .serializers import TelemetryInputSerializer
+from .versions import MACHINE_STATE_VERSION, bump_version
+
+
+def validate_samples(raw_samples):
+    """
+    Validate raw sample dicts with TelemetryInputSerializer.
+
+    Returns a list of (index, validated_data) for the valid samples and a dict
+    of per-index results for the invalid ones.
+    """
+    valid = []
+    results = {}
+
+    for index, raw in enumerate(raw_samples):
+        serializer = TelemetryInputSerializer(data=raw)
+        if serializer.is_valid():
+            valid.append((index, serializer.validated_data))
+        else:
+            results[index] = {'index': index, 'status': 'invalid', 'errors': serializer.errors}
+
+    return valid, results
+
+
+def apply_batch_keys(raw_samples, batch):
+    """
+    Hand the idempotency fields of a batch posted as {"samples": [...], ...}
+    down to its samples: ``gateway_id`` to samples without one, and
+    ``idempotency_key`` as "<key>:<position>" to samples without any key.
+    """
+    batch_key = batch.get('idempotency_key')
+    gateway_id = batch.get('gateway_id')
+    if not batch_key and gateway_id is None:
+        return raw_samples
+
+    keyed = []
+    for position, raw in enumerate(raw_samples):
+        if isinstance(raw, dict):
+            raw = dict(raw)
+            if gateway_id is not None and 'sequence' in raw:
+                raw.setdefault('gateway_id', gateway_id)
+            if batch_key and 'idempotency_key' not in raw and 'sequence' not in raw:
+                raw['idempotency_key'] = f'{batch_key}:{position}'
+        keyed.append(raw)
+    return keyed
+
+
+def ingest_samples(raw_samples):
+    """
+    Validate and store a batch of raw telemetry samples.
+
+    Returns one result dict per input sample, in order.
+    """
+    valid, results = validate_samples(raw_samples)
+    _ingest(valid, results)
+    return [results[index] for index in range(len(raw_samples))]
+
+
+def ingest_validated(samples):
+    """
+    Store samples that already passed TelemetryInputSerializer validation.
+
+    Returns one result dict per sample, in order.
+    """
+    results = {}
+    _ingest(list(enumerate(samples)), results)
+    return [results[index] for index in range(len(samples))]
+
+
+def _ingest(valid, results):
+    """
+    Store validated samples and evaluate warning rules for them.
+
+    Machines are resolved through the serial number cache (with at most one
+    query for the serials it does not know), telemetry is inserted with
+    bulk_create, rollups and last known values are upserted per key, rule
+    violations update open warning incidents and machine status changes are
+    applied as set-based updates. Samples over their machine's rate limit
+    are dropped as ``rate_limited`` and samples whose idempotency key was
+    already ingested are answered as duplicates; neither is written. Fills
+    ``results`` keyed by sample index.
+    """
+    machines = machine_cache.resolve_many({data['serial_number'] for _, data in valid})
+
+    accepted = []
+    for index, data in valid:
+        machine = machines.get(data['serial_number'])
+        if machine is None:
+            results[index] = {
+                'index': index,
+                'status': 'not_found',
+                'error': f"Machine with serial {data['serial_number']} not found",
+            }
+        else:
+            accepted.append((index, machine, data))
+
+    accepted = _limit_machines(accepted, results)
+    if accepted:
+        with transaction.atomic():
+            accepted, claims, repeats = _claim_keys(accepted, results)
+            if accepted:
+                _store_accepted(accepted, results)
+            if claims:
+                _record_keys(claims, repeats, results)
+
+
+def _limit_machines(accepted, results):
+    """
+    Admit each machine's samples against its rate limit, in order; the rest
+    are answered as ``rate_limited``. Returns the admitted samples.
+    """
+    per_machine = defaultdict(list)
+    for item in accepted:
+        per_machine[item[2]['serial_number']].append(item)
+
+    admitted = []
+    for serial_number, items in per_machine.items():
+        count, retry_after = rate_limiter.admit('machine', serial_number, len(items), *machine_limit(items[0][1].model))
+        admitted.extend(items[:count])
+        for index, _, _ in items[count:]:
+            results[index] = limited_result(index, f"Rate limit exceeded for machine {serial_number}", retry_after)
+    if len(admitted) < len(accepted):
+        admitted.sort(key=lambda item: item[0])
+    return admitted
+
+
+def _duplicate(index, telemetry_id):
+    return {'index': index, 'status': 'duplicate', 'telemetry_id': telemetry_id, 'warnings_triggered': []}
+
+
+def _claim_keys(accepted, results):
+    """
+    Split off samples whose idempotency key was ingested before, answering
+    them as duplicates. Returns the samples to store, {key: (claim id,
+    index)} for the keys claimed now and (index, key) pairs repeating a key
+    claimed now within the same batch.
+    """
+    fresh = []
+    keyed = {}
+    repeats = []
+    for item in accepted:
+        key = sample_key(item[2])
+        if key is None:
+            fresh.append(item)
+        elif key in keyed:
+            repeats.append((item[0], key))
+        else:
+            keyed[key] = item
+    if not keyed:
+        return accepted, {}, []
+
+    known = recent_keys.get_many(list(keyed))
+    claimed = claim_keys([key for key in keyed if key not in known], timezone.now())
+    unclaimed = [key for key in keyed if key not in known and key not in claimed]
+    if unclaimed:
+        known.update(stored_telemetry_ids(unclaimed))
+
+    claims = {}
+    for key, item in keyed.items():
+        if key in claimed:
+            claims[key] = (claimed[key], item[0])
+            fresh.append(item)
+        else:
+            results[item[0]] = _duplicate(item[0], known.get(key))
+
+    fresh.sort(key=lambda item: item[0])
+    pending = []
+    for index, key in repeats:
+        if key in claims:
+            pending.append((index, key))
+        else:
+            results[index] = _duplicate(index, known.get(key))
+    return fresh, claims, pending
+
+
+def _record_keys(claims, repeats, results):
+    telemetry_ids = {key: results[index]['telemetry_id'] for key, (_, index) in claims.items()}
+    attach_telemetry({claim_id: telemetry_ids[key] for key, (claim_id, _) in claims.items()})
+    for index, key in repeats:
+        results[index] = _duplicate(index, telemetry_ids[key])
+    transaction.on_commit(lambda: recent_keys.add_many(telemetry_ids))
+
+
+def _store_accepted(accepted, results):
+    received_at = timezone.now()
+    telemetry_rows = load_telemetry([
+        Telemetry(machine_id=machine.id, parameter=data['parameter'], value=data['value'],
+                  timestamp=data.get('timestamp', received_at))
+        for _, machine, data in accepted
+    ])
+    # Rollups and last known values are order-independent, so late samples simply fold in
+    apply_rollups(telemetry_rows)
+    update_parameter_states(telemetry_rows)
+
+    # Samples older than the lateness window are history: stored, but not held against the rules
+    cutoff = received_at - timedelta(seconds=settings.TELEMETRY_LATENESS_WINDOW)
+    violations = apply_incidents([
+        (index, machine.id, data['parameter'], data['value'], telemetry)
+        for (index, machine, data), telemetry in zip(accepted, telemetry_rows)
+        if telemetry.timestamp >= cutoff
+    ])
+
+    critical_machines = {}
+    warning_machines = {}
+    triggered = defaultdict(list)
+
+    for index, machine, _ in accepted:
+        for rule, warning in violations.get(index, ()):
+            triggered[index].append(warning.id)
+
+            if rule.severity == 'critical':
+                critical_machines[machine.id] = machine
+            elif rule.severity in ['high', 'medium']:
+                warning_machines[machine.id] = machine
+
+    _escalate(
+        [machine for machine in critical_machines.values() if machine.status != 'critical'],
+        'critical', ['critical']
+    )
+    _escalate(
+        [machine for machine_id, machine in warning_machines.items()
+         if machine_id not in critical_machines and machine.status not in ['critical', 'warning']],
+        'warning', ['critical', 'warning']
+    )
+
+    for (index, _, _), telemetry in zip(accepted, telemetry_rows):
+        results[index] = {
+            'index': index,
+            'status': 'created',
+            'telemetry_id': telemetry.id,
+            'warnings_triggered': triggered[index],
+        }
+        if telemetry.timestamp < cutoff:
+            results[index]['late'] = True
+
+
+def _escalate(machines, new_status, unless_in):
+    """
+    Move machines to ``new_status`` with one UPDATE; once committed, update
+    their cached status, bump the machine state version and publish the
+    changes. The cached status only decides whether the queries are needed
+    at all: the rows are locked and read first, and only those not already
+    in ``unless_in`` are updated and published, with the status they had.
+    """
+    if not machines:
+        return
+    previous = dict(
+        Machine.objects.select_for_update().filter(id__in=[machine.id for machine in machines])
+        .exclude(status__in=unless_in).order_by('id').values_list('id', 'status')
+    )
+    if previous:
+        Machine.objects.filter(id__in=previous).update(status=new_status)
+    events = [
+        {'machine_id': machine_id, 'status': new_status, 'previous_status': previous_status}
+        for machine_id, previous_status in previous.items()
+    ]
+    transaction.on_commit(lambda: _status_committed(machines, new_status, events))
+
+
+def _status_committed(machines, new_status, events):
+    # Only now: a rolled back batch must not leave the shared cache claiming an escalation
+    for machine in machines:
+        machine.status = new_status
+    if not events:
+        return
+    bump_version(MACHINE_STATE_VERSION)
+    for data in events:
+        event_bus.publish('machine_status_changed', data)
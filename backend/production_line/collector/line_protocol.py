@@ -0,0 +1,194 @@
+"""
+Line protocol for gateways that cannot afford HTTP.
+
+One sample per line, fields separated by whitespace::
+
+    <serial_number> <parameter> <value> [<timestamp>]
+
+The optional timestamp is Unix epoch seconds or ISO 8601 without spaces.
+Blank lines and lines starting with ``#`` are ignored. Samples are
+validated like the HTTP ones, counted against the peer's client rate limit
+and handed to the shared ``TelemetryWriter``, so they are written in
+batches and evaluated by the same rule engine.
+
+Over TCP every rejected line is answered with ``ERR <reason>: <line>``
+and, with acknowledgements on, every accepted one with ``OK <sequence>``.
+UDP is fire-and-forget: each datagram carries one or more lines and gets
+no answer.
+"""
+import asyncio
+import logging
+from datetime import datetime, timezone as dt_timezone
+
+from .async_writer import QueueFull
+from .ingestion import validate_samples
+from .rate_limit import client_limit, rate_limiter
+
+logger = logging.getLogger(__name__)
+
+MAX_LINE_LENGTH = 1024
+
+
+def parse_line(line):
+    """
+    Parse one protocol line into a raw sample dict for
+    TelemetryInputSerializer; returns None for blank and comment lines and
+    raises ValueError for malformed ones.
+    """
+    fields = line.split()
+    if not fields or fields[0].startswith('#'):
+        return None
+    if len(fields) not in (3, 4):
+        raise ValueError('expected: serial parameter value [timestamp]')
+
+    sample = {'serial_number': fields[0], 'parameter': fields[1], 'value': fields[2]}
+    if len(fields) == 4:
+        try:
+            epoch = float(fields[3])
+        except ValueError:
+            # Not a number: left to the serializer as ISO 8601
+            sample['timestamp'] = fields[3]
+        else:
+            try:
+                sample['timestamp'] = datetime.fromtimestamp(epoch, tz=dt_timezone.utc)
+            except (ValueError, OverflowError, OSError):
+                raise ValueError('timestamp out of range')
+    return sample
+
+
+class LineIngest:
+    """Turns batches of received lines into writer submissions, with per-listener counters."""
+
+    def __init__(self, writer, ack=False):
+        self.writer = writer
+        self.ack = ack
+        self.lines = 0
+        self.accepted = 0
+        self.invalid = 0
+        self.rate_limited = 0
+        self.busy = 0
+
+    def feed(self, lines, client):
+        """
+        Ingest decoded ``lines`` received from ``client`` (a rate limiting
+        key). Returns the reply lines owed to the sender.
+        """
+        replies = {}
+        samples = []
+        for position, line in enumerate(lines):
+            try:
+                sample = parse_line(line)
+            except ValueError as e:
+                replies[position] = f'ERR {e}: {line}'
+                continue
+            if sample is not None:
+                samples.append((position, sample))
+        self.lines += len(samples) + len(replies)
+        self.invalid += len(replies)
+        if not samples:
+            return [replies[position] for position in sorted(replies)]
+
+        admitted, retry_after = rate_limiter.admit('client', client, len(samples), *client_limit())
+        for position, _ in samples[admitted:]:
+            replies[position] = f'ERR rate limited, retry after {retry_after:.1f}s: {lines[position]}'
+        self.rate_limited += len(samples) - admitted
+        samples = samples[:admitted]
+
+        valid, invalid = validate_samples([sample for _, sample in samples])
+        for index, result in invalid.items():
+            position = samples[index][0]
+            replies[position] = f"ERR {_first_error(result['errors'])}: {lines[position]}"
+        self.invalid += len(invalid)
+
+        if valid:
+            try:
+                sequences = self.writer.submit([data for _, data in valid])
+            except QueueFull as e:
+                self.busy += len(valid)
+                for index, _ in valid:
+                    replies[samples[index][0]] = f'ERR {e}: {lines[samples[index][0]]}'
+            else:
+                self.accepted += len(valid)
+                if self.ack:
+                    for (index, _), sequence in zip(valid, sequences):
+                        replies[samples[index][0]] = f'OK {sequence}'
+
+        return [replies[position] for position in sorted(replies)]
+
+    def stats(self):
+        return {
+            'lines': self.lines,
+            'accepted': self.accepted,
+            'invalid': self.invalid,
+            'rate_limited': self.rate_limited,
+            'busy': self.busy,
+        }
+
+
+def _first_error(errors):
+    field, messages = next(iter(errors.items()))
+    return f'{field}: {messages[0]}'
+
+
+class LineStreamProtocol(asyncio.Protocol):
+    """TCP: a stream of newline-terminated lines, answered in order."""
+
+    def __init__(self, ingest):
+        self.ingest = ingest
+        self.transport = None
+        self.client = None
+        self.buffer = b''
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.client = f'line:{transport.get_extra_info("peername")[0]}'
+
+    def data_received(self, data):
+        *lines, self.buffer = (self.buffer + data).split(b'\n')
+        if len(self.buffer) > MAX_LINE_LENGTH:
+            self.transport.write(f'ERR line longer than {MAX_LINE_LENGTH} bytes\n'.encode())
+            self.transport.close()
+            return
+        if lines:
+            self._reply(self.ingest.feed(_decode(lines), self.client))
+
+    def eof_received(self):
+        if self.buffer.strip():
+            self._reply(self.ingest.feed(_decode([self.buffer]), self.client))
+        self.buffer = b''
+
+    def _reply(self, replies):
+        if replies and not self.transport.is_closing():
+            self.transport.write(''.join(f'{reply}\n' for reply in replies).encode())
+
+
+class LineDatagramProtocol(asyncio.DatagramProtocol):
+    """UDP: each datagram holds one or more lines; nothing is answered."""
+
+    def __init__(self, ingest):
+        self.ingest = ingest
+
+    def datagram_received(self, data, addr):
+        self.ingest.feed(_decode(data.split(b'\n')), f'line:{addr[0]}')
+
+    def error_received(self, exc):
+        logger.warning('Telemetry listener UDP error: %s', exc)
+
+
+def _decode(lines):
+    return [line.decode('utf-8', errors='replace').strip() for line in lines]
+
+
+async def start_listener(ingest, host, tcp_port=None, udp_port=None):
+    """
+    Start the TCP and/or UDP listener on the running loop. Returns the TCP
+    server and the UDP transport (None for a disabled one).
+    """
+    loop = asyncio.get_running_loop()
+    server = transport = None
+    if tcp_port is not None:
+        server = await loop.create_server(lambda: LineStreamProtocol(ingest), host, tcp_port)
+    if udp_port is not None:
+        transport, _ = await loop.create_datagram_endpoint(lambda: LineDatagramProtocol(ingest),
+                                                           local_addr=(host, udp_port))
+    return server, transport
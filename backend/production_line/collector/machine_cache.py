@@ -0,0 +1,126 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+from .models import Machine
+from .versions import get_version
+
+MACHINE_REGISTRY_VERSION = 'machine_registry'
+
+
+class CachedMachine:
+    """Ingestion-side view of a machine: its id, model and last known status."""
+    __slots__ = ('id', 'status', 'model')
+
+    def __init__(self, id, status, model=None):
+        self.id = id
+        self.status = status
+        self.model = model
+
+
+class MachineCache:
+    """
+    Bounded LRU cache mapping serial numbers to CachedMachine entries.
+
+    Unknown serials are remembered for ``MACHINE_CACHE_NEGATIVE_TTL`` seconds
+    so a gateway sending bad serials does not query the database on every
+    sample. The cache is dropped whenever the shared ``machine_registry``
+    version stamp changes, which happens on Machine save/delete.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._version = None
+        self._checked_at = 0.0
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._version = None
+            self._checked_at = 0.0
+
+    def _refresh(self):
+        now = time.monotonic()
+        if self._version is not None and now - self._checked_at < settings.MACHINE_CACHE_VERSION_CHECK_INTERVAL:
+            return
+
+        version = get_version(MACHINE_REGISTRY_VERSION)
+        with self._lock:
+            if version != self._version:
+                self._entries.clear()
+                self._version = version
+            self._checked_at = now
+
+    def _store(self, serial_number, entry):
+        self._entries[serial_number] = entry
+        self._entries.move_to_end(serial_number)
+        while len(self._entries) > settings.MACHINE_CACHE_SIZE:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def resolve_many(self, serial_numbers):
+        """
+        Return a dict of serial number -> CachedMachine for the known serials.
+
+        Serials missing from the cache are fetched with a single query.
+        """
+        self._refresh()
+        now = time.monotonic()
+        resolved = {}
+        missing = []
+
+        with self._lock:
+            for serial_number in serial_numbers:
+                entry = self._entries.get(serial_number)
+                if isinstance(entry, CachedMachine):
+                    self._entries.move_to_end(serial_number)
+                    resolved[serial_number] = entry
+                    self.hits += 1
+                elif entry is not None and entry > now:
+                    self._entries.move_to_end(serial_number)
+                    self.negative_hits += 1
+                else:
+                    missing.append(serial_number)
+                    self.misses += 1
+
+        if not missing:
+            return resolved
+
+        found = Machine.objects.filter(serial_number__in=missing).values_list('id', 'serial_number', 'status', 'model')
+        expires_at = now + settings.MACHINE_CACHE_NEGATIVE_TTL
+
+        with self._lock:
+            for machine_id, serial_number, machine_status, model in found:
+                entry = CachedMachine(machine_id, machine_status, model)
+                resolved[serial_number] = entry
+                self._store(serial_number, entry)
+            for serial_number in missing:
+                if serial_number not in resolved:
+                    self._store(serial_number, expires_at)
+
+        return resolved
+
+    def resolve(self, serial_number):
+        return self.resolve_many([serial_number]).get(serial_number)
+
+    def stats(self):
+        lookups = self.hits + self.negative_hits + self.misses
+        return {
+            'size': len(self._entries),
+            'max_size': settings.MACHINE_CACHE_SIZE,
+            'hits': self.hits,
+            'negative_hits': self.negative_hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_ratio': round((self.hits + self.negative_hits) / lookups, 4) if lookups else None,
+        }
+
+
+machine_cache = MachineCache()
@@ -0,0 +1,127 @@
+import re
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from collector.models import Machine, Route, Telemetry, Warning
+
+BENCH_SCHEMA = 'collector_bench'
+
+PARAMETERS = ['temperature', 'pressure', 'rpm', 'oil_level', 'vibration', 'humidity']
+
+QUERIES = [
+    ('Latest telemetry for a machine and parameter',
+     "SELECT id, timestamp, value FROM collector_telemetry "
+     "WHERE machine_id = %(machine_id)s AND parameter = 'temperature' ORDER BY timestamp DESC LIMIT 100"),
+    ('Active warnings of a machine',
+     "SELECT COUNT(*) FROM collector_warning WHERE machine_id = %(machine_id)s AND resolved_at IS NULL"),
+    ('Machines in critical status',
+     "SELECT id, name FROM collector_machine WHERE status = 'critical'"),
+    ('Planned routes for a day',
+     "SELECT id, name FROM collector_route WHERE date = CURRENT_DATE + 3 AND status = 'planned'"),
+]
+
+
+class Command(BaseCommand):
+    help = ('Generate a synthetic dataset in a scratch schema and print EXPLAIN ANALYZE plans of the '
+            'hot queries before and after adding the access-pattern indexes. PostgreSQL only; the '
+            'live tables are not touched.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=50_000_000, help='Telemetry rows to generate')
+        parser.add_argument('--machines', type=int, default=20_000, help='Machines to generate')
+        parser.add_argument('--warnings', type=int, default=1_000_000, help='Warnings to generate')
+        parser.add_argument('--routes', type=int, default=100_000, help='Routes to generate')
+        parser.add_argument('--keep', action='store_true', help=f'Keep the {BENCH_SCHEMA} schema afterwards')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            self.stdout.write(self.style.WARNING('This benchmark requires PostgreSQL.'))
+            return
+
+        with connection.cursor() as cursor:
+            try:
+                cursor.execute(f'DROP SCHEMA IF EXISTS {BENCH_SCHEMA} CASCADE')
+                cursor.execute(f'CREATE SCHEMA {BENCH_SCHEMA}')
+                cursor.execute(f'SET search_path TO {BENCH_SCHEMA}, public')
+
+                self.generate(cursor, options)
+                params = {'machine_id': max(1, options['machines'] // 2)}
+
+                before = self.explain_all(cursor, params, 'BEFORE (primary and foreign key indexes only)')
+                self.create_indexes(cursor)
+                after = self.explain_all(cursor, params, 'AFTER (access-pattern indexes)')
+
+                self.stdout.write(self.style.MIGRATE_HEADING('\nSummary (execution time, ms)'))
+                for (title, _), old, new in zip(QUERIES, before, after):
+                    self.stdout.write(f'{title:<50} {old:>12.3f} {new:>12.3f}')
+            finally:
+                cursor.execute('SET search_path TO DEFAULT')
+                if not options['keep']:
+                    cursor.execute(f'DROP SCHEMA IF EXISTS {BENCH_SCHEMA} CASCADE')
+
+    def timed(self, cursor, label, sql, params=None):
+        started = time.monotonic()
+        cursor.execute(sql, params)
+        self.stdout.write(f'{label}: {time.monotonic() - started:.1f}s')
+
+    def generate(self, cursor, options):
+        self.stdout.write(self.style.MIGRATE_HEADING('Generating dataset'))
+        for table in ('collector_machine', 'collector_telemetry', 'collector_warning', 'collector_route'):
+            cursor.execute(f'CREATE TABLE {BENCH_SCHEMA}.{table} (LIKE public.{table} INCLUDING DEFAULTS)')
+            cursor.execute(f'ALTER TABLE {BENCH_SCHEMA}.{table} ADD PRIMARY KEY (id)')
+
+        self.timed(cursor, f"{options['machines']} machines", """
+            INSERT INTO collector_machine (id, name, serial_number, model, manufacturer, status, installation_date)
+            SELECT g, 'Machine ' || g, 'SN-' || g, 'Model', 'Maker',
+                   (ARRAY['operational', 'operational', 'operational', 'warning', 'critical', 'offline', 'maintenance'])[1 + g %% 7],
+                   CURRENT_DATE - 365
+            FROM generate_series(1, %(machines)s) g
+        """, options)
+
+        self.timed(cursor, f"{options['rows']} telemetry rows", """
+            INSERT INTO collector_telemetry (id, machine_id, timestamp, parameter, value)
+            SELECT g, 1 + (g / 6) %% %(machines)s, now() - (g %% 2592000) * interval '1 second',
+                   (%(parameters)s::text[])[1 + g %% 6], random() * 100
+            FROM generate_series(1, %(rows)s) g
+        """, {**options, 'parameters': PARAMETERS})
+
+        self.timed(cursor, f"{options['warnings']} warnings", """
+            INSERT INTO collector_warning (id, machine_id, telemetry_id, created_at, resolved_at, description)
+            SELECT g, 1 + g %% %(machines)s, 1 + g %% %(rows)s, now() - (g %% 2592000) * interval '1 second',
+                   CASE WHEN g %% 20 = 0 THEN NULL ELSE now() END, 'Warning'
+            FROM generate_series(1, %(warnings)s) g
+        """, options)
+
+        self.timed(cursor, f"{options['routes']} routes", """
+            INSERT INTO collector_route (id, name, technician_id, date, estimated_duration, status, start_location,
+                                         created_at, updated_at)
+            SELECT g, 'Route ' || g, 1, CURRENT_DATE + (g %% 365) - 180, 4.0,
+                   (ARRAY['planned', 'in_progress', 'completed', 'cancelled'])[1 + g %% 4], 'Warsaw', now(), now()
+            FROM generate_series(1, %(routes)s) g
+        """, options)
+
+        # The indexes Django creates today for the foreign keys
+        cursor.execute('CREATE INDEX ON collector_telemetry (machine_id)')
+        cursor.execute('CREATE INDEX ON collector_warning (machine_id)')
+        cursor.execute('ANALYZE')
+
+    def create_indexes(self, cursor):
+        with connection.schema_editor() as editor:
+            for model in (Machine, Telemetry, Warning, Route):
+                for index in model._meta.indexes:
+                    self.timed(cursor, f'CREATE INDEX {index.name}', str(index.create_sql(model, editor)))
+        cursor.execute('ANALYZE')
+
+    def explain_all(self, cursor, params, heading):
+        self.stdout.write(self.style.MIGRATE_HEADING(f'\n{heading}'))
+        timings = []
+        for title, sql in QUERIES:
+            cursor.execute('EXPLAIN (ANALYZE, BUFFERS) ' + sql, params)
+            plan = [row[0] for row in cursor.fetchall()]
+            self.stdout.write(self.style.SUCCESS(f'\n-- {title}'))
+            self.stdout.write('\n'.join(plan))
+            match = re.search(r'Execution Time: ([\d.]+) ms', plan[-1])
+            timings.append(float(match.group(1)) if match else float('nan'))
+        return timings
@@ -0,0 +1,76 @@
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from collector.models import WarningRule
+from collector.rules import ParameterRules, evaluate_columns
+
+PARAMETERS = ['temperature', 'pressure', 'rpm', 'oil_level', 'vibration', 'humidity']
+
+# Equality comparisons practically never match random floats
+OPERATORS = ['>', '>=', '<', '<=']
+
+
+class Command(BaseCommand):
+    help = ('Compare per-sample and vectorised (NumPy) warning rule evaluation on a synthetic '
+            'columnar batch. Uses in-memory rules only; the database is not touched.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--samples', type=int, default=1_000_000, help='Samples in the batch')
+        parser.add_argument('--rules-per-parameter', type=int, default=4, help='Threshold rules per parameter')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed')
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(options['seed'])
+        index = self.build_rules(rng, options['rules_per_parameter'])
+
+        samples = options['samples']
+        codes = rng.integers(0, len(PARAMETERS), size=samples)
+        values = rng.uniform(0.0, 100.0, size=samples)
+        self.stdout.write(
+            f'{samples} samples, {len(PARAMETERS)} parameters, '
+            f'{options["rules_per_parameter"]} rules per parameter'
+        )
+
+        # Per-sample path: what ingestion does for small batches
+        code_list, value_list = codes.tolist(), values.tolist()
+        started = time.perf_counter()
+        per_sample = 0
+        for code, value in zip(code_list, value_list):
+            per_sample += len(index[PARAMETERS[code]].evaluate(value))
+        per_sample_time = time.perf_counter() - started
+
+        started = time.perf_counter()
+        _, mask = evaluate_columns(index, PARAMETERS, codes, values)
+        vectorised = int(mask.sum())
+        vectorised_time = time.perf_counter() - started
+
+        if per_sample != vectorised:
+            self.stdout.write(self.style.ERROR(f'Mismatch: {per_sample} vs {vectorised} violations'))
+            return
+
+        self.stdout.write(self.style.MIGRATE_HEADING('\nThroughput'))
+        self.stdout.write(f'{"Per-sample":<12} {per_sample_time:>8.3f}s {samples / per_sample_time:>14,.0f} samples/s')
+        self.stdout.write(f'{"Vectorised":<12} {vectorised_time:>8.3f}s {samples / vectorised_time:>14,.0f} samples/s')
+        self.stdout.write(self.style.SUCCESS(
+            f'\n{vectorised} violations, vectorised is {per_sample_time / vectorised_time:.1f}x faster'
+        ))
+
+    def build_rules(self, rng, per_parameter):
+        index = {}
+        rule_id = 0
+        for parameter in PARAMETERS:
+            rules = []
+            for _ in range(per_parameter):
+                rule_id += 1
+                rules.append(WarningRule(
+                    id=rule_id,
+                    name=f'{parameter} rule {rule_id}',
+                    parameter=parameter,
+                    comparison_operator=OPERATORS[rng.integers(len(OPERATORS))],
+                    threshold_value=float(rng.uniform(0.0, 100.0)),
+                    severity='medium',
+                ))
+            index[parameter] = ParameterRules(rules)
+        return index
@@ -0,0 +1,112 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import RequestFactory
+from django.utils import timezone
+
+from collector.models import Location, Machine, Warning, WarningRule
+from collector.views import get_machines_with_warnings
+
+
+class Rollback(Exception):
+    pass
+
+
+class QueryCounter:
+    """Counts queries without keeping them, unlike the capped debug query log."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class Command(BaseCommand):
+    help = ('Time the machines-with-warnings listing against the per-machine queries it replaced, on '
+            'synthetic machines in warning or critical status. The data is created inside a transaction '
+            'that is rolled back, so the database is left as it was.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--machines', type=int, default=10_000, help='Machines in warning or critical status')
+        parser.add_argument('--warnings-per-machine', type=int, default=3, choices=range(1, 5),
+                            help='Open warnings per machine, one per severity (1-4)')
+        parser.add_argument('--resolved-per-machine', type=int, default=10,
+                            help='Resolved warnings per machine (history the listing must skip)')
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.generate(options)
+                per_machine = self.measure('Per-machine queries', self.per_machine)
+                set_based = self.measure('Set-based query', self.set_based)
+                if per_machine[0] != set_based[0]:
+                    self.stdout.write(self.style.ERROR('The two listings differ'))
+                self.stdout.write(self.style.SUCCESS(
+                    f'\nSet-based listing is {per_machine[1] / set_based[1]:.1f}x faster '
+                    f'({per_machine[2]} vs {set_based[2]} queries)'
+                ))
+                raise Rollback
+        except Rollback:
+            pass
+
+    def generate(self, options):
+        started = time.monotonic()
+        resolved_at = timezone.now()
+        user = User.objects.create(username=f'benchmark-{time.time_ns()}')
+        rules = [
+            WarningRule.objects.create(name=f'Benchmark {severity}', parameter='temperature', comparison_operator='>',
+                                       threshold_value=100.0, severity=severity, created_by=user)
+            for severity, _ in WarningRule.SEVERITY_CHOICES
+        ]
+        location = Location.objects.create(latitude=52.2297, longitude=21.0122, address='Warsaw, Poland')
+        prefix = f'BENCH-{time.time_ns()}-'
+        machines = Machine.objects.bulk_create([
+            Machine(name=f'Benchmark {i}', serial_number=f'{prefix}{i}', model='Model', manufacturer='Maker',
+                    status='critical' if i % 4 == 0 else 'warning', location=location if i % 2 else None,
+                    installation_date='2025-01-01')
+            for i in range(options['machines'])
+        ], batch_size=1000)
+        Warning.objects.bulk_create([
+            Warning(machine=machine, rule=rules[i], description=f'{rules[i].severity} on {machine.name}')
+            for machine in machines for i in range(options['warnings_per_machine'])
+        ] + [
+            Warning(machine=machine, rule=rules[0], description='resolved', resolved_at=resolved_at)
+            for machine in machines for _ in range(options['resolved_per_machine'])
+        ], batch_size=5000)
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+        self.stdout.write(f'Generated {len(machines)} machines in {time.monotonic() - started:.1f}s')
+
+    def measure(self, label, listing):
+        counter = QueryCounter()
+        started = time.perf_counter()
+        with connection.execute_wrapper(counter):
+            data = listing()
+        elapsed = time.perf_counter() - started
+        # Machines already in warning or critical status are listed too
+        self.stdout.write(f'{label:<22} {elapsed:>8.3f}s {counter.count:>8} queries {len(data):>8} machines')
+        # Compare on the fields both listings return
+        return [(row['id'], row['warnings_count'], row['latest_warning']) for row in data], elapsed, counter.count
+
+    def set_based(self):
+        request = RequestFactory().get('/machines/warnings/')
+        return sorted(get_machines_with_warnings(request).data, key=lambda row: row['id'])
+
+    def per_machine(self):
+        # The listing as it was: three queries per machine plus a location lookup
+        data = []
+        for machine in Machine.objects.filter(status__in=['warning', 'critical']).order_by('id'):
+            active_warnings = machine.warnings.filter(resolved_at=None).order_by('-created_at', '-id')
+            data.append({
+                'id': machine.id,
+                'warnings_count': active_warnings.count(),
+                'latest_warning': active_warnings.first().description if active_warnings.exists() else None,
+                'location': {'address': machine.location.address} if machine.location else None,
+            })
+        return data
+
@@ -0,0 +1,125 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from collector.idempotency import prune_keys
+from collector.models import Telemetry, TelemetryRollup
+from collector.partitions import today_utc
+from collector.retention import (
+    TIERS, cutoff_for, delete_raw_batch, delete_rollup_batch, retention_groups, roll_up_missing, table_size, vacuum,
+)
+
+
+class Command(BaseCommand):
+    help = ('Apply the telemetry retention policy: roll up raw data that is not aggregated yet, then '
+            'delete expired raw telemetry and rollups in small batches (one short transaction each), '
+            'keeping rows referenced by unresolved warnings. Safe to interrupt and re-run.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help='Rows deleted per transaction (default: 5000)')
+        parser.add_argument('--sleep', type=float, default=0.0,
+                            help='Seconds to pause between batches to limit load')
+        parser.add_argument('--max-seconds', type=float,
+                            help='Stop after the batch that exceeds this run time; the next run resumes')
+        parser.add_argument('--vacuum', action='store_true',
+                            help='VACUUM ANALYZE the compacted tables afterwards (PostgreSQL)')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only print the policy and cutoffs')
+
+    def handle(self, *args, **options):
+        try:
+            groups = retention_groups()
+        except ImproperlyConfigured as e:
+            raise CommandError(str(e))
+
+        today = today_utc()
+        self.batch_size = options['batch_size']
+        self.sleep = options['sleep']
+        self.started = time.monotonic()
+        self.deadline = self.started + options['max_seconds'] if options['max_seconds'] else None
+
+        for label, _, policy in groups:
+            tiers = ', '.join(
+                f'{tier}: {"forever" if policy[tier] is None else str(policy[tier]) + "d"}' for tier in TIERS
+            )
+            self.stdout.write(f'Policy [{label}] {tiers}')
+        self.stdout.write(f'Idempotency keys kept {settings.TELEMETRY_IDEMPOTENCY_WINDOW_HOURS:g}h')
+        if options['dry_run']:
+            return
+
+        tables = [Telemetry._meta.db_table, TelemetryRollup._meta.db_table]
+        sizes_before = {table: table_size(table) for table in tables}
+
+        deleted = {tier: 0 for tier in TIERS}
+        finished = True
+        for label, condition, policy in groups:
+            raw_cutoff = cutoff_for(policy['raw'], today)
+            if raw_cutoff is not None:
+                rebuilt = roll_up_missing(condition, raw_cutoff)
+                if rebuilt:
+                    self.stdout.write(f'[{label}] rolled up {len(rebuilt)} days not aggregated yet')
+                finished = self.run_batches(
+                    deleted, 'raw', lambda: delete_raw_batch(condition, raw_cutoff, self.batch_size)
+                ) and finished
+
+            for resolution in TIERS[1:]:
+                cutoff = cutoff_for(policy[resolution], today)
+                if cutoff is None or not finished:
+                    continue
+                finished = self.run_batches(
+                    deleted, resolution,
+                    lambda: delete_rollup_batch(condition, resolution, cutoff, self.batch_size)
+                ) and finished
+            if not finished:
+                break
+
+        expired_keys = {'keys': 0}
+        if finished:
+            key_cutoff = timezone.now() - timedelta(hours=settings.TELEMETRY_IDEMPOTENCY_WINDOW_HOURS)
+            finished = self.run_batches(expired_keys, 'keys', lambda: prune_keys(key_cutoff, self.batch_size))
+
+        if options['vacuum']:
+            for table in tables:
+                vacuum(table)
+
+        elapsed = time.monotonic() - self.started
+        total = sum(deleted.values())
+        self.stdout.write(', '.join(f'{tier}: {count} rows' for tier, count in deleted.items()) + ' deleted')
+        self.stdout.write(f'{expired_keys["keys"]} expired idempotency keys deleted')
+        for table in tables:
+            self.report_space(table, sizes_before[table], deleted, options['vacuum'])
+        if not finished:
+            self.stdout.write(self.style.WARNING('Time limit reached - run again to continue.'))
+        self.stdout.write(self.style.SUCCESS(
+            f'Deleted {total} rows in {elapsed:.1f}s ({total / elapsed if elapsed else 0:.0f} rows/s)'
+        ))
+
+    def run_batches(self, deleted, tier, delete_batch):
+        """Call ``delete_batch`` until it deletes nothing; returns False when the time limit stopped it."""
+        while True:
+            if self.deadline is not None and time.monotonic() >= self.deadline:
+                return False
+            count = delete_batch()
+            deleted[tier] += count
+            if count < self.batch_size:
+                return True
+            if self.sleep:
+                time.sleep(self.sleep)
+
+    def report_space(self, table, before, deleted, vacuumed):
+        if before is None:
+            return
+        size_before, rows_before = before
+        tier_rows = deleted['raw'] if table == Telemetry._meta.db_table else sum(deleted.values()) - deleted['raw']
+        # Deleted rows only free space for reuse; the files shrink after VACUUM FULL or partition drops
+        reusable = size_before * tier_rows // rows_before if rows_before else 0
+        message = f'{table}: ~{reusable / 1024 / 1024:.1f} MB freed for reuse'
+        if vacuumed:
+            size_after, _ = table_size(table)
+            message += f', size {size_before / 1024 / 1024:.1f} MB -> {size_after / 1024 / 1024:.1f} MB'
+        self.stdout.write(message)
@@ -0,0 +1,99 @@
+import sys
+import time
+from datetime import timezone as dt_timezone
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_datetime
+
+from collector.export import ENCODERS, FORMATS, export_rows, gzip_stream
+from collector.models import Machine
+
+
+class Command(BaseCommand):
+    help = ('Stream telemetry to a CSV or NDJSON file (optionally gzip-compressed) using a server-side '
+            'cursor, so memory use does not depend on the size of the export. The output can be read '
+            'back with import_telemetry.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default='-', help="Output file, or '-' for stdout (default)")
+        parser.add_argument('--format', choices=sorted(FORMATS),
+                            help='Output format (default: guessed from the file extension, else csv)')
+        parser.add_argument('--gzip', action='store_true', help='Compress the output (implied by a .gz file name)')
+        parser.add_argument('--machine', action='append', dest='serial_numbers', metavar='SERIAL',
+                            help='Only export this machine (repeatable)')
+        parser.add_argument('--parameter', action='append', dest='parameters', metavar='PARAMETER',
+                            help='Only export this parameter (repeatable)')
+        parser.add_argument('--since', help='Export samples at or after this ISO 8601 datetime')
+        parser.add_argument('--until', help='Export samples before this ISO 8601 datetime')
+        parser.add_argument('--chunk-size', type=int, default=settings.TELEMETRY_EXPORT_CHUNK_SIZE,
+                            help='Rows fetched from the database cursor at a time')
+
+    def parse_datetime_option(self, value, option):
+        if value is None:
+            return None
+        try:
+            parsed = parse_datetime(value)
+        except ValueError:
+            parsed = None
+        if parsed is None:
+            raise CommandError(f'{option} must be an ISO 8601 datetime')
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=dt_timezone.utc)
+        return parsed
+
+    def handle(self, *args, **options):
+        output = options['output']
+        compress = options['gzip'] or output.endswith('.gz')
+        name = output[:-3] if output.endswith('.gz') else output
+        export_format = options['format'] or ('ndjson' if name.endswith(('.ndjson', '.jsonl')) else 'csv')
+
+        machine_ids = None
+        if options['serial_numbers']:
+            machines = dict(Machine.objects.filter(
+                serial_number__in=options['serial_numbers']
+            ).values_list('serial_number', 'id'))
+            missing = set(options['serial_numbers']) - set(machines)
+            if missing:
+                raise CommandError(f'Unknown serial numbers: {", ".join(sorted(missing))}')
+            machine_ids = list(machines.values())
+
+        self.exported = 0
+        rows = export_rows(
+            machine_ids=machine_ids,
+            parameters=options['parameters'],
+            start=self.parse_datetime_option(options['since'], '--since'),
+            end=self.parse_datetime_option(options['until'], '--until'),
+            chunk_size=options['chunk_size'],
+        )
+        chunks = ENCODERS[export_format](self.count(rows))
+
+        started = time.monotonic()
+        if output == '-' and compress:
+            for chunk in gzip_stream(chunks):
+                sys.stdout.buffer.write(chunk)
+            sys.stdout.buffer.flush()
+        elif output == '-':
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
+        else:
+            if compress:
+                stream, chunks = open(output, 'wb'), gzip_stream(chunks)
+            else:
+                stream = open(output, 'w', encoding='utf-8', newline='')
+            with stream:
+                for chunk in chunks:
+                    stream.write(chunk)
+
+        elapsed = time.monotonic() - started
+        rate = self.exported / elapsed if elapsed else 0
+        # Keep stdout clean when the export itself goes there
+        report = self.stderr if output == '-' else self.stdout
+        report.write(self.style.SUCCESS(
+            f'Exported {self.exported} rows in {elapsed:.1f}s ({rate:.0f} rows/s)'
+        ))
+
+    def count(self, rows):
+        for row in rows:
+            self.exported += 1
+            yield row
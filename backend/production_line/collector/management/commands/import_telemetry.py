@@ -0,0 +1,128 @@
+import csv
+import json
+import sys
+import time
+from datetime import timezone as dt_timezone
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from collector.copy_loader import load_telemetry
+from collector.machine_cache import machine_cache
+from collector.models import Telemetry
+from collector.parameter_states import update_parameter_states
+from collector.rollups import apply_rollups
+
+PARAMETER_MAX_LENGTH = Telemetry._meta.get_field('parameter').max_length
+
+
+class Command(BaseCommand):
+    help = ('Bulk import historical telemetry from CSV or NDJSON. Each record needs serial_number, '
+            'parameter and value, plus an optional ISO 8601 timestamp (records without one are '
+            'stamped with the import time). Uses PostgreSQL COPY when available. Warning rules are '
+            'not evaluated for imported data.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File to import, or '-' to read from stdin")
+        parser.add_argument('--format', choices=['csv', 'ndjson'],
+                            help='Input format (default: guessed from the file extension)')
+        parser.add_argument('--batch-size', type=int, default=10000,
+                            help='Rows written per COPY / transaction (default: 10000)')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        input_format = options['format'] or ('ndjson' if path.endswith(('.ndjson', '.jsonl')) else 'csv')
+        batch_size = options['batch_size']
+
+        stream = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8')
+        records = csv.DictReader(stream) if input_format == 'csv' else self.read_ndjson(stream)
+
+        self.imported = 0
+        self.skipped = 0
+        self.unknown_serials = set()
+        started = time.monotonic()
+
+        try:
+            batch = []
+            for line_number, record in enumerate(records, 1):
+                batch.append((line_number, record))
+                if len(batch) >= batch_size:
+                    self.write_batch(batch)
+                    batch = []
+            if batch:
+                self.write_batch(batch)
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+        elapsed = time.monotonic() - started
+        rate = self.imported / elapsed if elapsed else 0
+        if self.unknown_serials:
+            self.stdout.write(self.style.WARNING(
+                f'Unknown serial numbers: {", ".join(sorted(self.unknown_serials)[:20])}'
+            ))
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {self.imported} rows ({self.skipped} skipped) in {elapsed:.1f}s ({rate:.0f} rows/s)'
+        ))
+
+    def read_ndjson(self, stream):
+        for line_number, line in enumerate(stream, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError as e:
+                raise CommandError(f'Invalid JSON on line {line_number}: {e}')
+
+    def parse_record(self, line_number, record):
+        try:
+            value = float(record['value'])
+            parameter = record['parameter'].strip()
+            serial_number = record['serial_number'].strip()
+        except (KeyError, TypeError, ValueError, AttributeError) as e:
+            self.stderr.write(f'Record {line_number} skipped: {e!r}')
+            return None
+        # Checked here, as one value the column rejects would fail the whole COPY batch
+        if not parameter or len(parameter) > PARAMETER_MAX_LENGTH:
+            self.stderr.write(f'Record {line_number} skipped: parameter must be 1-{PARAMETER_MAX_LENGTH} characters')
+            return None
+
+        timestamp = record.get('timestamp') or None
+        if timestamp:
+            try:
+                timestamp = parse_datetime(timestamp)
+            except ValueError:
+                timestamp = None
+            if timestamp is None:
+                self.stderr.write(f'Record {line_number} skipped: invalid timestamp')
+                return None
+            if timestamp.tzinfo is None:
+                timestamp = timestamp.replace(tzinfo=dt_timezone.utc)
+
+        return serial_number, parameter, value, timestamp
+
+    def write_batch(self, batch):
+        parsed = [parsed for parsed in (self.parse_record(*item) for item in batch) if parsed]
+        self.skipped += len(batch) - len(parsed)
+
+        machines = machine_cache.resolve_many({serial_number for serial_number, _, _, _ in parsed})
+
+        imported_at = timezone.now()
+        rows = []
+        for serial_number, parameter, value, timestamp in parsed:
+            machine = machines.get(serial_number)
+            if machine is None:
+                self.unknown_serials.add(serial_number)
+                self.skipped += 1
+                continue
+            rows.append(Telemetry(machine_id=machine.id, parameter=parameter, value=value,
+                                  timestamp=timestamp or imported_at))
+
+        with transaction.atomic():
+            load_telemetry(rows)
+            apply_rollups(rows)
+            update_parameter_states(rows)
+        self.imported += len(rows)
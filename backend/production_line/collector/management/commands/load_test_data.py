@@ -1,6 +1,10 @@
+from django.core.management import call_command
 from django.core.management.base import BaseCommand
 from django.contrib.auth.models import User
-from collector.models import Location, Machine, WarningRule, Telemetry, Warning, ServiceRecord, Route, RouteStop
+from collector.models import Location, Machine, WarningRule, Telemetry, TelemetryRollup, Warning, ServiceRecord, Route, RouteStop
+from collector.parameter_states import rebuild_parameter_states
+from collector.rules import rule_engine
+from django.db.models import F
 from django.utils import timezone
 from datetime import timedelta, date
 import random
@@ -17,9 +21,12 @@ class Command(BaseCommand):
         technicians = self.create_users()
         locations = self.create_locations()
         machines = self.create_machines(locations)
-        rules = self.create_warning_rules()
+        self.create_warning_rules()
         
-        self.create_telemetry_and_warnings(machines, rules)
+        self.create_telemetry_and_warnings(machines)
+        # Telemetry is bulk inserted without going through ingestion, so derive rollups and last known values here
+        call_command('rebuild_rollups', stdout=self.stdout)
+        rebuild_parameter_states()
         self.create_service_records(machines)
         self.create_routes(technicians, machines)
         
@@ -30,6 +37,7 @@ class Command(BaseCommand):
         ServiceRecord.objects.all().delete()
         Warning.objects.all().delete()
         Telemetry.objects.all().delete()
+        TelemetryRollup.objects.all().delete()
         WarningRule.objects.all().delete()
         RouteStop.objects.all().delete()
         Route.objects.all().delete()
@@ -194,7 +202,7 @@ class Command(BaseCommand):
         
         return rules
 
-    def create_telemetry_and_warnings(self, machines, rules):
+    def create_telemetry_and_warnings(self, machines):
         self.stdout.write('Generating telemetry and warnings...')
         
         parameters = {
@@ -206,7 +214,9 @@ class Command(BaseCommand):
             'humidity': (30.0, 90.0)
         }
         
+        open_incidents = {}
         for machine in machines:
+            readings = []
             for day in range(5):
                 for hour in range(0, 24, 3):
                     timestamp = timezone.now() - timedelta(days=day, hours=hour)
@@ -222,52 +232,50 @@ class Command(BaseCommand):
                             elif param == 'oil_level':
                                 value = random.uniform(1.0, 10.0)
                                 
-                        telemetry = Telemetry.objects.create(
-                            machine=machine,
-                            parameter=param,
-                            value=value,
+                        readings.append((day, timestamp, param, value))
+            
+            # One insert and one vectorised rule evaluation for all of the machine's samples
+            rows = Telemetry.objects.bulk_create([
+                Telemetry(machine=machine, parameter=param, value=value, timestamp=timestamp)
+                for _, timestamp, param, value in readings
+            ])
+            violations = rule_engine.evaluate_batch([(param, value) for _, _, param, value in readings])
+            for (day, timestamp, param, value), telemetry, rules in zip(readings, rows, violations):
+                for rule in rules:
+                    # Repeated violations extend the open incident; samples run backwards in time
+                    incident_id = open_incidents.get((machine.id, rule.id))
+                    if incident_id is not None:
+                        Warning.objects.filter(id=incident_id).update(
+                            occurrence_count=F('occurrence_count') + 1, created_at=timestamp, telemetry=telemetry
                         )
-                        
-                        Telemetry.objects.filter(id=telemetry.id).update(timestamp=timestamp)
-                        
-                        for rule in rules:
-                            if rule.parameter == param:
-                                is_violation = False
-                                
-                                if rule.comparison_operator == '>' and value > rule.threshold_value:
-                                    is_violation = True
-                                elif rule.comparison_operator == '>=' and value >= rule.threshold_value:
-                                    is_violation = True
-                                elif rule.comparison_operator == '<' and value < rule.threshold_value:
-                                    is_violation = True
-                                elif rule.comparison_operator == '<=' and value <= rule.threshold_value:
-                                    is_violation = True
-                                elif rule.comparison_operator == '==' and value == rule.threshold_value:
-                                    is_violation = True
-                                elif rule.comparison_operator == '!=' and value != rule.threshold_value:
-                                    is_violation = True
-                                    
-                                if is_violation:
-                                    warning = Warning.objects.create(
-                                        machine=machine,
-                                        rule=rule,
-                                        telemetry=telemetry,
-                                        description=f"Warning: {param} {rule.comparison_operator} {rule.threshold_value} (Actual: {value:.2f})"
-                                    )
-                                    
-                                    Warning.objects.filter(id=warning.id).update(created_at=timestamp)
-                                    
-                                    if random.random() < 0.6:
-                                        resolve_time = timestamp + timedelta(hours=random.randint(1, 24))
-                                        if resolve_time < timezone.now():
-                                            Warning.objects.filter(id=warning.id).update(resolved_at=resolve_time)
-                                    
-                                    if day == 0 and rule.severity == 'critical' and not warning.resolved_at:
-                                        machine.status = 'critical'
-                                        machine.save()
-                                    elif day == 0 and rule.severity in ['high', 'medium'] and not warning.resolved_at and machine.status != 'critical':
-                                        machine.status = 'warning'
-                                        machine.save()
+                        continue
+                    
+                    warning = Warning.objects.create(
+                        machine=machine,
+                        rule=rule,
+                        telemetry=telemetry,
+                        description=f"Warning: {param} {rule.comparison_operator} {rule.threshold_value} (Actual: {value:.2f})",
+                        last_value=value,
+                        last_seen_at=timestamp
+                    )
+                    
+                    Warning.objects.filter(id=warning.id).update(created_at=timestamp)
+                    
+                    resolved = False
+                    if random.random() < 0.6:
+                        resolve_time = timestamp + timedelta(hours=random.randint(1, 24))
+                        if resolve_time < timezone.now():
+                            Warning.objects.filter(id=warning.id).update(resolved_at=resolve_time)
+                            resolved = True
+                    if not resolved:
+                        open_incidents[(machine.id, rule.id)] = warning.id
+                    
+                    if day == 0 and rule.severity == 'critical' and not resolved:
+                        machine.status = 'critical'
+                        machine.save()
+                    elif day == 0 and rule.severity in ['high', 'medium'] and not resolved and machine.status != 'critical':
+                        machine.status = 'warning'
+                        machine.save()
 
     def create_service_records(self, machines):
         self.stdout.write('Creating service records...')
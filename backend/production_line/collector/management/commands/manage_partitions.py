@@ -0,0 +1,77 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from collector.partitions import (
+    INTERVALS, create_default_partition, create_partition, detach_partition, existing_partitions,
+    expired_partitions, is_partitioned, parse_partition_name, partitions_between, today_utc,
+)
+
+
+class Command(BaseCommand):
+    help = ('Pre-create future partitions of the telemetry table and detach (or drop) partitions '
+            'older than the retention window. PostgreSQL only.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', choices=sorted(INTERVALS),
+                            default=settings.TELEMETRY_PARTITION_INTERVAL,
+                            help='Partition size for newly created partitions')
+        parser.add_argument('--ahead', type=int, default=settings.TELEMETRY_PARTITIONS_AHEAD,
+                            help='Create partitions covering this many days ahead of today')
+        parser.add_argument('--retention-days', type=int, default=settings.TELEMETRY_PARTITION_RETENTION_DAYS,
+                            help='Detach partitions whose whole range is older than this many days')
+        parser.add_argument('--drop', action='store_true',
+                            help='Drop expired partitions instead of only detaching them')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only print what would be done')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            self.stdout.write(self.style.WARNING('Telemetry partitioning requires PostgreSQL - nothing to do.'))
+            return
+
+        with connection.cursor() as cursor:
+            if not is_partitioned(cursor):
+                raise CommandError('collector_telemetry is not partitioned - run the migrations first.')
+            existing = set(existing_partitions(cursor))
+
+        today = today_utc()
+        last_day = today + timedelta(days=options['ahead'])
+        dry_run = options['dry_run']
+
+        existing_ranges = [bounds for bounds in map(parse_partition_name, existing) if bounds]
+
+        created = 0
+        for name, start, end in partitions_between(today, last_day, options['interval']):
+            # Also skips ranges already covered by partitions of the other interval
+            if any(start < other_end and other_start < end for other_start, other_end in existing_ranges):
+                continue
+            self.stdout.write(f'Creating {name} [{start}, {end})')
+            if not dry_run:
+                with transaction.atomic(), connection.cursor() as cursor:
+                    create_partition(cursor, name, start, end)
+            created += 1
+
+        if not dry_run:
+            with connection.cursor() as cursor:
+                create_default_partition(cursor)
+
+        removed = 0
+        retention_days = options['retention_days']
+        if retention_days is not None:
+            for name in expired_partitions(sorted(existing), today, retention_days):
+                action = 'Dropping' if options['drop'] else 'Detaching'
+                self.stdout.write(f'{action} {name}')
+                if not dry_run:
+                    with transaction.atomic(), connection.cursor() as cursor:
+                        kept = detach_partition(cursor, name, drop=options['drop'])
+                    if kept:
+                        self.stdout.write(f'  kept {kept} rows referenced by unresolved warnings')
+                removed += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{created} partitions created, {removed} expired partitions '
+            f'{"dropped" if options["drop"] else "detached"}{" (dry run)" if dry_run else ""}'
+        ))
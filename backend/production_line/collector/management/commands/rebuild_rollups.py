@@ -0,0 +1,69 @@
+import time
+from datetime import datetime, time as dt_time, timedelta, timezone as dt_timezone
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Max, Min
+from django.utils.dateparse import parse_date
+
+from collector.models import Machine, Telemetry
+from collector.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = ('Recompute telemetry rollups (1 minute / 1 hour / 1 day) from raw telemetry, one UTC day '
+            'per transaction. Use after backfills or bulk imports; defaults to the whole telemetry span.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help='First day to rebuild (YYYY-MM-DD, UTC)')
+        parser.add_argument('--until', help='Last day to rebuild, inclusive (YYYY-MM-DD, UTC)')
+        parser.add_argument('--machine', action='append', dest='serial_numbers', metavar='SERIAL',
+                            help='Only rebuild this machine (repeatable)')
+
+    def parse_day(self, value, option):
+        day = parse_date(value) if value else None
+        if value and day is None:
+            raise CommandError(f'{option} must be a date in YYYY-MM-DD format')
+        return day
+
+    def handle(self, *args, **options):
+        since = self.parse_day(options['since'], '--since')
+        until = self.parse_day(options['until'], '--until')
+
+        machine_ids = None
+        if options['serial_numbers']:
+            machines = dict(Machine.objects.filter(
+                serial_number__in=options['serial_numbers']
+            ).values_list('serial_number', 'id'))
+            missing = set(options['serial_numbers']) - set(machines)
+            if missing:
+                raise CommandError(f'Unknown serial numbers: {", ".join(sorted(missing))}')
+            machine_ids = list(machines.values())
+
+        if since is None or until is None:
+            telemetry = Telemetry.objects.all()
+            if machine_ids is not None:
+                telemetry = telemetry.filter(machine_id__in=machine_ids)
+            span = telemetry.aggregate(first=Min('timestamp'), last=Max('timestamp'))
+            if span['first'] is None:
+                self.stdout.write('No telemetry to roll up.')
+                return
+            since = since or span['first'].astimezone(dt_timezone.utc).date()
+            until = until or span['last'].astimezone(dt_timezone.utc).date()
+
+        started = time.monotonic()
+        totals = {}
+        day = since
+        while day <= until:
+            start = datetime.combine(day, dt_time.min, tzinfo=dt_timezone.utc)
+            with transaction.atomic():
+                written = rebuild_rollups(start, start + timedelta(days=1), machine_ids=machine_ids)
+            for resolution, count in written.items():
+                totals[resolution] = totals.get(resolution, 0) + count
+            self.stdout.write(f'{day}: ' + ', '.join(f'{count} x {resolution}' for resolution, count in written.items()))
+            day += timedelta(days=1)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt rollups for {since} - {until} in {time.monotonic() - started:.1f}s ('
+            + ', '.join(f'{count} x {resolution}' for resolution, count in totals.items()) + ')'
+        ))
@@ -0,0 +1,72 @@
+import asyncio
+import signal
+
+from django.core.management.base import BaseCommand, CommandError
+
+from collector.async_writer import telemetry_writer
+from collector.line_protocol import LineIngest, start_listener
+
+
+class Command(BaseCommand):
+    help = ('Receive telemetry over plain TCP and UDP as text lines: '
+            '"<serial_number> <parameter> <value> [<timestamp>]", one sample per line, the timestamp '
+            'in epoch seconds or ISO 8601. Samples go through the same validation, rate limits, '
+            'batched writer and warning rules as the HTTP API.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='0.0.0.0', help='Address to listen on (default: 0.0.0.0)')
+        parser.add_argument('--tcp-port', type=int, default=8094, help='TCP port, 0 to disable (default: 8094)')
+        parser.add_argument('--udp-port', type=int, default=8094, help='UDP port, 0 to disable (default: 8094)')
+        parser.add_argument('--ack', action='store_true',
+                            help='Answer every accepted TCP line with "OK <sequence>" (errors are always answered)')
+        parser.add_argument('--stats-interval', type=float, default=60.0,
+                            help='Seconds between counter reports, 0 to disable (default: 60)')
+
+    def handle(self, *args, **options):
+        if not options['tcp_port'] and not options['udp_port']:
+            raise CommandError('Both TCP and UDP are disabled')
+        asyncio.run(self.serve(options))
+
+    async def serve(self, options):
+        loop = asyncio.get_running_loop()
+        stopping = asyncio.Event()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, stopping.set)
+
+        ingest = LineIngest(telemetry_writer, ack=options['ack'])
+        try:
+            server, transport = await start_listener(
+                ingest, options['host'], options['tcp_port'] or None, options['udp_port'] or None
+            )
+        except OSError as e:
+            raise CommandError(f'Cannot listen: {e}')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Listening on {options["host"]} '
+            f'(TCP {options["tcp_port"] or "off"}, UDP {options["udp_port"] or "off"})'
+        ))
+
+        interval = options['stats_interval']
+        while not stopping.is_set():
+            try:
+                await asyncio.wait_for(stopping.wait(), interval or None)
+            except asyncio.TimeoutError:
+                self.report(ingest)
+
+        if server is not None:
+            # Open gateway connections would keep wait_closed() waiting; the writer refuses
+            # their lines once it is closing
+            server.close()
+        if transport is not None:
+            transport.close()
+        # Write whatever is still queued before exiting
+        await telemetry_writer.stop()
+        self.report(ingest)
+
+    def report(self, ingest):
+        writer = telemetry_writer.stats()
+        self.stdout.write(
+            ', '.join(f'{name} {count}' for name, count in ingest.stats().items())
+            + f' | written {writer["written"]}, queue {writer["queue_depth"]}, '
+              f'avg flush {writer["avg_flush_latency_ms"]} ms'
+        )
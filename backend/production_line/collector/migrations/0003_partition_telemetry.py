@@ -0,0 +1,116 @@
+from datetime import timedelta
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+from collector.partitions import (
+    TELEMETRY_TABLE, create_default_partition, create_partition, is_partitioned, partitions_between, today_utc,
+)
+
+LEGACY_TABLE = f'{TELEMETRY_TABLE}_unpartitioned'
+
+
+def _constraints(connection, cursor, table):
+    return connection.introspection.get_constraints(cursor, table)
+
+
+def _recreate_constraints(cursor, constraints, primary_key_columns):
+    for name, info in constraints.items():
+        columns = ', '.join(f'"{column}"' for column in info['columns'])
+        if info['primary_key']:
+            key_columns = ', '.join(f'"{column}"' for column in primary_key_columns)
+            cursor.execute(f'ALTER TABLE "{TELEMETRY_TABLE}" ADD CONSTRAINT "{name}" PRIMARY KEY ({key_columns})')
+        elif info['foreign_key']:
+            to_table, to_column = info['foreign_key']
+            cursor.execute(
+                f'ALTER TABLE "{TELEMETRY_TABLE}" ADD CONSTRAINT "{name}" FOREIGN KEY ({columns}) '
+                f'REFERENCES "{to_table}" ("{to_column}") DEFERRABLE INITIALLY DEFERRED'
+            )
+        elif info['index'] and not info['unique']:
+            cursor.execute(f'CREATE INDEX "{name}" ON "{TELEMETRY_TABLE}" ({columns})')
+
+
+def _swap_table(connection, cursor, partition_by):
+    cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", [TELEMETRY_TABLE])
+    old_sequence = cursor.fetchone()[0]
+    cursor.execute("SELECT COALESCE(MAX(id), 0) FROM %s" % connection.ops.quote_name(TELEMETRY_TABLE))
+    max_id = cursor.fetchone()[0]
+
+    constraints = _constraints(connection, cursor, TELEMETRY_TABLE)
+    cursor.execute(f'ALTER TABLE "{TELEMETRY_TABLE}" RENAME TO "{LEGACY_TABLE}"')
+    cursor.execute(f'ALTER SEQUENCE {old_sequence} RENAME TO "{LEGACY_TABLE}_id_seq"')
+
+    cursor.execute(
+        f'CREATE TABLE "{TELEMETRY_TABLE}" (LIKE "{LEGACY_TABLE}" INCLUDING DEFAULTS) {partition_by}'
+    )
+    cursor.execute(f'CREATE SEQUENCE "{TELEMETRY_TABLE}_id_seq" OWNED BY "{TELEMETRY_TABLE}".id')
+    cursor.execute("SELECT setval(%s, %s, false)", [f'{TELEMETRY_TABLE}_id_seq', max_id + 1])
+    cursor.execute(f"ALTER TABLE \"{TELEMETRY_TABLE}\" ALTER COLUMN id SET DEFAULT nextval('{TELEMETRY_TABLE}_id_seq')")
+    return constraints
+
+
+def partition_telemetry(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql':
+        return
+
+    interval = settings.TELEMETRY_PARTITION_INTERVAL
+    with connection.cursor() as cursor:
+        if is_partitioned(cursor):
+            return
+
+        cursor.execute(f'SELECT MIN("timestamp") FROM "{TELEMETRY_TABLE}"')
+        oldest = cursor.fetchone()[0]
+        constraints = _swap_table(connection, cursor, 'PARTITION BY RANGE ("timestamp")')
+
+        today = today_utc()
+        first_day = oldest.date() if oldest else today
+        last_day = today + timedelta(days=settings.TELEMETRY_PARTITIONS_AHEAD)
+        for name, start, end in partitions_between(first_day, last_day, interval):
+            create_partition(cursor, name, start, end)
+        create_default_partition(cursor)
+
+        cursor.execute(f'INSERT INTO "{TELEMETRY_TABLE}" SELECT * FROM "{LEGACY_TABLE}"')
+        cursor.execute(f'DROP TABLE "{LEGACY_TABLE}"')
+        _recreate_constraints(cursor, constraints, ['id', 'timestamp'])
+
+
+def unpartition_telemetry(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql':
+        return
+
+    with connection.cursor() as cursor:
+        if not is_partitioned(cursor):
+            return
+
+        constraints = _swap_table(connection, cursor, '')
+        cursor.execute(f'INSERT INTO "{TELEMETRY_TABLE}" SELECT * FROM "{LEGACY_TABLE}"')
+        cursor.execute(f'DROP TABLE "{LEGACY_TABLE}" CASCADE')
+        _recreate_constraints(cursor, constraints, ['id'])
+
+
+class Migration(migrations.Migration):
+    """
+    Turns collector_telemetry into a table range-partitioned on timestamp
+    (PostgreSQL only; a no-op elsewhere). Existing rows are copied into
+    partitions covering their time span.
+
+    A partitioned table cannot have a unique index on ``id`` alone, so the
+    primary key becomes (id, timestamp) and Warning.telemetry keeps its column
+    but loses the database-level foreign key constraint.
+    """
+
+    dependencies = [
+        ('collector', '0002_alter_route_start_location'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='warning',
+            name='telemetry',
+            field=models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.SET_NULL, to='collector.telemetry'),
+        ),
+        migrations.RunPython(partition_telemetry, unpartition_telemetry),
+    ]
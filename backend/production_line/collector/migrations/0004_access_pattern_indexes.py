@@ -0,0 +1,31 @@
+# Generated by Django 5.1.7 on 2026-10-17 00:29
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('collector', '0003_partition_telemetry'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='machine',
+            index=models.Index(fields=['status'], name='machine_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='route',
+            index=models.Index(fields=['date', 'status'], name='route_date_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='telemetry',
+            index=models.Index(fields=['machine', 'parameter', '-timestamp'], name='telemetry_machine_param_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='warning',
+            index=models.Index(condition=models.Q(('resolved_at__isnull', True)), fields=['machine'], name='warning_active_machine_idx'),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.1.7 on 2026-10-17 00:36
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def populate_states(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            'INSERT INTO "collector_machineparameterstate" ("machine_id", "parameter", "value", "timestamp", "sample_count") '
+            'SELECT "machine_id", "parameter", "value", "timestamp", samples FROM ('
+            'SELECT "machine_id", "parameter", "value", "timestamp", '
+            'COUNT(*) OVER (PARTITION BY "machine_id", "parameter") AS samples, '
+            'ROW_NUMBER() OVER (PARTITION BY "machine_id", "parameter" ORDER BY "timestamp" DESC, "id" DESC) AS position '
+            'FROM "collector_telemetry") ranked WHERE position = 1'
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('collector', '0005_telemetry_rollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MachineParameterState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('parameter', models.CharField(max_length=50)),
+                ('value', models.FloatField()),
+                ('timestamp', models.DateTimeField()),
+                ('sample_count', models.PositiveBigIntegerField(default=0)),
+                ('machine', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='parameter_states', to='collector.machine')),
+            ],
+            options={
+                'ordering': ['parameter'],
+                'constraints': [models.UniqueConstraint(fields=('machine', 'parameter'), name='machine_parameter_state_unique')],
+            },
+        ),
+        migrations.RunPython(populate_states, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 5.1.7 on 2026-10-17 00:41
+
+from django.db import migrations, models
+from django.db.models import Count, F, Max
+
+
+def merge_open_warnings(apps, schema_editor):
+    """
+    Collapse the open warnings of each (machine, rule) into the oldest one,
+    which becomes the incident; the duplicates are folded into its counters.
+    """
+    Warning = apps.get_model('collector', 'Warning')
+    Warning.objects.update(last_seen_at=F('created_at'))
+
+    duplicated = (
+        Warning.objects.filter(resolved_at__isnull=True, rule__isnull=False)
+        .values('machine_id', 'rule_id').annotate(open_count=Count('id'), last_seen=Max('created_at'))
+        .filter(open_count__gt=1)
+    )
+    for group in duplicated:
+        open_warnings = Warning.objects.filter(
+            resolved_at__isnull=True, machine_id=group['machine_id'], rule_id=group['rule_id']
+        ).order_by('created_at', 'id')
+        incident = open_warnings.first()
+        open_warnings.exclude(id=incident.id).delete()
+        Warning.objects.filter(id=incident.id).update(
+            occurrence_count=group['open_count'], last_seen_at=group['last_seen']
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('collector', '0006_machine_parameter_state'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='warning',
+            name='clear_streak',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='warning',
+            name='last_seen_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='warning',
+            name='last_value',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='warning',
+            name='occurrence_count',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name='warningrule',
+            name='clear_after_samples',
+            field=models.PositiveIntegerField(default=1, help_text='Consecutive samples past the clear level needed to close an open warning'),
+        ),
+        migrations.AddField(
+            model_name='warningrule',
+            name='clear_threshold',
+            field=models.FloatField(blank=True, help_text='Hysteresis: an open warning clears only once the value is back past this level (defaults to the threshold)', null=True),
+        ),
+        migrations.RunPython(merge_open_warnings, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.1.7 on 2026-10-17 00:41
+# Kept apart from 0007 so the index is built after the merged duplicates'
+# deferred foreign key checks have run (PostgreSQL refuses to build an index
+# on a table with pending trigger events).
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('collector', '0007_warning_incidents'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='warning',
+            constraint=models.UniqueConstraint(condition=models.Q(('resolved_at__isnull', True)), fields=('machine', 'rule'), name='warning_open_incident_unique'),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.1.7 on 2026-10-17 00:47
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('collector', '0008_warning_open_incident_unique'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='warningrule',
+            name='min_violations',
+            field=models.PositiveIntegerField(blank=True, help_text='Violating samples (N) among the last M that trigger a count_in_window rule', null=True),
+        ),
+        migrations.AddField(
+            model_name='warningrule',
+            name='rule_type',
+            field=models.CharField(choices=[('threshold', 'Instantaneous Value'), ('moving_average', 'Moving Average'), ('rate_of_change', 'Rate of Change'), ('count_in_window', 'N of Last M Samples')], default='threshold', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='warningrule',
+            name='window_samples',
+            field=models.PositiveIntegerField(blank=True, help_text='Number of recent samples (M) a count_in_window rule looks at; for moving_average the samples needed before the average counts', null=True),
+        ),
+        migrations.AddField(
+            model_name='warningrule',
+            name='window_seconds',
+            field=models.PositiveIntegerField(blank=True, help_text='Time window of moving_average and rate_of_change rules', null=True),
+        ),
+        migrations.CreateModel(
+            name='RuleWindowState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('state', models.JSONField()),
+                ('updated_at', models.DateTimeField()),
+                ('machine', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rule_window_states', to='collector.machine')),
+                ('rule', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='window_states', to='collector.warningrule')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('machine', 'rule'), name='rule_window_state_unique')],
+            },
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.1.7 on 2026-10-17 00:52
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('collector', '0009_windowed_warning_rules'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IngestionKey',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=200, unique=True)),
+                ('created_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('telemetry', models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='collector.telemetry')),
+            ],
+        ),
+    ]
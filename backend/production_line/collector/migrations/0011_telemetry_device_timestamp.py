@@ -0,0 +1,19 @@
+# Generated by Django 5.1.7 on 2026-10-17 00:56
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('collector', '0010_ingestion_key'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='telemetry',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -1,4 +1,6 @@
+from django.core.exceptions import ValidationError
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth.models import User
 import datetime
 
@@ -29,6 +31,11 @@ class Machine(models.Model):
     last_maintenance_date = models.DateField(null=True, blank=True)
     next_maintenance_date = models.DateField(null=True, blank=True)
     
+    class Meta:
+        indexes = [
+            models.Index(fields=['status'], name='machine_status_idx'),
+        ]
+    
     def __str__(self):
         return f"{self.name} ({self.serial_number})"
     
@@ -52,40 +59,164 @@ class WarningRule(models.Model):
         ('!=', 'Not Equal'),
     ]
     
+    RULE_TYPE_CHOICES = [
+        ('threshold', 'Instantaneous Value'),
+        ('moving_average', 'Moving Average'),
+        ('rate_of_change', 'Rate of Change'),
+        ('count_in_window', 'N of Last M Samples'),
+    ]
+    
     name = models.CharField(max_length=100)
     parameter = models.CharField(max_length=50)
     comparison_operator = models.CharField(max_length=2, choices=COMPARISON_CHOICES)
     threshold_value = models.FloatField()
     severity = models.CharField(max_length=10, choices=SEVERITY_CHOICES)
+    clear_threshold = models.FloatField(null=True, blank=True,
+                                        help_text="Hysteresis: an open warning clears only once the value is back past this level (defaults to the threshold)")
+    clear_after_samples = models.PositiveIntegerField(default=1,
+                                                      help_text="Consecutive samples past the clear level needed to close an open warning")
+    rule_type = models.CharField(max_length=20, choices=RULE_TYPE_CHOICES, default='threshold')
+    window_seconds = models.PositiveIntegerField(null=True, blank=True,
+                                                 help_text="Time window of moving_average and rate_of_change rules")
+    window_samples = models.PositiveIntegerField(null=True, blank=True,
+                                                 help_text="Number of recent samples (M) a count_in_window rule looks at; for moving_average the samples needed before the average counts")
+    min_violations = models.PositiveIntegerField(null=True, blank=True,
+                                                 help_text="Violating samples (N) among the last M that trigger a count_in_window rule")
     created_by = models.ForeignKey(User, on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
     
     def __str__(self):
         return f"{self.name} ({self.parameter} {self.comparison_operator} {self.threshold_value})"
+    
+    def clean(self):
+        super().clean()
+        if self.rule_type in ('moving_average', 'rate_of_change') and not self.window_seconds:
+            raise ValidationError({'window_seconds': 'Required for moving average and rate of change rules.'})
+        if self.rule_type == 'rate_of_change' and self.comparison_operator in ('==', '!='):
+            raise ValidationError({'comparison_operator': 'Rate of change rules need an ordering comparison.'})
+        if self.rule_type == 'count_in_window':
+            if not self.window_samples or not self.min_violations:
+                raise ValidationError('Count in window rules need window_samples and min_violations.')
+            if self.min_violations > self.window_samples:
+                raise ValidationError({'min_violations': 'Cannot exceed window_samples.'})
 
 class Telemetry(models.Model):
     machine = models.ForeignKey(Machine, on_delete=models.CASCADE, related_name='telemetry')
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # Device time when the gateway supplies it, arrival time otherwise
+    timestamp = models.DateTimeField(default=timezone.now)
     parameter = models.CharField(max_length=50)
     value = models.FloatField()
     
     class Meta:
         verbose_name_plural = 'Telemetry'
         ordering = ['-timestamp']
+        indexes = [
+            models.Index(fields=['machine', 'parameter', '-timestamp'], name='telemetry_machine_param_ts_idx'),
+        ]
         
     def __str__(self):
         return f"{self.machine.name} - {self.parameter}: {self.value}"
 
+class TelemetryRollup(models.Model):
+    RESOLUTION_CHOICES = [
+        ('1m', '1 Minute'),
+        ('1h', '1 Hour'),
+        ('1d', '1 Day'),
+    ]
+
+    machine = models.ForeignKey(Machine, on_delete=models.CASCADE, related_name='telemetry_rollups')
+    parameter = models.CharField(max_length=50)
+    resolution = models.CharField(max_length=2, choices=RESOLUTION_CHOICES)
+    bucket = models.DateTimeField(help_text="Start of the bucket (UTC)")
+    count = models.PositiveIntegerField()
+    min_value = models.FloatField()
+    max_value = models.FloatField()
+    sum_value = models.FloatField()
+    sum_squares = models.FloatField()
+
+    class Meta:
+        ordering = ['bucket']
+        constraints = [
+            models.UniqueConstraint(fields=['machine', 'parameter', 'resolution', 'bucket'], name='telemetry_rollup_bucket_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.machine_id} - {self.parameter} [{self.resolution} {self.bucket}]: {self.count} samples"
+
+    @property
+    def mean(self):
+        return self.sum_value / self.count
+
+    @property
+    def stddev(self):
+        variance = self.sum_squares / self.count - self.mean ** 2
+        return max(variance, 0.0) ** 0.5
+
+class MachineParameterState(models.Model):
+    machine = models.ForeignKey(Machine, on_delete=models.CASCADE, related_name='parameter_states')
+    parameter = models.CharField(max_length=50)
+    value = models.FloatField()
+    timestamp = models.DateTimeField()
+    sample_count = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        ordering = ['parameter']
+        constraints = [
+            models.UniqueConstraint(fields=['machine', 'parameter'], name='machine_parameter_state_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.machine_id} - {self.parameter}: {self.value} ({self.timestamp})"
+
+class RuleWindowState(models.Model):
+    # Checkpoint of the in-memory window of a windowed rule, so a restart does not start it cold
+    machine = models.ForeignKey(Machine, on_delete=models.CASCADE, related_name='rule_window_states')
+    rule = models.ForeignKey(WarningRule, on_delete=models.CASCADE, related_name='window_states')
+    state = models.JSONField()
+    updated_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['machine', 'rule'], name='rule_window_state_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.machine_id} - rule {self.rule_id} ({self.updated_at})"
+
+class IngestionKey(models.Model):
+    # Idempotency keys of ingested samples; the unique key turns retries into no-ops across workers
+    key = models.CharField(max_length=200, unique=True)
+    # No database constraint (partitioned Telemetry); the id is only reported back to retries
+    telemetry = models.ForeignKey(Telemetry, on_delete=models.DO_NOTHING, null=True, db_constraint=False,
+                                  related_name='+')
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self):
+        return f"{self.key} -> {self.telemetry_id}"
+
 class Warning(models.Model):
     machine = models.ForeignKey(Machine, on_delete=models.CASCADE, related_name='warnings')
     rule = models.ForeignKey(WarningRule, on_delete=models.SET_NULL, null=True)
-    telemetry = models.ForeignKey(Telemetry, on_delete=models.SET_NULL, null=True)
+    # No database constraint: a partitioned Telemetry table has no unique index on id alone
+    telemetry = models.ForeignKey(Telemetry, on_delete=models.SET_NULL, null=True, db_constraint=False)
     created_at = models.DateTimeField(auto_now_add=True)
     resolved_at = models.DateTimeField(null=True, blank=True)
     description = models.TextField()
+    # A warning is an incident: later violations of the same rule update it in place until it clears
+    occurrence_count = models.PositiveIntegerField(default=1)
+    last_value = models.FloatField(null=True, blank=True)
+    last_seen_at = models.DateTimeField(null=True, blank=True)
+    clear_streak = models.PositiveIntegerField(default=0)
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['machine'], condition=models.Q(resolved_at__isnull=True), name='warning_active_machine_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['machine', 'rule'], condition=models.Q(resolved_at__isnull=True),
+                                    name='warning_open_incident_unique'),
+        ]
         
     def __str__(self):
         return f"{self.machine.name} - {self.description}"
@@ -123,6 +254,11 @@ class Route(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    class Meta:
+        indexes = [
+            models.Index(fields=['date', 'status'], name='route_date_status_idx'),
+        ]
+    
     def __str__(self):
         return f"Route {self.name} - {self.date} ({self.technician.username})"
     
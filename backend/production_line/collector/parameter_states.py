@@ -0,0 +1,116 @@
+"""
+Last known value per (machine, parameter).
+
+``MachineParameterState`` is upserted on every ingest so current readings
+are a lookup by machine instead of a scan of the telemetry table. Every
+write bumps the readings version once it commits.
+"""
+from collections import defaultdict
+
+from django.db import connections, transaction
+from django.db.models import QuerySet
+
+from .models import MachineParameterState, Telemetry
+from .versions import READINGS_VERSION, bump_version
+
+_UPSERT_CHUNK_SIZE = 500
+
+_COLUMNS = ('machine_id', 'parameter', 'value', 'timestamp', 'sample_count')
+
+
+def _upsert_sql(connection, rows):
+    quote = connection.ops.quote_name
+    table = quote(MachineParameterState._meta.db_table)
+    placeholders = ', '.join(['(%s)' % ', '.join(['%s'] * len(_COLUMNS))] * rows)
+    newer = f"EXCLUDED.{quote('timestamp')} >= {table}.{quote('timestamp')}"
+
+    return (
+        f"INSERT INTO {table} ({', '.join(quote(name) for name in _COLUMNS)}) VALUES {placeholders} "
+        f"ON CONFLICT ({quote('machine_id')}, {quote('parameter')}) DO UPDATE SET "
+        f"{quote('value')} = CASE WHEN {newer} THEN EXCLUDED.{quote('value')} ELSE {table}.{quote('value')} END, "
+        f"{quote('timestamp')} = CASE WHEN {newer} THEN EXCLUDED.{quote('timestamp')} ELSE {table}.{quote('timestamp')} END, "
+        f"{quote('sample_count')} = {table}.{quote('sample_count')} + EXCLUDED.{quote('sample_count')}"
+    )
+
+
+def update_parameter_states(rows, using='default'):
+    """
+    Fold saved Telemetry instances into the last-known-value table.
+
+    The batch is reduced to its newest sample per (machine, parameter) first,
+    so every pair costs one row of a multi-row upsert. A sample older than
+    the stored one only increases the sample count.
+    """
+    latest = {}
+    for row in rows:
+        key = (row.machine_id, row.parameter)
+        current = latest.get(key)
+        if current is None:
+            latest[key] = [row.value, row.timestamp, 1]
+        else:
+            if row.timestamp >= current[1]:
+                current[0], current[1] = row.value, row.timestamp
+            current[2] += 1
+    if not latest:
+        return 0
+
+    connection = connections[using]
+    items = sorted(latest.items())
+    with connection.cursor() as cursor:
+        for offset in range(0, len(items), _UPSERT_CHUNK_SIZE):
+            chunk = items[offset:offset + _UPSERT_CHUNK_SIZE]
+            params = []
+            for (machine_id, parameter), (value, timestamp, count) in chunk:
+                params.extend([
+                    machine_id, parameter, value, connection.ops.adapt_datetimefield_value(timestamp), count
+                ])
+            cursor.execute(_upsert_sql(connection, len(chunk)), params)
+    _readings_changed(using)
+    return len(items)
+
+
+def rebuild_parameter_states(using='default'):
+    """Recompute the whole table from raw telemetry (after backfills or test data loads)."""
+    connection = connections[using]
+    quote = connection.ops.quote_name
+    states = quote(MachineParameterState._meta.db_table)
+    telemetry = quote(Telemetry._meta.db_table)
+    machine_id, parameter, value, timestamp = map(quote, ('machine_id', 'parameter', 'value', 'timestamp'))
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {states}")
+        cursor.execute(
+            f"INSERT INTO {states} ({', '.join(quote(name) for name in _COLUMNS)}) "
+            f"SELECT {machine_id}, {parameter}, {value}, {timestamp}, samples FROM ("
+            f"SELECT {machine_id}, {parameter}, {value}, {timestamp}, "
+            f"COUNT(*) OVER (PARTITION BY {machine_id}, {parameter}) AS samples, "
+            f"ROW_NUMBER() OVER (PARTITION BY {machine_id}, {parameter} ORDER BY {timestamp} DESC, {quote('id')} DESC) AS position "
+            f"FROM {telemetry}) ranked WHERE position = 1"
+        )
+        rebuilt = cursor.rowcount
+    _readings_changed(using)
+    return rebuilt
+
+
+def _readings_changed(using):
+    transaction.on_commit(lambda: bump_version(READINGS_VERSION), using=using)
+
+
+def current_readings(machine_ids):
+    """
+    Return {machine_id: {parameter: {'value', 'timestamp', 'sample_count'}}}
+    for the given machines with a single indexed query. ``machine_ids`` may
+    be a queryset of machine ids, which is used as a subquery so large
+    fleets do not turn into huge parameter lists.
+    """
+    if isinstance(machine_ids, QuerySet):
+        readings = defaultdict(dict)
+    else:
+        readings = {machine_id: {} for machine_id in machine_ids}
+        machine_ids = list(readings)
+    states = MachineParameterState.objects.filter(machine_id__in=machine_ids).values_list(
+        'machine_id', 'parameter', 'value', 'timestamp', 'sample_count'
+    )
+    for machine_id, parameter, value, timestamp, sample_count in states:
+        readings[machine_id][parameter] = {'value': value, 'timestamp': timestamp, 'sample_count': sample_count}
+    return readings
@@ -0,0 +1,126 @@
+"""
+Helpers for the range-partitioned ``collector_telemetry`` table (PostgreSQL).
+
+Partitions cover whole days or ISO weeks (Monday to Monday, UTC) and are
+named ``collector_telemetry_d20250401`` / ``collector_telemetry_w20250331``
+after their start date. Rows outside every partition land in
+``collector_telemetry_default``.
+"""
+import re
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+
+TELEMETRY_TABLE = 'collector_telemetry'
+DEFAULT_PARTITION = f'{TELEMETRY_TABLE}_default'
+INTERVALS = {'daily': 'd', 'weekly': 'w'}
+
+_PARTITION_NAME_RE = re.compile(rf'^{TELEMETRY_TABLE}_([dw])(\d{{8}})$')
+
+
+def partition_start(day, interval):
+    if isinstance(day, datetime):
+        day = day.astimezone(dt_timezone.utc).date()
+    if interval == 'weekly':
+        return day - timedelta(days=day.weekday())
+    return day
+
+
+def partition_bounds(day, interval):
+    """Return the [start, end) dates of the partition containing ``day``."""
+    start = partition_start(day, interval)
+    return start, start + timedelta(days=7 if interval == 'weekly' else 1)
+
+
+def partition_name(start, interval):
+    return f'{TELEMETRY_TABLE}_{INTERVALS[interval]}{start:%Y%m%d}'
+
+
+def parse_partition_name(name):
+    """Return (start, end) for a partition created by these helpers, else None."""
+    match = _PARTITION_NAME_RE.match(name)
+    if not match:
+        return None
+    start = datetime.strptime(match.group(2), '%Y%m%d').date()
+    return start, start + timedelta(days=7 if match.group(1) == 'w' else 1)
+
+
+def partitions_between(first_day, last_day, interval):
+    """Yield (name, start, end) for every partition overlapping [first_day, last_day]."""
+    start = partition_start(first_day, interval)
+    while start <= last_day:
+        _, end = partition_bounds(start, interval)
+        yield partition_name(start, interval), start, end
+        start = end
+
+
+def _bound(day):
+    return datetime.combine(day, time.min, tzinfo=dt_timezone.utc).isoformat()
+
+
+def is_partitioned(cursor):
+    cursor.execute(
+        "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid "
+        "WHERE c.relname = %s AND pg_table_is_visible(c.oid))",
+        [TELEMETRY_TABLE]
+    )
+    return cursor.fetchone()[0]
+
+
+def existing_partitions(cursor):
+    """Return the names of all partitions currently attached to the telemetry table."""
+    cursor.execute(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid JOIN pg_class p ON p.oid = i.inhparent "
+        "WHERE p.relname = %s AND pg_table_is_visible(p.oid) ORDER BY c.relname",
+        [TELEMETRY_TABLE]
+    )
+    return [row[0] for row in cursor.fetchall()]
+
+
+def create_partition(cursor, name, start, end):
+    cursor.execute(
+        f'CREATE TABLE IF NOT EXISTS "{name}" PARTITION OF "{TELEMETRY_TABLE}" '
+        f"FOR VALUES FROM ('{_bound(start)}') TO ('{_bound(end)}')"
+    )
+
+
+def create_default_partition(cursor):
+    cursor.execute(f'CREATE TABLE IF NOT EXISTS "{DEFAULT_PARTITION}" PARTITION OF "{TELEMETRY_TABLE}" DEFAULT')
+
+
+def detach_partition(cursor, name, drop=False):
+    """
+    Detach a partition from the telemetry table, optionally dropping it.
+
+    Rows still referenced by unresolved warnings are moved back into the
+    parent table (they end up in the default partition) and references from
+    resolved warnings are cleared, so no warning points at a missing row.
+    """
+    cursor.execute(f'ALTER TABLE "{TELEMETRY_TABLE}" DETACH PARTITION "{name}"')
+    cursor.execute(
+        f'INSERT INTO "{TELEMETRY_TABLE}" SELECT * FROM "{name}" WHERE id IN '
+        f'(SELECT telemetry_id FROM collector_warning WHERE resolved_at IS NULL AND telemetry_id IS NOT NULL)'
+    )
+    kept = cursor.rowcount
+    cursor.execute(
+        f'UPDATE collector_warning SET telemetry_id = NULL WHERE resolved_at IS NOT NULL '
+        f'AND telemetry_id IN (SELECT id FROM "{name}")'
+    )
+    if drop:
+        cursor.execute(f'DROP TABLE "{name}"')
+    return kept
+
+
+def expired_partitions(names, today, retention_days):
+    """Return the partitions whose whole range is older than the retention window."""
+    cutoff = today - timedelta(days=retention_days)
+    expired = []
+    for name in names:
+        bounds = parse_partition_name(name)
+        if bounds and bounds[1] <= cutoff:
+            expired.append(name)
+    return expired
+
+
+def today_utc():
+    return datetime.now(dt_timezone.utc).date()
+
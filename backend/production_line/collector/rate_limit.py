@@ -0,0 +1,180 @@
+"""
+Ingestion rate limiting.
+
+Every machine (by serial number) and every API client has a token bucket
+holding up to ``burst`` samples and refilled at ``rate`` samples per
+second. A sample spends one token; samples finding the bucket empty are
+dropped and counted. Machine limits can be set per machine model with
+``TELEMETRY_MACHINE_MODEL_RATE_LIMITS``.
+
+With ``TELEMETRY_RATE_LIMIT_BACKEND = 'local'`` the buckets live in this
+process, so each worker enforces the limits on its own share of the
+traffic. With ``'cache'`` they are approximated by per-window counters in
+the default cache (``burst`` samples per ``burst / rate`` seconds), which
+enforces them across workers when the cache is shared, e.g. Redis or
+Memcached.
+"""
+import math
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+
+CACHE_KEY_PREFIX = 'collector:ratelimit:'
+
+
+def client_id(request, user=None):
+    """
+    Identify the API client of a request: user, then address. The
+    X-Gateway-Id header splits an address into clients only when it comes
+    from one of ``TELEMETRY_TRUSTED_GATEWAY_ADDRESSES`` (a gateway or proxy
+    in front of several); anyone else could rotate it for fresh buckets.
+    Async views pass ``user`` from ``request.auser()``.
+    """
+    user = user if user is not None else getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return f'user:{user.pk}'
+    address = request.META.get('REMOTE_ADDR', 'unknown')
+    gateway = request.headers.get('X-Gateway-Id')
+    if gateway and address in settings.TELEMETRY_TRUSTED_GATEWAY_ADDRESSES:
+        return f'gateway:{gateway}'
+    return f'addr:{address}'
+
+
+def machine_limit(model):
+    """Return (rate, burst) for machines of ``model``."""
+    limit = settings.TELEMETRY_MACHINE_MODEL_RATE_LIMITS.get(model) or settings.TELEMETRY_RATE_LIMITS['machine']
+    return limit['rate'], limit['burst']
+
+
+def client_limit():
+    limit = settings.TELEMETRY_RATE_LIMITS['client']
+    return limit['rate'], limit['burst']
+
+
+def limited_result(index, error, retry_after):
+    """Per-sample result for a sample dropped by a rate limit."""
+    return {'index': index, 'status': 'rate_limited', 'error': error, 'retry_after': round(retry_after, 3)}
+
+
+class TokenBucket:
+    __slots__ = ('tokens', 'updated')
+
+    def __init__(self, burst, now):
+        self.tokens = float(burst)
+        self.updated = now
+
+    def take(self, count, rate, burst, now):
+        """Take up to ``count`` tokens; returns how many were taken."""
+        self.tokens = min(float(burst), self.tokens + (now - self.updated) * rate)
+        self.updated = now
+        taken = min(count, int(self.tokens))
+        self.tokens -= taken
+        return taken
+
+    def wait(self, rate):
+        """Seconds until one more token is available."""
+        return max(1.0 - self.tokens, 0.0) / rate
+
+
+class RateLimiter:
+    """Token buckets keyed by ('machine', serial) or ('client', id), bounded as an LRU."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = OrderedDict()
+        self.admitted = Counter()
+        self.dropped = Counter()
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+            self.admitted.clear()
+            self.dropped.clear()
+
+    def admit(self, kind, key, count, rate, burst):
+        """
+        Admit up to ``count`` samples for ``key``. Returns (admitted,
+        retry_after), where ``retry_after`` is the number of seconds until
+        the next sample would be admitted, or None when all were.
+        """
+        if not settings.TELEMETRY_RATE_LIMIT_ENABLED or count <= 0:
+            return count, None
+
+        if settings.TELEMETRY_RATE_LIMIT_BACKEND == 'cache':
+            admitted, retry_after = self._admit_shared(kind, key, count, rate, burst)
+        else:
+            admitted, retry_after = self._admit_local(kind, key, count, rate, burst)
+
+        with self._lock:
+            self.admitted[kind] += admitted
+            if admitted < count:
+                self.dropped[kind, key] += count - admitted
+        return admitted, retry_after
+
+    def _admit_local(self, kind, key, count, rate, burst):
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get((kind, key))
+            if bucket is None:
+                bucket = self._buckets[kind, key] = TokenBucket(burst, now)
+                while len(self._buckets) > settings.TELEMETRY_RATE_LIMIT_MAX_BUCKETS:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end((kind, key))
+            admitted = bucket.take(count, rate, burst, now)
+            return admitted, bucket.wait(rate) if admitted < count else None
+
+    def _admit_shared(self, kind, key, count, rate, burst):
+        window = max(burst / rate, 1.0)
+        now = time.time()
+        slot = int(now // window)
+        cache_key = f'{CACHE_KEY_PREFIX}{kind}:{key}:{slot}'
+
+        cache.add(cache_key, 0, timeout=math.ceil(window) + 1)
+        try:
+            used = cache.incr(cache_key, count)
+        except ValueError:
+            # The counter expired between add() and incr()
+            cache.add(cache_key, count, timeout=math.ceil(window) + 1)
+            used = count
+
+        over = used - burst
+        if over <= 0:
+            return count, None
+        admitted = max(count - over, 0)
+        # Rejected samples do not use up the window
+        cache.decr(cache_key, count - admitted)
+        return admitted, (slot + 1) * window - now
+
+    def stats(self, top=20):
+        with self._lock:
+            dropped = Counter()
+            for (kind, _), count in self.dropped.items():
+                dropped[kind] += count
+            return {
+                'enabled': settings.TELEMETRY_RATE_LIMIT_ENABLED,
+                'backend': settings.TELEMETRY_RATE_LIMIT_BACKEND,
+                'buckets': len(self._buckets),
+                'admitted': {kind: self.admitted[kind] for kind in ('machine', 'client')},
+                'dropped': {kind: dropped[kind] for kind in ('machine', 'client')},
+                'top_dropped': [
+                    {'kind': kind, 'key': key, 'dropped': count}
+                    for (kind, key), count in self.dropped.most_common(top)
+                ],
+            }
+
+
+rate_limiter = RateLimiter()
+
+
+def admit_client(request, count, user=None):
+    """Admit ``count`` samples from the client of ``request``; returns (admitted, retry_after)."""
+    return rate_limiter.admit('client', client_id(request, user), count, *client_limit())
+
+
+def retry_after_header(seconds):
+    """Retry-After takes whole seconds; never advertise less than one."""
+    return str(max(1, math.ceil(seconds)))
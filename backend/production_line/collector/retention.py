@@ -0,0 +1,146 @@
+"""
+Telemetry retention policy and compaction helpers.
+
+The policy says how many days each tier is kept: raw ``Telemetry`` rows and
+every ``TelemetryRollup`` resolution. ``TELEMETRY_RETENTION_DAYS`` is the
+default and ``TELEMETRY_RETENTION_OVERRIDES`` replaces tiers per parameter.
+Cutoffs are aligned to UTC midnight so whole rollup days are compacted at a
+time.
+"""
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection, transaction
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import Trunc
+
+from .models import Telemetry, TelemetryRollup, Warning
+from .rollups import rebuild_rollups
+
+TIERS = ('raw', '1m', '1h', '1d')
+
+
+def retention_groups():
+    """
+    Return (label, condition, policy) for every group of parameters sharing a
+    policy: one per overridden parameter plus the default for all others.
+    ``condition`` is a Q object on the ``parameter`` field.
+    """
+    overrides = settings.TELEMETRY_RETENTION_OVERRIDES
+    groups = []
+    for parameter, tiers in sorted(overrides.items()):
+        unknown = set(tiers) - set(TIERS)
+        if unknown:
+            raise ImproperlyConfigured(
+                f'Unknown retention tiers for {parameter}: {", ".join(sorted(unknown))} (expected {", ".join(TIERS)})'
+            )
+        groups.append((parameter, Q(parameter=parameter), {**settings.TELEMETRY_RETENTION_DAYS, **tiers}))
+    groups.append(('default', ~Q(parameter__in=list(overrides)), dict(settings.TELEMETRY_RETENTION_DAYS)))
+    return groups
+
+
+def policy_for(parameter):
+    """Return the retention policy that applies to ``parameter``."""
+    return {**settings.TELEMETRY_RETENTION_DAYS, **settings.TELEMETRY_RETENTION_OVERRIDES.get(parameter, {})}
+
+
+def cutoff_for(days, today):
+    """Return the UTC midnight before which a tier kept for ``days`` expires, or None."""
+    if days is None:
+        return None
+    return datetime.combine(today - timedelta(days=days), time.min, tzinfo=dt_timezone.utc)
+
+
+def roll_up_missing(condition, cutoff):
+    """
+    Rebuild rollups for days before ``cutoff`` that have raw rows not yet
+    counted in the daily rollups, so compaction never loses samples.
+    Returns the rebuilt days.
+    """
+    raw = (
+        Telemetry.objects.filter(condition, timestamp__lt=cutoff)
+        .annotate(day=Trunc('timestamp', 'day', tzinfo=dt_timezone.utc))
+        .order_by().values('day', 'parameter').annotate(samples=Count('id'))
+    )
+    rolled = {
+        (row['bucket'], row['parameter']): row['samples']
+        for row in TelemetryRollup.objects.filter(condition, resolution='1d', bucket__lt=cutoff)
+        .order_by().values('bucket', 'parameter').annotate(samples=Sum('count'))
+    }
+
+    missing = {}
+    for row in raw:
+        if row['samples'] > rolled.get((row['day'], row['parameter']), 0):
+            missing.setdefault(row['day'], []).append(row['parameter'])
+
+    for day, parameters in sorted(missing.items()):
+        with transaction.atomic():
+            rebuild_rollups(day, day + timedelta(days=1), parameters=parameters)
+    return sorted(missing)
+
+
+def delete_raw_batch(condition, cutoff, batch_size):
+    """
+    Delete up to ``batch_size`` raw rows older than ``cutoff`` in one short
+    transaction. Rows referenced by unresolved warnings are kept; references
+    from resolved warnings are cleared first. Returns the rows deleted.
+    """
+    protected = Warning.objects.filter(resolved_at__isnull=True, telemetry__isnull=False).values('telemetry_id')
+    with transaction.atomic():
+        ids = list(
+            Telemetry.objects.filter(condition, timestamp__lt=cutoff).exclude(id__in=protected)
+            .order_by().values_list('id', flat=True)[:batch_size]
+        )
+        if not ids:
+            return 0
+        Warning.objects.filter(telemetry_id__in=ids).update(telemetry=None)
+        # Raw DELETE: Telemetry.delete() would load every row to handle the SET_NULL relation.
+        # The timestamp bound lets PostgreSQL prune partitions.
+        table = connection.ops.quote_name(Telemetry._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {table} WHERE {connection.ops.quote_name('timestamp')} < %s "
+                f"AND {connection.ops.quote_name('id')} IN ({', '.join(['%s'] * len(ids))})",
+                [connection.ops.adapt_datetimefield_value(cutoff), *ids]
+            )
+            return cursor.rowcount
+
+
+def delete_rollup_batch(condition, resolution, cutoff, batch_size):
+    """Delete up to ``batch_size`` rollups of ``resolution`` older than ``cutoff``."""
+    with transaction.atomic():
+        ids = list(
+            TelemetryRollup.objects.filter(condition, resolution=resolution, bucket__lt=cutoff)
+            .order_by().values_list('id', flat=True)[:batch_size]
+        )
+        if not ids:
+            return 0
+        deleted, _ = TelemetryRollup.objects.filter(id__in=ids).delete()
+        return deleted
+
+
+def table_size(table):
+    """
+    Return (bytes on disk, estimated live rows) of a table including all of
+    its partitions and indexes, or None when the database cannot tell.
+    """
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT COALESCE(SUM(pg_total_relation_size(t.relid)), 0), COALESCE(SUM(GREATEST(c.reltuples, 0)), 0) "
+            "FROM (SELECT relid FROM pg_partition_tree(%s) UNION SELECT %s::regclass) t "
+            "JOIN pg_class c ON c.oid = t.relid",
+            [table, table]
+        )
+        size, rows = cursor.fetchone()
+    return int(size), int(rows)
+
+
+def vacuum(table):
+    """Run VACUUM ANALYZE so the space of deleted rows can be reused (PostgreSQL only)."""
+    if connection.vendor != 'postgresql':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'VACUUM (ANALYZE) {connection.ops.quote_name(table)}')
@@ -0,0 +1,173 @@
+"""
+Pre-aggregated telemetry rollups.
+
+Every sample is folded into one ``TelemetryRollup`` row per resolution
+(1 minute, 1 hour, 1 day) holding count, min, max, sum and sum of squares, so
+mean and standard deviation over any set of buckets can be derived without
+touching raw telemetry. Buckets are aligned to UTC.
+"""
+from collections import defaultdict
+from datetime import timedelta, timezone as dt_timezone
+
+from django.db import connections
+
+from .models import Telemetry, TelemetryRollup
+
+RESOLUTIONS = {
+    '1m': timedelta(minutes=1),
+    '1h': timedelta(hours=1),
+    '1d': timedelta(days=1),
+}
+
+# Truncation kind used by the database for each resolution
+_TRUNC_KINDS = {'1m': 'minute', '1h': 'hour', '1d': 'day'}
+
+_UPSERT_CHUNK_SIZE = 500
+
+_COLUMNS = ('machine_id', 'parameter', 'resolution', 'bucket', 'count', 'min_value', 'max_value', 'sum_value', 'sum_squares')
+
+
+def bucket_start(timestamp, resolution):
+    """Return the start of the ``resolution`` bucket containing ``timestamp``."""
+    timestamp = timestamp.astimezone(dt_timezone.utc)
+    if resolution == '1m':
+        return timestamp.replace(second=0, microsecond=0)
+    if resolution == '1h':
+        return timestamp.replace(minute=0, second=0, microsecond=0)
+    return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def aggregate(samples):
+    """
+    Fold (machine_id, parameter, timestamp, value) tuples into rollup buckets.
+
+    Returns {(machine_id, parameter, resolution, bucket): [count, min, max, sum, sum_sq]}.
+    """
+    buckets = defaultdict(lambda: [0, float('inf'), float('-inf'), 0.0, 0.0])
+    for machine_id, parameter, timestamp, value in samples:
+        for resolution in RESOLUTIONS:
+            stats = buckets[(machine_id, parameter, resolution, bucket_start(timestamp, resolution))]
+            stats[0] += 1
+            if value < stats[1]:
+                stats[1] = value
+            if value > stats[2]:
+                stats[2] = value
+            stats[3] += value
+            stats[4] += value * value
+    return buckets
+
+
+def _upsert_sql(connection, rows):
+    quote = connection.ops.quote_name
+    table = quote(TelemetryRollup._meta.db_table)
+    least, greatest = ('LEAST', 'GREATEST') if connection.vendor == 'postgresql' else ('MIN', 'MAX')
+    placeholders = ', '.join(['(%s)' % ', '.join(['%s'] * len(_COLUMNS))] * rows)
+
+    def column(name):
+        return f'{table}.{quote(name)}'
+
+    return (
+        f"INSERT INTO {table} ({', '.join(quote(name) for name in _COLUMNS)}) VALUES {placeholders} "
+        f"ON CONFLICT ({', '.join(quote(name) for name in _COLUMNS[:4])}) DO UPDATE SET "
+        f"{quote('count')} = {column('count')} + EXCLUDED.{quote('count')}, "
+        f"{quote('min_value')} = {least}({column('min_value')}, EXCLUDED.{quote('min_value')}), "
+        f"{quote('max_value')} = {greatest}({column('max_value')}, EXCLUDED.{quote('max_value')}), "
+        f"{quote('sum_value')} = {column('sum_value')} + EXCLUDED.{quote('sum_value')}, "
+        f"{quote('sum_squares')} = {column('sum_squares')} + EXCLUDED.{quote('sum_squares')}"
+    )
+
+
+def apply_rollups(rows, using='default'):
+    """
+    Add saved Telemetry instances to their rollup buckets.
+
+    Samples are pre-aggregated in memory, so each bucket costs one row in a
+    multi-row ``INSERT ... ON CONFLICT DO UPDATE`` regardless of how many
+    samples fall into it. Buckets are written in key order to keep
+    concurrent writers from deadlocking on each other.
+    """
+    buckets = aggregate((row.machine_id, row.parameter, row.timestamp, row.value) for row in rows)
+    if not buckets:
+        return 0
+
+    connection = connections[using]
+    items = sorted(buckets.items())
+    with connection.cursor() as cursor:
+        for offset in range(0, len(items), _UPSERT_CHUNK_SIZE):
+            chunk = items[offset:offset + _UPSERT_CHUNK_SIZE]
+            params = []
+            for (machine_id, parameter, resolution, bucket), stats in chunk:
+                params.extend([machine_id, parameter, resolution, connection.ops.adapt_datetimefield_value(bucket)])
+                params.extend(stats)
+            cursor.execute(_upsert_sql(connection, len(chunk)), params)
+    return len(items)
+
+
+def _insert_select_sql(connection, resolution, source_table, source_columns, where):
+    quote = connection.ops.quote_name
+    timestamp, count, min_value, max_value, sum_value, sum_squares = source_columns
+    trunc_sql, trunc_params = connection.ops.datetime_trunc_sql(_TRUNC_KINDS[resolution], timestamp, (), 'UTC')
+    sql = (
+        f"INSERT INTO {quote(TelemetryRollup._meta.db_table)} ({', '.join(quote(name) for name in _COLUMNS)}) "
+        f"SELECT {quote('machine_id')}, {quote('parameter')}, %s, {trunc_sql}, "
+        f"{count}, MIN({min_value}), MAX({max_value}), SUM({sum_value}), {sum_squares} "
+        f"FROM {quote(source_table)} WHERE {where} GROUP BY 1, 2, 4"
+    )
+    return sql, [resolution, *trunc_params]
+
+
+def _in_filter(connection, column, values):
+    if values is None:
+        return '', []
+    return f" AND {connection.ops.quote_name(column)} IN ({', '.join(['%s'] * len(values))})", list(values)
+
+
+def rebuild_rollups(start, end, machine_ids=None, parameters=None, using='default'):
+    """
+    Recompute all rollups for buckets in [start, end) from raw telemetry.
+
+    ``start`` and ``end`` must be aligned to UTC days so every resolution
+    covers the same samples. One-minute buckets are aggregated from the raw
+    rows with a single INSERT ... SELECT, coarser ones from the one-minute
+    buckets. Existing rollups in the range (optionally limited to some
+    machines or parameters) are replaced. Returns the number of rollup rows
+    written per resolution.
+    """
+    connection = connections[using]
+    quote = connection.ops.quote_name
+    start = connection.ops.adapt_datetimefield_value(start)
+    end = connection.ops.adapt_datetimefield_value(end)
+
+    machine_filter, machine_params = _in_filter(connection, 'machine_id', machine_ids)
+    parameter_filter, parameter_params = _in_filter(connection, 'parameter', parameters)
+    filters = machine_filter + parameter_filter
+    filter_params = machine_params + parameter_params
+
+    written = {}
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {quote(TelemetryRollup._meta.db_table)} "
+            f"WHERE {quote('bucket')} >= %s AND {quote('bucket')} < %s{filters}",
+            [start, end, *filter_params]
+        )
+
+        value = quote('value')
+        sql, params = _insert_select_sql(
+            connection, '1m', Telemetry._meta.db_table,
+            (quote('timestamp'), 'COUNT(*)', value, value, value, f'SUM({value} * {value})'),
+            f"{quote('timestamp')} >= %s AND {quote('timestamp')} < %s{filters}",
+        )
+        cursor.execute(sql, params + [start, end, *filter_params])
+        written['1m'] = cursor.rowcount
+
+        for resolution in ('1h', '1d'):
+            sql, params = _insert_select_sql(
+                connection, resolution, TelemetryRollup._meta.db_table,
+                (quote('bucket'), f"SUM({quote('count')})", quote('min_value'), quote('max_value'),
+                 quote('sum_value'), f"SUM({quote('sum_squares')})"),
+                f"{quote('resolution')} = '1m' AND {quote('bucket')} >= %s AND {quote('bucket')} < %s{filters}",
+            )
+            cursor.execute(sql, params + [start, end, *filter_params])
+            written[resolution] = cursor.rowcount
+
+    return written
@@ -0,0 +1,92 @@
+"""
+Serialized route details.
+
+Everything ``route_details`` returns except current readings is built with
+two queries (the route with its technician, then the stops with machine,
+location and open-warning count) and cached in the default
+cache under the route's version, the machine state version and the
+technicians version. Any change to the route, its stops, its technician, or
+a machine's fields, location, status or open warnings bumps one of them, so a cached payload is never stale for longer than it
+takes the change to commit. Readings change with every sample and are
+merged in fresh by the view.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, FilteredRelation, Q
+
+from .models import Route, RouteStop
+from .versions import MACHINE_STATE_VERSION, TECHNICIANS_VERSION, get_version
+
+CACHE_KEY_PREFIX = 'collector:route_payload:'
+
+
+def route_version_name(route_id):
+    return f'route:{route_id}'
+
+
+def build_route_payload(route_id):
+    """Return the route details payload without readings, or None for an unknown route."""
+    route = Route.objects.select_related('technician').filter(id=route_id).first()
+    if route is None:
+        return None
+
+    stops = RouteStop.objects.filter(route_id=route_id).select_related('machine__location').annotate(
+        open_warnings=FilteredRelation(
+            'machine__warnings', condition=Q(machine__warnings__resolved_at__isnull=True)
+        ),
+        warnings_count=Count('open_warnings'),
+    ).order_by('order')
+
+    stops_data = []
+    for stop in stops:
+        machine = stop.machine
+        location = machine.location
+        stops_data.append({
+            'order': stop.order,
+            'machine_id': machine.id,
+            'machine_name': machine.name,
+            'status': machine.status,
+            'model': machine.model,
+            'address': location.address if location else None,
+            'lat': float(location.latitude) if location else None,
+            'lng': float(location.longitude) if location else None,
+            'service_time': stop.estimated_service_time,
+            'completed': stop.completed,
+            'warnings_count': stop.warnings_count,
+        })
+
+    technician = route.technician
+    return {
+        'id': route.id,
+        'name': route.name,
+        'technician': {
+            'id': technician.id,
+            'name': f"{technician.first_name} {technician.last_name}".strip() or technician.username
+        },
+        'date': route.date,
+        'status': route.status,
+        'estimated_duration': route.estimated_duration,
+        'is_delegation': route.is_delegation,
+        'start_location': route.start_location,
+        'stops': stops_data
+    }
+
+
+def route_payload(route_id):
+    """
+    Cached build_route_payload(). ``ROUTE_DETAILS_CACHE_TIMEOUT`` bounds how
+    long an unchanged payload stays in the cache; 0 turns the cache off.
+    """
+    timeout = settings.ROUTE_DETAILS_CACHE_TIMEOUT
+    if not timeout:
+        return build_route_payload(route_id)
+
+    key = (f'{CACHE_KEY_PREFIX}{route_id}:'
+           f'{get_version(route_version_name(route_id))}:{get_version(MACHINE_STATE_VERSION)}:'
+           f'{get_version(TECHNICIANS_VERSION)}')
+    payload = cache.get(key)
+    if payload is None:
+        payload = build_route_payload(route_id)
+        if payload is not None:
+            cache.set(key, payload, timeout)
+    return payload
@@ -0,0 +1,361 @@
+"""
+Incremental state for windowed warning rules.
+
+Every (machine, rule) pair of a windowed rule owns a small window object
+that folds in one sample at a time at constant amortised cost:
+
+* ``moving_average``: the samples of the last ``window_seconds`` in a ring
+  buffer plus their running sum; the mean is compared to the threshold once
+  the window holds at least ``window_samples`` samples (when set).
+* ``rate_of_change``: a monotonic deque holding the window minimum (for
+  ``>``/``>=``) or maximum (for ``<``/``<=``); the change of the current
+  value against it is compared to the threshold, so "rise > 5 within 60 s"
+  is ``>`` 5 over 60 seconds and a drop is ``<`` -5.
+* ``count_in_window``: whether each of the last ``window_samples`` samples
+  violated the threshold and how many did; ``min_violations`` of them
+  trigger the rule.
+
+Recent telemetry is never re-read. Windows live in process memory and are
+checkpointed to ``RuleWindowState`` every ``RULE_WINDOW_CHECKPOINT_INTERVAL``
+seconds, so a restarted worker carries on from its last checkpoint.
+
+Samples only reach the shared windows once the transaction that stored
+them commits. Until then, the transaction's own thread judges its samples
+on copies of the windows it touched, so a rolled back batch leaves no trace
+in them (or in later checkpoints).
+
+Windows are kept in sample time order. A late sample is inserted at its
+place (a scan from the newest end, so cost grows only with how late it is)
+or ignored when it is older than the window; the verdict returned is always
+the one for the window ending at its newest sample.
+"""
+import logging
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from django.db import DatabaseError, connections, transaction
+from django.utils import timezone
+
+from .models import RuleWindowState
+from .rules import COMPARATORS, is_cleared, rule_engine
+
+logger = logging.getLogger(__name__)
+
+
+def _position(items, timestamp):
+    """Index at which a sample taken at ``timestamp`` belongs in time-ordered ``items``."""
+    position = len(items)
+    # Late samples are usually only a little late, so scan from the newest end
+    while position and items[position - 1][0] > timestamp:
+        position -= 1
+    return position
+
+
+class MovingAverageWindow:
+    __slots__ = ('config', 'span', 'samples', 'total')
+
+    def __init__(self, rule, state=None):
+        self.config = self.config_for(rule)
+        self.span = rule.window_seconds
+        self.samples = deque((timestamp, value) for timestamp, value in (state or {}).get('samples', ()))
+        self.total = sum(value for _, value in self.samples)
+
+    @staticmethod
+    def config_for(rule):
+        return [rule.rule_type, rule.window_seconds]
+
+    def push(self, rule, timestamp, value):
+        samples = self.samples
+        if not samples or timestamp >= samples[-1][0]:
+            samples.append((timestamp, value))
+            self.total += value
+        elif timestamp > samples[-1][0] - self.span:
+            samples.insert(_position(samples, timestamp), (timestamp, value))
+            self.total += value
+
+        horizon = samples[-1][0] - self.span
+        while len(samples) > 1 and (samples[0][0] <= horizon or len(samples) > settings.RULE_WINDOW_MAX_SAMPLES):
+            _, dropped = samples.popleft()
+            self.total -= dropped
+
+        mean = self.total / len(samples)
+        if len(samples) < (rule.window_samples or 1):
+            # Too few samples for a meaningful average yet: neither trigger nor clear
+            return mean, False, False
+        return mean, COMPARATORS[rule.comparison_operator](mean, rule.threshold_value), is_cleared(rule, mean)
+
+    def state(self):
+        return {'config': self.config, 'samples': list(self.samples)}
+
+
+class RateOfChangeWindow:
+    __slots__ = ('config', 'span', 'falling', 'extremes')
+
+    def __init__(self, rule, state=None):
+        self.config = self.config_for(rule)
+        self.span = rule.window_seconds
+        self.falling = rule.comparison_operator in ('<', '<=')
+        self.extremes = deque((timestamp, value) for timestamp, value in (state or {}).get('extremes', ()))
+
+    @staticmethod
+    def config_for(rule):
+        return [rule.rule_type, rule.window_seconds, rule.comparison_operator in ('<', '<=')]
+
+    def _dominates(self, kept, value):
+        # A newer sample at least as extreme makes an older one irrelevant for the window extreme
+        return kept <= value if not self.falling else kept >= value
+
+    def push(self, rule, timestamp, value):
+        # Monotonic deque in time order: the front is the window minimum (maximum when
+        # watching for drops) and the back is always the newest sample
+        extremes = self.extremes
+        if not extremes or timestamp >= extremes[-1][0]:
+            while extremes and self._dominates(value, extremes[-1][1]):
+                extremes.pop()
+            extremes.append((timestamp, value))
+        elif timestamp > extremes[-1][0] - self.span:
+            position = _position(extremes, timestamp)
+            if not self._dominates(extremes[position][1], value):
+                while position and self._dominates(value, extremes[position - 1][1]):
+                    position -= 1
+                    del extremes[position]
+                extremes.insert(position, (timestamp, value))
+
+        horizon = extremes[-1][0] - self.span
+        while len(extremes) > 1 and extremes[0][0] <= horizon:
+            extremes.popleft()
+
+        change = extremes[-1][1] - extremes[0][1]
+        return change, COMPARATORS[rule.comparison_operator](change, rule.threshold_value), is_cleared(rule, change)
+
+    def state(self):
+        return {'config': self.config, 'extremes': list(self.extremes)}
+
+
+class CountInWindow:
+    __slots__ = ('config', 'samples', 'count')
+
+    def __init__(self, rule, state=None):
+        self.config = self.config_for(rule)
+        self.samples = deque(
+            ((timestamp, flag) for timestamp, flag in (state or {}).get('samples', ())), maxlen=rule.window_samples
+        )
+        self.count = sum(flag for _, flag in self.samples)
+
+    @staticmethod
+    def config_for(rule):
+        return [rule.rule_type, rule.window_samples, rule.comparison_operator, rule.threshold_value]
+
+    def push(self, rule, timestamp, value):
+        samples = self.samples
+        flag = int(COMPARATORS[rule.comparison_operator](value, rule.threshold_value))
+        position = _position(samples, timestamp)
+        # A full window keeps the newest samples: one older than all of them does not count
+        if len(samples) == samples.maxlen and position:
+            self.count -= samples.popleft()[1]
+            position -= 1
+        if len(samples) < samples.maxlen:
+            samples.insert(position, (timestamp, flag))
+            self.count += flag
+        return self.count, self.count >= rule.min_violations, self.count < rule.min_violations
+
+    def state(self):
+        return {'config': self.config, 'samples': list(self.samples)}
+
+
+WINDOW_TYPES = {
+    'moving_average': MovingAverageWindow,
+    'rate_of_change': RateOfChangeWindow,
+    'count_in_window': CountInWindow,
+}
+
+
+def _matching(window, rule):
+    """``window`` if it was built for the rule's current settings, else a new empty one."""
+    window_type = WINDOW_TYPES[rule.rule_type]
+    if window is None or window.config != window_type.config_for(rule):
+        return window_type(rule)
+    return window
+
+
+class _Delta:
+    """
+    The samples one observe() call folded in, as (key, rule, timestamp,
+    value). Registered with ``transaction.on_commit``, which drops it again
+    if the transaction (or its savepoint) rolls back.
+    """
+    __slots__ = ('store', 'generation', 'samples', 'applied')
+
+    def __init__(self, store, generation):
+        self.store = store
+        self.generation = generation
+        self.samples = []
+        self.applied = False
+
+    def __call__(self):
+        self.store._commit(self)
+
+
+class WindowStore:
+    """
+    Process-local windows keyed by (machine_id, rule_id).
+
+    A window whose rule settings changed since it was built (or checkpointed)
+    starts over empty.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._windows = {}
+        self._dirty = set()
+        self._checkpointed_at = time.monotonic()
+        # Per thread: the observe() calls of its open transaction and the window copies they advanced
+        self._local = threading.local()
+        self._generation = 0
+
+    def clear(self):
+        with self._lock:
+            self._windows.clear()
+            self._dirty.clear()
+            self._generation += 1
+
+    def forget_rule(self, rule_id):
+        with self._lock:
+            for key in [key for key in self._windows if key[1] == rule_id]:
+                del self._windows[key]
+                self._dirty.discard(key)
+
+    def _restore(self, keys):
+        """Load checkpoints for windows not in memory, with one query."""
+        missing = {key for key in keys if key not in self._windows}
+        if not missing:
+            return
+        checkpoints = RuleWindowState.objects.filter(
+            machine_id__in={machine_id for machine_id, _ in missing},
+            rule_id__in={rule_id for _, rule_id in missing},
+        ).values_list('machine_id', 'rule_id', 'state')
+        for machine_id, rule_id, state in checkpoints:
+            rule = rule_engine.rule(rule_id)
+            if (machine_id, rule_id) in missing and rule is not None:
+                window_type = WINDOW_TYPES[rule.rule_type]
+                if state.get('config') == window_type.config_for(rule):
+                    self._windows[machine_id, rule_id] = window_type(rule, state)
+
+    def observe(self, samples, using='default'):
+        """
+        Fold samples, given as (index, machine_id, parameter, value,
+        telemetry), into the windows of their parameter's windowed rules;
+        the shared windows take them once the transaction commits.
+
+        Returns {index: [(rule, metric, violated, cleared), ...]}, where
+        ``metric`` is the windowed quantity compared to the threshold.
+        """
+        pending = []
+        for index, machine_id, parameter, value, telemetry in samples:
+            compiled = rule_engine.rules_for(parameter)
+            if compiled is not None and compiled.windowed:
+                pending.append((index, machine_id, value, telemetry.timestamp.timestamp(), compiled.windowed))
+        if not pending:
+            return {}
+
+        connection = connections[using]
+        results = {}
+        with self._lock:
+            self._restore({(machine_id, rule.id) for _, machine_id, _, _, rules in pending for rule in rules})
+            windows = self._transaction_windows(connection)
+            delta = _Delta(self, self._generation)
+            for index, machine_id, value, timestamp, rules in pending:
+                outcomes = results[index] = []
+                for rule in rules:
+                    key = (machine_id, rule.id)
+                    window = windows.get(key)
+                    window = windows[key] = _matching(window, rule) if window is not None else self._copy(key, rule)
+                    outcomes.append((rule, *window.push(rule, timestamp, value)))
+                    delta.samples.append((key, rule, timestamp, value))
+            self._local.deltas.append(delta)
+        transaction.on_commit(delta, using=using)
+        return results
+
+    def _transaction_windows(self, connection):
+        """
+        The calling thread's window copies for its open transaction. They are
+        dropped once an observe() call behind them committed or rolled back,
+        so ones that may still commit are replayed onto fresh copies.
+        """
+        local = self._local
+        deltas = getattr(local, 'deltas', [])
+        registered = {id(callback) for _, callback, _ in connection.run_on_commit}
+        live = [delta for delta in deltas
+                if id(delta) in registered and not delta.applied and delta.generation == self._generation]
+        if len(live) != len(deltas) or not hasattr(local, 'windows'):
+            local.windows = {}
+        local.deltas = live
+        return local.windows
+
+    def _copy(self, key, rule):
+        """A copy of the shared window, with the samples of the open transaction replayed."""
+        shared = _matching(self._windows.get(key), rule)
+        window = type(shared)(rule, shared.state())
+        for delta in self._local.deltas:
+            for sample_key, sample_rule, timestamp, value in delta.samples:
+                if sample_key == key:
+                    window = _matching(window, sample_rule)
+                    window.push(sample_rule, timestamp, value)
+        return window
+
+    def _commit(self, delta):
+        """Fold a committed observe() call's samples into the shared windows."""
+        delta.applied = True
+        with self._lock:
+            if delta.generation != self._generation:
+                return
+            self._restore({key for key, _, _, _ in delta.samples})
+            for key, rule, timestamp, value in delta.samples:
+                if rule_engine.rule(rule.id) is None:
+                    continue
+                window = self._windows[key] = _matching(self._windows.get(key), rule)
+                window.push(rule, timestamp, value)
+                self._dirty.add(key)
+        self.checkpoint()
+
+    def checkpoint(self, force=False):
+        """
+        Upsert the windows changed since the last checkpoint, at most once per
+        ``RULE_WINDOW_CHECKPOINT_INTERVAL`` unless ``force`` is set. Returns
+        the number of windows written.
+        """
+        now = time.monotonic()
+        if not force and now - self._checkpointed_at < settings.RULE_WINDOW_CHECKPOINT_INTERVAL:
+            return 0
+
+        with self._lock:
+            updated_at = timezone.now()
+            states = [
+                RuleWindowState(machine_id=machine_id, rule_id=rule_id,
+                                state=self._windows[machine_id, rule_id].state(), updated_at=updated_at)
+                for machine_id, rule_id in sorted(self._dirty)
+                if rule_engine.rule(rule_id) is not None
+            ]
+            self._checkpointed_at = now
+            if not states:
+                self._dirty.clear()
+                return 0
+            try:
+                with transaction.atomic():
+                    RuleWindowState.objects.bulk_create(
+                        states, update_conflicts=True,
+                        unique_fields=['machine', 'rule'], update_fields=['state', 'updated_at'],
+                    )
+            except DatabaseError:
+                # Typically a machine deleted meanwhile. The windows stay in memory and are
+                # written again once they see new samples.
+                logger.exception('Failed to checkpoint %d rule windows', len(states))
+                return 0
+            finally:
+                self._dirty.clear()
+            return len(states)
+
+
+window_store = WindowStore()
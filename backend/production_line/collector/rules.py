@@ -0,0 +1,218 @@
+import operator
+import threading
+import time
+from collections import defaultdict
+
+import numpy as np
+from django.conf import settings
+
+from .models import WarningRule
+from .versions import get_version
+
+RULES_VERSION = 'warning_rules'
+
+# Below this many samples the NumPy setup costs more than per-sample evaluation saves
+VECTORIZE_MIN_BATCH = 64
+
+COMPARATORS = {
+    '>': operator.gt,
+    '>=': operator.ge,
+    '<': operator.lt,
+    '<=': operator.le,
+    '==': operator.eq,
+    '!=': operator.ne,
+}
+
+VECTOR_COMPARATORS = {
+    '>': np.greater,
+    '>=': np.greater_equal,
+    '<': np.less,
+    '<=': np.less_equal,
+    '==': np.equal,
+    '!=': np.not_equal,
+}
+
+
+def is_cleared(rule, value):
+    """
+    True when ``value`` is back past the rule's clear level: the threshold,
+    or ``clear_threshold`` when the rule defines a hysteresis band.
+    """
+    clear_level = rule.threshold_value if rule.clear_threshold is None else rule.clear_threshold
+    return not COMPARATORS[rule.comparison_operator](value, clear_level)
+
+
+class ParameterRules:
+    """
+    Compiled rules for a single parameter.
+
+    Upper-bound rules (``>``, ``>=``) are sorted by ascending threshold and
+    lower-bound rules (``<``, ``<=``) by descending threshold, so that once a
+    value fails one rule it fails every later one in the same list and the
+    scan can stop. Equality rules are always checked in full. Windowed rules
+    are only collected here; their state lives in ``rule_windows``.
+
+    For columnar batches each instantaneous rule is also kept as a NumPy
+    comparison and its threshold, see ``evaluate_columns``.
+    """
+    __slots__ = ('upper', 'lower', 'other', 'windowed', 'threshold_rules', 'vector')
+
+    def __init__(self, rules):
+        upper, lower, other, windowed = [], [], [], []
+        for rule in rules:
+            compiled = (COMPARATORS[rule.comparison_operator], rule.threshold_value, rule)
+            if rule.rule_type != 'threshold':
+                windowed.append(rule)
+            elif rule.comparison_operator in ('>', '>='):
+                upper.append(compiled)
+            elif rule.comparison_operator in ('<', '<='):
+                lower.append(compiled)
+            else:
+                other.append(compiled)
+
+        # At equal thresholds the inclusive comparison is the weaker one, so it goes first
+        upper.sort(key=lambda c: (c[1], c[2].comparison_operator != '>='))
+        lower.sort(key=lambda c: (-c[1], c[2].comparison_operator != '<='))
+
+        self.upper = upper
+        self.lower = lower
+        self.other = other
+        self.windowed = windowed
+
+        self.threshold_rules = [rule for _, _, rule in upper + lower + other]
+        self.vector = [
+            (VECTOR_COMPARATORS[rule.comparison_operator], rule.threshold_value) for rule in self.threshold_rules
+        ]
+
+    def evaluate(self, value):
+        triggered = []
+        for compare, threshold, rule in self.upper:
+            if not compare(value, threshold):
+                break
+            triggered.append(rule)
+        for compare, threshold, rule in self.lower:
+            if not compare(value, threshold):
+                break
+            triggered.append(rule)
+        for compare, threshold, rule in self.other:
+            if compare(value, threshold):
+                triggered.append(rule)
+        return triggered
+
+
+def evaluate_columns(index, parameters, codes, values):
+    """
+    Evaluate instantaneous rules for a columnar batch with one array
+    comparison per rule over the samples of its parameter.
+
+    ``codes[i]`` is the position of sample i's parameter in ``parameters``
+    and ``values[i]`` its value. Returns ``(rules, mask)``, where
+    ``mask[i, j]`` is True when sample i violates ``rules[j]``.
+    """
+    codes = np.asarray(codes)
+    values = np.asarray(values, dtype=float)
+
+    compiled = []
+    rules = []
+    for code, parameter in enumerate(parameters):
+        parameter_rules = index.get(parameter)
+        if parameter_rules is not None and parameter_rules.threshold_rules:
+            compiled.append((code, parameter_rules, len(rules)))
+            rules.extend(parameter_rules.threshold_rules)
+
+    # Column-major, so every rule writes one contiguous column
+    mask = np.zeros((len(values), len(rules)), dtype=bool, order='F')
+    for code, parameter_rules, offset in compiled:
+        rows = np.flatnonzero(codes == code)
+        if not rows.size:
+            continue
+        sample_values = values[rows]
+        for column, (compare, threshold) in enumerate(parameter_rules.vector, offset):
+            mask[rows, column] = compare(sample_values, threshold)
+    return rules, mask
+
+
+class RuleEngine:
+    """
+    In-memory index of all WarningRule rows, keyed by parameter.
+
+    The index is rebuilt lazily whenever the shared ``warning_rules`` version
+    stamp changes. The stamp is checked at most once every
+    ``RULE_ENGINE_VERSION_CHECK_INTERVAL`` seconds so the hot path does not
+    touch the cache on every sample.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._index = {}
+        self._rules = {}
+        self._version = None
+        self._checked_at = 0.0
+
+    def invalidate(self):
+        """Force a rebuild on the next evaluation in this process."""
+        self._version = None
+        self._checked_at = 0.0
+
+    def refresh(self):
+        now = time.monotonic()
+        if self._version is not None and now - self._checked_at < settings.RULE_ENGINE_VERSION_CHECK_INTERVAL:
+            return
+
+        version = get_version(RULES_VERSION)
+        with self._lock:
+            if version != self._version:
+                self._index, self._rules = self._build()
+                self._version = version
+            self._checked_at = now
+
+    def _build(self):
+        rules_by_parameter = defaultdict(list)
+        rules_by_id = {}
+        for rule in WarningRule.objects.all():
+            rules_by_parameter[rule.parameter].append(rule)
+            rules_by_id[rule.id] = rule
+        index = {parameter: ParameterRules(rules) for parameter, rules in rules_by_parameter.items()}
+        return index, rules_by_id
+
+    def rules_for(self, parameter):
+        self.refresh()
+        return self._index.get(parameter)
+
+    def rule(self, rule_id):
+        """Return the WarningRule with this id, or None if it no longer exists."""
+        self.refresh()
+        return self._rules.get(rule_id)
+
+    def evaluate(self, parameter, value):
+        """Return the instantaneous-value WarningRule objects violated by ``value``."""
+        compiled = self.rules_for(parameter)
+        if compiled is None:
+            return []
+        return compiled.evaluate(value)
+
+    def evaluate_columns(self, parameters, codes, values):
+        """Columnar counterpart of ``evaluate``; see the module-level ``evaluate_columns``."""
+        self.refresh()
+        return evaluate_columns(self._index, parameters, codes, values)
+
+    def evaluate_batch(self, samples):
+        """
+        Evaluate (parameter, value) pairs, returning the violated
+        instantaneous rules of each pair in order. Large batches go through
+        ``evaluate_columns``; per-sample evaluation is cheaper for small ones.
+        """
+        if len(samples) < VECTORIZE_MIN_BATCH:
+            return [self.evaluate(parameter, value) for parameter, value in samples]
+
+        lookup = {}
+        codes = [lookup.setdefault(parameter, len(lookup)) for parameter, _ in samples]
+        rules, mask = self.evaluate_columns(list(lookup), codes, [value for _, value in samples])
+
+        triggered = [[] for _ in samples]
+        for row, column in zip(*np.nonzero(mask)):
+            triggered[row].append(rules[column])
+        return triggered
+
+
+rule_engine = RuleEngine()
@@ -1,3 +1,7 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
 from rest_framework import serializers
 from .models import Machine, Location, Telemetry, Warning, WarningRule, ServiceRecord
 
@@ -18,7 +22,8 @@ class WarningRuleSerializer(serializers.ModelSerializer):
     class Meta:
         model = WarningRule
         fields = ['id', 'name', 'parameter', 'comparison_operator', 'threshold_value', 
-                  'severity', 'created_at']
+                  'severity', 'clear_threshold', 'clear_after_samples', 'rule_type', 'window_seconds',
+                  'window_samples', 'min_violations', 'created_at']
 
 class TelemetrySerializer(serializers.ModelSerializer):
     class Meta:
@@ -31,7 +36,8 @@ class WarningSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = Warning
-        fields = ['id', 'machine', 'rule', 'created_at', 'resolved_at', 'description', 'is_active']
+        fields = ['id', 'machine', 'rule', 'created_at', 'resolved_at', 'description', 'is_active',
+                  'occurrence_count', 'last_value', 'last_seen_at']
 
 class ServiceRecordSerializer(serializers.ModelSerializer):
     resolved_warnings = WarningSerializer(many=True, read_only=True)
@@ -47,3 +53,21 @@ class TelemetryInputSerializer(serializers.Serializer):
                                     help_text="Nazwa parametru telemetrii")
     value = serializers.FloatField(required=True,
                                 help_text="Wartość parametru telemetrii")
+    timestamp = serializers.DateTimeField(required=False,
+                                          help_text="Czas pomiaru na urządzeniu (ISO 8601); domyślnie czas odbioru")
+    idempotency_key = serializers.CharField(max_length=128, required=False,
+                                            help_text="Klucz idempotencji - ponowienie z tym samym kluczem nie zapisuje duplikatu")
+    gateway_id = serializers.CharField(max_length=50, required=False,
+                                       help_text="Identyfikator bramki; razem z sequence tworzy klucz idempotencji")
+    sequence = serializers.IntegerField(min_value=0, required=False,
+                                        help_text="Numer sekwencyjny próbki nadany przez bramkę")
+
+    def validate_timestamp(self, value):
+        if value > timezone.now() + timedelta(seconds=settings.TELEMETRY_MAX_CLOCK_SKEW):
+            raise serializers.ValidationError('Timestamp is in the future')
+        return value
+
+    def validate(self, data):
+        if ('gateway_id' in data) != ('sequence' in data):
+            raise serializers.ValidationError('gateway_id and sequence must be given together')
+        return data
@@ -0,0 +1,81 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .machine_cache import MACHINE_REGISTRY_VERSION, machine_cache
+from .models import Location, Machine, Route, RouteStop, Warning, WarningRule
+from .route_payload import route_version_name
+from .rule_windows import window_store
+from .rules import RULES_VERSION, rule_engine
+from .versions import MACHINE_STATE_VERSION, ROUTES_VERSION, TECHNICIANS_VERSION, bump_version
+
+
+def _bump_rules_version():
+    bump_version(RULES_VERSION)
+    rule_engine.invalidate()
+
+
+@receiver(post_save, sender=WarningRule)
+@receiver(post_delete, sender=WarningRule)
+def warning_rules_changed(sender, **kwargs):
+    # Bump immediately so this process sees the change inside the current
+    # transaction, and again on commit so workers that rebuilt in between
+    # pick up the committed state.
+    _bump_rules_version()
+    transaction.on_commit(_bump_rules_version)
+
+
+@receiver(post_delete, sender=WarningRule)
+def warning_rule_deleted(sender, instance, **kwargs):
+    window_store.forget_rule(instance.id)
+
+
+def _bump_machine_registry_version():
+    bump_version(MACHINE_REGISTRY_VERSION)
+    machine_cache.clear()
+
+
+@receiver(post_save, sender=Machine)
+@receiver(post_delete, sender=Machine)
+def machines_changed(sender, **kwargs):
+    _bump_machine_registry_version()
+    transaction.on_commit(_bump_machine_registry_version)
+
+
+def _bump_now_and_on_commit(name):
+    bump_version(name)
+    transaction.on_commit(lambda: bump_version(name))
+
+
+@receiver(post_save, sender=Machine)
+@receiver(post_delete, sender=Machine)
+@receiver(post_save, sender=Location)
+@receiver(post_delete, sender=Location)
+@receiver(post_save, sender=Warning)
+@receiver(post_delete, sender=Warning)
+def machine_state_changed(sender, **kwargs):
+    # Ingestion writes warnings in bulk and bumps the version itself; this covers admin and API edits
+    _bump_now_and_on_commit(MACHINE_STATE_VERSION)
+
+
+@receiver(post_save, sender=Route)
+@receiver(post_delete, sender=Route)
+def route_changed(sender, instance, **kwargs):
+    _bump_now_and_on_commit(route_version_name(instance.id))
+    _bump_now_and_on_commit(ROUTES_VERSION)
+
+
+@receiver(post_save, sender=RouteStop)
+@receiver(post_delete, sender=RouteStop)
+def route_stops_changed(sender, instance, **kwargs):
+    _bump_now_and_on_commit(route_version_name(instance.route_id))
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def technicians_changed(sender, update_fields=None, **kwargs):
+    # Logging in only stamps last_login, which no route shows
+    if update_fields is not None and set(update_fields) == {'last_login'}:
+        return
+    _bump_now_and_on_commit(TECHNICIANS_VERSION)
@@ -1,9 +1,34 @@
-from django.test import TestCase
-from django.db import connections
+from django.test import TestCase, override_settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.utils import timezone
+from io import StringIO
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+import asyncio
+import json
+import socket
+import tempfile
+import threading
+from django.db import connections, models, transaction
 from django.db.utils import OperationalError
 import psycopg2
-from .models import Machine, Warning, Telemetry, WarningRule
+from .models import IngestionKey, Location, Machine, Route, RouteStop, MachineParameterState, RuleWindowState, Warning, Telemetry, TelemetryRollup, WarningRule
 from django.contrib.auth.models import User
+from .partitions import expired_partitions, parse_partition_name, partition_bounds, partition_name, partitions_between
+from .copy_loader import copy_buffer, load_telemetry
+from .async_writer import QueueFull, TelemetryWriter, telemetry_writer
+from .downsampling import lttb_indices
+from .events import event_bus, frame_id
+from .idempotency import recent_keys
+from .ingestion import ingest_samples
+from .line_protocol import LineIngest, parse_line, start_listener
+from .machine_cache import machine_cache
+from .parameter_states import rebuild_parameter_states, update_parameter_states
+from .rate_limit import rate_limiter
+from .rollups import bucket_start
+from .rule_windows import CountInWindow, MovingAverageWindow, RateOfChangeWindow, window_store
+from .rules import RULES_VERSION, VECTORIZE_MIN_BATCH, rule_engine
+from .versions import READINGS_VERSION, SNAPSHOT_KEY_PREFIX, bump_version
 
 class PostgreSQLConnectionTestCase(TestCase):
     """Test cases for PostgreSQL database connection."""
@@ -143,3 +168,1762 @@ class TelemetryModelTestCase(TestCase):
         self.assertEqual(telemetry.machine, self.machine)
         self.assertEqual(telemetry.parameter, "temperature")
         self.assertEqual(telemetry.value, 75.0)
+
+class TelemetryBatchIngestionTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="testuser", password="password")
+
+        self.machine = Machine.objects.create(
+            name="Test Machine",
+            serial_number="SN12345",
+            model="Model X",
+            manufacturer="Manufacturer Y",
+            status="operational",
+            installation_date="2025-04-01"
+        )
+        self.other_machine = Machine.objects.create(
+            name="Other Machine",
+            serial_number="SN67890",
+            model="Model X",
+            manufacturer="Manufacturer Y",
+            status="operational",
+            installation_date="2025-04-01"
+        )
+
+        WarningRule.objects.create(
+            name="High Temperature",
+            parameter="temperature",
+            comparison_operator=">",
+            threshold_value=85.0,
+            severity="high",
+            created_by=self.user
+        )
+        WarningRule.objects.create(
+            name="Critical Temperature",
+            parameter="temperature",
+            comparison_operator=">",
+            threshold_value=95.0,
+            severity="critical",
+            created_by=self.user
+        )
+
+    def test_batch_creates_telemetry_and_warnings(self):
+        response = self.client.post('/telemetry/receive/batch/', [
+            {'serial_number': 'SN12345', 'parameter': 'temperature', 'value': 90.0},
+            {'serial_number': 'SN67890', 'parameter': 'temperature', 'value': 99.0},
+            {'serial_number': 'SN67890', 'parameter': 'pressure', 'value': 30.0},
+        ], content_type='application/json')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['created'], 3)
+        results = response.json()['results']
+        self.assertEqual(len(results[0]['warnings_triggered']), 1)
+        self.assertEqual(len(results[1]['warnings_triggered']), 2)
+        self.assertEqual(results[2]['warnings_triggered'], [])
+
+        self.assertEqual(Telemetry.objects.count(), 3)
+        self.assertEqual(Warning.objects.count(), 3)
+        self.machine.refresh_from_db()
+        self.other_machine.refresh_from_db()
+        self.assertEqual(self.machine.status, 'warning')
+        self.assertEqual(self.other_machine.status, 'critical')
+
+    def test_batch_reports_per_item_errors(self):
+        response = self.client.post('/telemetry/receive/batch/', {'samples': [
+            {'serial_number': 'SN12345', 'parameter': 'temperature', 'value': 70.0},
+            {'serial_number': 'UNKNOWN', 'parameter': 'temperature', 'value': 70.0},
+            {'serial_number': 'SN12345', 'parameter': 'temperature', 'value': 'hot'},
+        ]}, content_type='application/json')
+
+        self.assertEqual(response.status_code, 207)
+        statuses = [result['status'] for result in response.json()['results']]
+        self.assertEqual(statuses, ['created', 'not_found', 'invalid'])
+        self.assertEqual(Telemetry.objects.count(), 1)
+
+    def test_batch_accepts_ndjson(self):
+        body = (
+            '{"serial_number": "SN12345", "parameter": "temperature", "value": 70.0}\n'
+            '\n'
+            '{"serial_number": "SN67890", "parameter": "temperature", "value": 71.0}\n'
+        )
+        response = self.client.post('/telemetry/receive/batch/', body, content_type='application/x-ndjson')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Telemetry.objects.count(), 2)
+
+    def test_single_sample_endpoint(self):
+        response = self.client.post('/telemetry/receive/', {
+            'serial_number': 'SN12345', 'parameter': 'temperature', 'value': 97.0
+        }, content_type='application/json')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.json()['warnings_triggered']), 2)
+
+        response = self.client.post('/telemetry/receive/', {
+            'serial_number': 'UNKNOWN', 'parameter': 'temperature', 'value': 97.0
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 404)
+
+class RuleEngineTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="testuser", password="password")
+
+    def create_rule(self, name, parameter, operator, threshold, severity="high"):
+        return WarningRule.objects.create(
+            name=name,
+            parameter=parameter,
+            comparison_operator=operator,
+            threshold_value=threshold,
+            severity=severity,
+            created_by=self.user
+        )
+
+    def test_threshold_ordering(self):
+        high = self.create_rule("High", "temperature", ">", 85.0)
+        critical = self.create_rule("Critical", "temperature", ">", 95.0, "critical")
+        at_limit = self.create_rule("At limit", "temperature", ">=", 95.0)
+        low_oil = self.create_rule("Low oil", "oil_level", "<", 15.0)
+        empty_oil = self.create_rule("Empty oil", "oil_level", "<=", 5.0, "critical")
+
+        self.assertEqual(rule_engine.evaluate("temperature", 80.0), [])
+        self.assertEqual(rule_engine.evaluate("temperature", 95.0), [high, at_limit])
+        self.assertEqual(rule_engine.evaluate("temperature", 99.0), [high, at_limit, critical])
+        self.assertEqual(rule_engine.evaluate("oil_level", 5.0), [low_oil, empty_oil])
+        self.assertEqual(rule_engine.evaluate("oil_level", 20.0), [])
+        self.assertEqual(rule_engine.evaluate("rpm", 5000.0), [])
+
+    def test_rebuilds_on_rule_changes(self):
+        rule = self.create_rule("High", "temperature", ">", 85.0)
+        self.assertEqual(rule_engine.evaluate("temperature", 90.0), [rule])
+
+        rule.threshold_value = 92.0
+        rule.save()
+        self.assertEqual(rule_engine.evaluate("temperature", 90.0), [])
+
+        rule.delete()
+        self.assertEqual(rule_engine.evaluate("temperature", 99.0), [])
+
+    @override_settings(RULE_ENGINE_VERSION_CHECK_INTERVAL=0)
+    def test_picks_up_version_bumped_elsewhere(self):
+        rule = self.create_rule("High", "temperature", ">", 85.0)
+        self.assertEqual(rule_engine.evaluate("temperature", 90.0), [rule])
+
+        # Simulates a change made by another worker process
+        WarningRule.objects.filter(id=rule.id).update(threshold_value=95.0)
+        self.assertEqual(rule_engine.evaluate("temperature", 90.0), [rule])
+
+        bump_version(RULES_VERSION)
+        self.assertEqual(rule_engine.evaluate("temperature", 90.0), [])
+
+    def test_columnar_evaluation_matches_per_sample(self):
+        high = self.create_rule("High", "temperature", ">", 85.0)
+        at_limit = self.create_rule("At limit", "temperature", ">=", 95.0)
+        low_oil = self.create_rule("Low oil", "oil_level", "<", 15.0)
+        stopped = self.create_rule("Stopped", "rpm", "==", 0.0)
+
+        parameters = ["temperature", "oil_level", "rpm", "humidity"]
+        codes = [0, 0, 0, 1, 1, 2, 2, 3]
+        values = [80.0, 95.0, 99.0, 10.0, 20.0, 0.0, 900.0, 99.0]
+        rules, mask = rule_engine.evaluate_columns(parameters, codes, values)
+
+        self.assertEqual(rules, [high, at_limit, low_oil, stopped])
+        for row, (code, value) in enumerate(zip(codes, values)):
+            violated = [rule for rule, hit in zip(rules, mask[row]) if hit]
+            self.assertEqual(violated, rule_engine.evaluate(parameters[code], value))
+
+    def test_large_batches_are_vectorised(self):
+        high = self.create_rule("High", "temperature", ">", 85.0)
+        low_oil = self.create_rule("Low oil", "oil_level", "<", 15.0)
+
+        samples = [("temperature", 80.0 + i % 10) for i in range(100)] + [("oil_level", 10.0), ("rpm", 1.0)]
+        self.assertGreaterEqual(len(samples), VECTORIZE_MIN_BATCH)
+        self.assertEqual(
+            rule_engine.evaluate_batch(samples),
+            [rule_engine.evaluate(parameter, value) for parameter, value in samples]
+        )
+        self.assertEqual(rule_engine.evaluate_batch(samples)[-2:], [[low_oil], []])
+        self.assertEqual(rule_engine.evaluate_batch(samples)[9], [high])
+
+class MachineCacheTestCase(TestCase):
+    def setUp(self):
+        self.machine = Machine.objects.create(
+            name="Test Machine",
+            serial_number="SN12345",
+            model="Model X",
+            manufacturer="Manufacturer Y",
+            status="operational",
+            installation_date="2025-04-01"
+        )
+        machine_cache.clear()
+        machine_cache.hits = machine_cache.negative_hits = machine_cache.misses = machine_cache.evictions = 0
+
+    def test_hot_path_stops_querying_machines(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(machine_cache.resolve("SN12345").id, self.machine.id)
+        with self.assertNumQueries(0):
+            self.assertEqual(machine_cache.resolve("SN12345").id, self.machine.id)
+
+        stats = self.client.get('/telemetry/stats/').json()['machine_cache']
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['misses'], 1)
+
+    def test_unknown_serials_are_negatively_cached(self):
+        with self.assertNumQueries(1):
+            self.assertIsNone(machine_cache.resolve("BAD-SERIAL"))
+        with self.assertNumQueries(0):
+            self.assertIsNone(machine_cache.resolve("BAD-SERIAL"))
+        self.assertEqual(machine_cache.negative_hits, 1)
+
+    def test_machine_changes_invalidate_cache(self):
+        self.assertIsNone(machine_cache.resolve("SN-NEW"))
+
+        new_machine = Machine.objects.create(
+            name="New Machine",
+            serial_number="SN-NEW",
+            model="Model X",
+            manufacturer="Manufacturer Y",
+            installation_date="2025-04-01"
+        )
+        self.assertEqual(machine_cache.resolve("SN-NEW").id, new_machine.id)
+
+        self.machine.status = 'maintenance'
+        self.machine.save()
+        self.assertEqual(machine_cache.resolve("SN12345").status, 'maintenance')
+
+        self.machine.delete()
+        self.assertIsNone(machine_cache.resolve("SN12345"))
+
+    def test_rolled_back_escalation_leaves_cached_status(self):
+        user = User.objects.create_user(username="testuser", password="password")
+        WarningRule.objects.create(name="Critical Temperature", parameter="temperature", comparison_operator=">",
+                                   threshold_value=100.0, severity="critical", created_by=user)
+        sample = {'serial_number': 'SN12345', 'parameter': 'temperature', 'value': 150.0}
+
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                self.assertEqual(ingest_samples([sample])[0]['status'], 'created')
+                raise RuntimeError
+        self.assertEqual(machine_cache.resolve("SN12345").status, 'operational')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            ingest_samples([sample])
+        self.machine.refresh_from_db()
+        self.assertEqual(self.machine.status, 'critical')
+        self.assertEqual(machine_cache.resolve("SN12345").status, 'critical')
+
+    @override_settings(MACHINE_CACHE_SIZE=2)
+    def test_cache_is_bounded(self):
+        machine_cache.resolve_many(["SN12345", "A", "B"])
+        self.assertEqual(machine_cache.stats()['size'], 2)
+        self.assertEqual(machine_cache.evictions, 1)
+
+class AsyncTelemetryWriterTestCase(TestCase):
+    def setUp(self):
+        self.machine = Machine.objects.create(
+            name="Test Machine",
+            serial_number="SN12345",
+            model="Model X",
+            manufacturer="Manufacturer Y",
+            status="operational",
+            installation_date="2025-04-01"
+        )
+
+    async def test_async_endpoint_queues_and_flushes(self):
+        response = await self.async_client.post('/telemetry/receive/async/', [
+            {'serial_number': 'SN12345', 'parameter': 'temperature', 'value': 70.0},
+            {'serial_number': 'SN12345', 'parameter': 'temperature', 'value': 'hot'},
+            {'serial_number': 'SN12345', 'parameter': 'pressure', 'value': 30.0},
+        ], content_type='application/json')
+
+        self.assertEqual(response.status_code, 202)
+        body = response.json()
+        self.assertEqual(body['accepted'], 2)
+        self.assertEqual(body['sequence'], body['first_sequence'] + 1)
+        self.assertEqual(body['rejected'][0]['index'], 1)
+
+        await telemetry_writer.stop()
+        self.assertEqual(await Telemetry.objects.acount(), 2)
+        self.assertEqual(telemetry_writer.stats()['queue_depth'], 0)
+
+    @override_settings(TELEMETRY_QUEUE_SIZE=2, TELEMETRY_FLUSH_INTERVAL=60)
+    async def test_backpressure_when_queue_is_full(self):
+        writer = TelemetryWriter()
+        sample = {'serial_number': 'SN12345', 'parameter': 'temperature', 'value': 70.0}
+
+        self.assertEqual(writer.submit([sample, sample]), [1, 2])
+        with self.assertRaises(QueueFull):
+            writer.submit([sample])
+        self.assertEqual(writer.rejected, 1)
+
+        await writer.stop()
+        self.assertEqual(writer.written, 2)
+        self.assertEqual(writer.flushes, 1)
+        self.assertEqual(await Telemetry.objects.acount(), 2)
+
+class TelemetryCopyLoaderTestCase(TestCase):
+    def setUp(self):
+        self.machine = Machine.objects.create(
+            name="Test Machine",
+            serial_number="SN12345",
+            model="Model X",
+            manufacturer="Manufacturer Y",
+            status="operational",
+            installation_date="2025-04-01"
+        )
+
+    def test_copy_buffer_escapes_text(self):
+        row = Telemetry(id=7, machine_id=3, parameter="odd\tname\n", value=1.5,
+                        timestamp=timezone.now().replace(microsecond=0))
+        line = copy_buffer([row]).getvalue()
+
+        self.assertEqual(line.count("\t"), 4)
+        self.assertTrue(line.startswith("7\t3\t"))
+        self.assertIn("odd\\tname\\n", line)
+        self.assertTrue(line.endswith("\t1.5\n"))
+
+    def test_load_falls_back_to_bulk_create(self):
+        rows = load_telemetry([
+            Telemetry(machine=self.machine, parameter="temperature", value=float(i)) for i in range(3)
+        ])
+
+        self.assertTrue(all(row.id for row in rows))
+        self.assertEqual(Telemetry.objects.count(), 3)
+
+    def test_import_command(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv') as csv_file:
+            csv_file.write("serial_number,parameter,value,timestamp\n")
+            csv_file.write("SN12345,temperature,71.5,2025-04-01T10:00:00\n")
+            csv_file.write("SN12345,pressure,not-a-number,\n")
+            csv_file.write("UNKNOWN,temperature,70.0,\n")
+            csv_file.write("SN12345,pressure,30,\n")
+            csv_file.write(f"SN12345,{'p' * 51},1,\n")
+            csv_file.flush()
+
+            out, err = StringIO(), StringIO()
+            call_command('import_telemetry', csv_file.name, '--batch-size', '2', stdout=out, stderr=err)
+
+        self.assertIn("Imported 2 rows (3 skipped)", out.getvalue())
+        self.assertIn("Record 5 skipped: parameter must be 1-50 characters", err.getvalue())
+        self.assertEqual(Telemetry.objects.filter(machine=self.machine).count(), 2)
+
+class TelemetryPartitionTestCase(TestCase):
+    def test_partition_bounds(self):
+        self.assertEqual(partition_bounds(date(2025, 4, 2), 'daily'), (date(2025, 4, 2), date(2025, 4, 3)))
+        # Weekly partitions start on Monday
+        self.assertEqual(partition_bounds(date(2025, 4, 2), 'weekly'), (date(2025, 3, 31), date(2025, 4, 7)))
+
+    def test_partition_names_round_trip(self):
+        name = partition_name(date(2025, 3, 31), 'weekly')
+        self.assertEqual(name, 'collector_telemetry_w20250331')
+        self.assertEqual(parse_partition_name(name), (date(2025, 3, 31), date(2025, 4, 7)))
+        self.assertIsNone(parse_partition_name('collector_telemetry_default'))
+
+    def test_partitions_between_and_expiry(self):
+        names = [name for name, _, _ in partitions_between(date(2025, 4, 1), date(2025, 4, 3), 'daily')]
+        self.assertEqual(names, [
+            'collector_telemetry_d20250401', 'collector_telemetry_d20250402', 'collector_telemetry_d20250403'
+        ])
+        self.assertEqual(
+            expired_partitions(names + ['collector_telemetry_default'], date(2025, 4, 5), 2),
+            ['collector_telemetry_d20250401', 'collector_telemetry_d20250402']
+        )
+
+    def test_command_is_noop_without_postgresql(self):
+        from django.db import connection
+        if connection.vendor == 'postgresql':
+            self.skipTest('Runs only on non-PostgreSQL backends')
+        out = StringIO()
+        call_command('manage_partitions', stdout=out)
+        self.assertIn('requires PostgreSQL', out.getvalue())
+
+class AccessPatternIndexTestCase(TestCase):
+    def test_indexes_exist(self):
+        from django.db import connection
+        expected = {
+            'collector_machine': 'machine_status_idx',
+            'collector_telemetry': 'telemetry_machine_param_ts_idx',
+            'collector_warning': 'warning_active_machine_idx',
+            'collector_route': 'route_date_status_idx',
+        }
+        with connection.cursor() as cursor:
+            for table, index_name in expected.items():
+                self.assertIn(index_name, connection.introspection.get_constraints(cursor, table))
+
+class TelemetryRollupTestCase(TestCase):
+    def setUp(self):
+        self.machine = Machine.objects.create(
+            name="Test Machine",
+            serial_number="SN12345",
+            model="Model X",
+            manufacturer="Manufacturer Y",
+            status="operational",
+            installation_date="2025-04-01"
+        )
+
+    def test_bucket_start(self):
+        timestamp = datetime(2025, 4, 1, 10, 17, 42, 5000, tzinfo=dt_timezone.utc)
+        self.assertEqual(bucket_start(timestamp, '1m'), datetime(2025, 4, 1, 10, 17, tzinfo=dt_timezone.utc))
+        self.assertEqual(bucket_start(timestamp, '1h'), datetime(2025, 4, 1, 10, tzinfo=dt_timezone.utc))
+        self.assertEqual(bucket_start(timestamp, '1d'), datetime(2025, 4, 1, tzinfo=dt_timezone.utc))
+
+    def test_ingestion_updates_rollups_incrementally(self):
+        for values in ([10.0, 20.0], [30.0]):
+            self.client.post('/telemetry/receive/batch/', [
+                {'serial_number': 'SN12345', 'parameter': 'temperature', 'value': value} for value in values
+            ], content_type='application/json')
+
+        rollups = TelemetryRollup.objects.filter(machine=self.machine, parameter='temperature')
+        self.assertEqual(set(rollups.values_list('resolution', flat=True)), {'1m', '1h', '1d'})
+        daily = rollups.get(resolution='1d')
+        self.assertEqual(daily.count, 3)
+        self.assertEqual((daily.min_value, daily.max_value), (10.0, 30.0))
+        self.assertEqual(daily.mean, 20.0)
+        self.assertAlmostEqual(daily.stddev, (200 / 3) ** 0.5)
+        self.assertEqual(rollups.filter(resolution='1m').aggregate(total=models.Sum('count'))['total'], 3)
+
+    def test_rebuild_command(self):
+        day = datetime(2025, 4, 1, tzinfo=dt_timezone.utc)
+        for offset, value in [(timedelta(minutes=5), 1.0), (timedelta(minutes=5, seconds=30), 3.0),
+                              (timedelta(hours=2), 5.0), (timedelta(days=1, hours=1), 7.0)]:
+            telemetry = Telemetry.objects.create(machine=self.machine, parameter='rpm', value=value)
+            Telemetry.objects.filter(id=telemetry.id).update(timestamp=day + offset)
+        TelemetryRollup.objects.all().delete()
+
+        out = StringIO()
+        call_command('rebuild_rollups', stdout=out)
+        self.assertIn('Rebuilt rollups for 2025-04-01 - 2025-04-02', out.getvalue())
+
+        minute = TelemetryRollup.objects.get(resolution='1m', bucket=day + timedelta(minutes=5))
+        self.assertEqual((minute.count, minute.min_value, minute.max_value, minute.sum_value, minute.sum_squares),
+                         (2, 1.0, 3.0, 4.0, 10.0))
+        self.assertEqual(TelemetryRollup.objects.filter(resolution='1h').count(), 3)
+        first_day = TelemetryRollup.objects.get(resolution='1d', bucket=day)
+        self.assertEqual((first_day.count, first_day.sum_value, first_day.sum_squares), (3, 9.0, 35.0))
+
+        # Rebuilding is idempotent
+        call_command('rebuild_rollups', '--since', '2025-04-01', '--until', '2025-04-01', stdout=StringIO())
+        self.assertEqual(TelemetryRollup.objects.get(resolution='1d', bucket=day).count, 3)
+
+@override_settings(
+    TELEMETRY_RETENTION_DAYS={'raw': 14, '1m': 30, '1h': 730, '1d': None},
+    TELEMETRY_RETENTION_OVERRIDES={'rpm': {'raw': 30}},
+)
+class TelemetryCompactionTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="testuser", password="password")
+        self.machine = Machine.objects.create(
+            name="Test Machine",
+            serial_number="SN12345",
+            model="Model X",
+            manufacturer="Manufacturer Y",
+            status="operational",
+            installation_date="2025-04-01"
+        )
+        self.old = timezone.now() - timedelta(days=20)
+
+    def create_telemetry(self, parameter, value, timestamp):
+        telemetry = Telemetry.objects.create(machine=self.machine, parameter=parameter, value=value)
+        Telemetry.objects.filter(id=telemetry.id).update(timestamp=timestamp)
+        return telemetry
+
+    def test_compaction_respects_policy_and_unresolved_warnings(self):
+        expired = [self.create_telemetry('temperature', value, self.old) for value in (1.0, 2.0, 3.0, 4.0)]
+        recent = self.create_telemetry('temperature', 5.0, timezone.now())
+        kept_rpm = self.create_telemetry('rpm', 1500.0, self.old)
+        active = Warning.objects.create(machine=self.machine, telemetry=expired[0], description="Active")
+        resolved = Warning.objects.create(machine=self.machine, telemetry=expired[1], description="Resolved",
+                                          resolved_at=timezone.now())
+        TelemetryRollup.objects.all().delete()
+
+        out = StringIO()
+        call_command('compact_telemetry', '--batch-size', '2', stdout=out)
+
+        self.assertEqual(
+            set(Telemetry.objects.values_list('id', flat=True)), {expired[0].id, recent.id, kept_rpm.id}
+        )
+        active.refresh_from_db()
+        resolved.refresh_from_db()
+        self.assertEqual(active.telemetry_id, expired[0].id)
+        self.assertIsNone(resolved.telemetry_id)
+
+        # Expired raw data was rolled up before it was deleted
+        daily = TelemetryRollup.objects.get(parameter='temperature', resolution='1d', bucket__lt=self.old)
+        self.assertEqual((daily.count, daily.sum_value), (4, 10.0))
+        self.assertIn('raw: 3 rows', out.getvalue())
+        self.assertIn('rows/s', out.getvalue())
+
+        # Re-running neither deletes more nor double counts
+        call_command('compact_telemetry', stdout=StringIO())
+        self.assertEqual(Telemetry.objects.count(), 3)
+        self.assertEqual(TelemetryRollup.objects.get(id=daily.id).count, 4)
+
+    def test_expired_rollups_are_deleted(self):
+        for resolution in ('1m', '1h', '1d'):
+            TelemetryRollup.objects.create(
+                machine=self.machine, parameter='temperature', resolution=resolution,
+                bucket=bucket_start(timezone.now() - timedelta(days=40), resolution),
+                count=1, min_value=1.0, max_value=1.0, sum_value=1.0, sum_squares=1.0
+            )
+
+        call_command('compact_telemetry', stdout=StringIO())
+
+        self.assertEqual(set(TelemetryRollup.objects.values_list('resolution', flat=True)), {'1h', '1d'})
+
+class MachineParameterStateTestCase(TestCase):
+    def setUp(self):
+        self.machine = Machine.objects.create(
+            name="Test Machine",
+            serial_number="SN12345",
+            model="Model X",
+            manufacturer="Manufacturer Y",
+            status="operational",
+            installation_date="2025-04-01"
+        )
+
+    def test_ingest_keeps_latest_value_and_count(self):
+        for values in ([70.0, 71.0], [72.0]):
+            self.client.post('/telemetry/receive/batch/', [
+                {'serial_number': 'SN12345', 'parameter': 'temperature', 'value': value} for value in values
+            ], content_type='application/json')
+
+        state = MachineParameterState.objects.get(machine=self.machine, parameter='temperature')
+        self.assertEqual((state.value, state.sample_count), (72.0, 3))
+
+        # An older sample arriving late only counts
+        update_parameter_states([Telemetry(
+            machine_id=self.machine.id, parameter='temperature', value=10.0,
+            timestamp=state.timestamp - timedelta(minutes=5)
+        )])
+        state.refresh_from_db()
+        self.assertEqual((state.value, state.sample_count), (72.0, 4))
+
+    def test_readings_in_machine_list(self):
+        self.client.post('/telemetry/receive/batch/', [
+            {'serial_number': 'SN12345', 'parameter': 'temperature', 'value': 70.0},
+            {'serial_number': 'SN12345', 'parameter': 'pressure', 'value': 30.0},
+        ], content_type='application/json')
+
+        response = self.client.get('/machines/')
+        readings = response.json()[0]['current_readings']
+        self.assertEqual(sorted(readings), ['pressure', 'temperature'])
+        self.assertEqual(readings['temperature']['value'], 70.0)
+
+    def test_rebuild_from_telemetry(self):
+        for value in (1.0, 2.0):
+            Telemetry.objects.create(machine=self.machine, parameter='rpm', value=value)
+
+        self.assertEqual(rebuild_parameter_states(), 1)
+        state = MachineParameterState.objects.get(machine=self.machine, parameter='rpm')
+        self.assertEqual((state.value, state.sample_count), (2.0, 2))
+
+class TelemetryHistoryTestCase(TestCase):
+    def setUp(self):
+        self.machine = Machine.objects.create(
+            name="Test Machine",
+            serial_number="SN12345",
+            model="Model X",
+            manufacturer="Manufacturer Y",
+            status="operational",
+            installation_date="2025-04-01"
+        )
+        self.url = f'/machines/{self.machine.id}/telemetry/'
+
+    def test_lttb_keeps_extremes(self):
+        xs = list(range(1000))
+        ys = [0.0] * 1000
+        ys[437] = 50.0
+        ys[811] = -20.0
+
+        indices = lttb_indices(xs, ys, 50)
+
+        self.assertEqual(len(indices), 50)
+        self.assertEqual((indices[0], indices[-1]), (0, 999))
+        self.assertIn(437, indices)
+        self.assertIn(811, indices)
+        self.assertEqual(lttb_indices(xs[:10], ys[:10], 50), list(range(10)))
+
+    def test_short_range_reads_raw_rows(self):
+        end = timezone.now()
+        rows = [
+            Telemetry(machine=self.machine, parameter='temperature', value=float(i), timestamp=end - timedelta(seconds=i))
+            for i in range(1, 301)
+        ]
+        Telemetry.objects.bulk_create(rows)
+        # auto_now_add overrides the timestamps on insert
+        for row in rows:
+            Telemetry.objects.filter(id=row.id).update(timestamp=end - timedelta(seconds=row.value))
+
+        response = self.client.get(self.url, {
+            'parameter': 'temperature', 'from': (end - timedelta(hours=1)).isoformat(), 'to': end.isoformat(), 'points': 100
+        })
+
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual((data['source'], data['total'], data['downsampled']), ('raw', 300, True))
+        self.assertEqual(len(data['points']), 100)
+        self.assertEqual(data['points'][0]['value'], 300.0)
+
+    @override_settings(TELEMETRY_HISTORY_OVERSAMPLING=1)
+    def test_dense_short_range_reads_rollups(self):
+        end = datetime(2025, 5, 1, tzinfo=dt_timezone.utc)
+        Telemetry.objects.bulk_create([
+            Telemetry(machine=self.machine, parameter='temperature', value=float(i), timestamp=end)
+            for i in range(1, 301)
+        ])
+        Telemetry.objects.filter(machine=self.machine).update(timestamp=end - timedelta(minutes=1))
+        TelemetryRollup.objects.bulk_create([
+            TelemetryRollup(
+                machine=self.machine, parameter='temperature', resolution='1m', bucket=end - timedelta(minutes=minute),
+                count=60, min_value=1.0, max_value=300.0, sum_value=60.0 * minute, sum_squares=0.0
+            )
+            for minute in range(1, 6)
+        ])
+
+        with override_settings(TELEMETRY_RETENTION_DAYS={'raw': None, '1m': None, '1h': None, '1d': None}):
+            params = {'parameter': 'temperature', 'from': (end - timedelta(hours=1)).isoformat(), 'to': end.isoformat()}
+            data = self.client.get(self.url, {**params, 'points': 100}).json()
+            self.assertEqual((data['source'], data['total']), ('1m', 5))
+
+            # Within the budget, the raw rows
+            data = self.client.get(self.url, {**params, 'points': 300}).json()
+            self.assertEqual((data['source'], data['total']), ('raw', 300))
+
+    def test_long_range_reads_rollups(self):
+        end = datetime(2025, 5, 1, tzinfo=dt_timezone.utc)
+        TelemetryRollup.objects.bulk_create([
+            TelemetryRollup(
+                machine=self.machine, parameter='temperature', resolution='1h', bucket=end - timedelta(hours=hour),
+                count=2, min_value=hour - 1.0, max_value=hour + 1.0, sum_value=2.0 * hour, sum_squares=0.0
+            )
+            for hour in range(1, 30 * 24 + 1)
+        ])
+
+        with override_settings(TELEMETRY_RETENTION_DAYS={'raw': None, '1m': None, '1h': None, '1d': None}):
+            response = self.client.get(self.url, {
+                'parameter': 'temperature', 'from': (end - timedelta(days=30)).isoformat(), 'to': end.isoformat()
+            })
+
+        data = response.json()
+        self.assertEqual((data['source'], data['total'], data['downsampled']), ('1h', 720, False))
+        self.assertEqual(data['points'][0], {
+            'timestamp': '2025-04-01T00:00:00Z', 'value': 720.0, 'min': 719.0, 'max': 721.0, 'count': 2
+        })
+
+    def test_invalid_queries(self):
+        self.assertEqual(self.client.get(self.url).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'parameter': 'temperature', 'from': 'yesterday'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'parameter': 'temperature', 'points': 1}).status_code, 400)
+        self.assertEqual(self.client.get('/machines/999999/telemetry/', {'parameter': 'temperature'}).status_code, 404)
+
+class TelemetryExportTestCase(TestCase):
+    def setUp(self):
+        self.machine = Machine.objects.create(
+            name="Test Machine",
+            serial_number="SN12345",
+            model="Model X",
+            manufacturer="Manufacturer Y",
+            status="operational",
+            installation_date="2025-04-01"
+        )
+        for parameter, value in [('temperature', 70.5), ('pressure', 30.0), ('temperature', 71.5)]:
+            Telemetry.objects.create(machine=self.machine, parameter=parameter, value=value)
+
+    def test_streams_csv(self):
+        response = self.client.get('/telemetry/export/', {'parameter': 'temperature'})
+
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], 'serial_number,parameter,value,timestamp')
+        self.assertEqual([line.split(',')[:3] for line in lines[1:]],
+                         [['SN12345', 'temperature', '70.5'], ['SN12345', 'temperature', '71.5']])
+
+    def test_streams_gzipped_ndjson(self):
+        import gzip
+        import json
+
+        response = self.client.get('/telemetry/export/', {
+            'format': 'ndjson', 'gzip': '1', 'machine': self.machine.id
+        })
+
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        records = [json.loads(line) for line in gzip.decompress(b''.join(response.streaming_content)).splitlines()]
+        self.assertEqual([record['parameter'] for record in records], ['temperature', 'pressure', 'temperature'])
+        self.assertEqual(self.client.get('/telemetry/export/', {'format': 'xml'}).status_code, 400)
+
+    async def test_asgi_export_is_read_as_it_is_sent(self):
+        response = await self.async_client.get('/telemetry/export/', {'parameter': 'pressure'})
+        self.assertTrue(response.is_async)
+        stream = response.streaming_content.__aiter__()
+        self.assertEqual(await stream.__anext__(), b'serial_number,parameter,value,timestamp\r\n')
+
+        # Rows are only queried once the header is out, so a row stored now is still exported
+        await Telemetry.objects.acreate(machine=self.machine, parameter='pressure', value=31.0)
+        rows = b''.join([chunk async for chunk in stream]).decode().splitlines()
+        self.assertEqual([row.split(',')[2] for row in rows], ['30.0', '31.0'])
+
+    def test_export_command_round_trips_with_import(self):
+        with tempfile.NamedTemporaryFile(suffix='.csv.gz') as export_file:
+            out = StringIO()
+            call_command('export_telemetry', '--output', export_file.name, '--machine', 'SN12345', stdout=out)
+            self.assertIn('Exported 3 rows', out.getvalue())
+
+            import gzip
+            with gzip.open(export_file.name, 'rt') as exported, \
+                    tempfile.NamedTemporaryFile('w', suffix='.csv') as csv_file:
+                csv_file.write(exported.read())
+                csv_file.flush()
+                call_command('import_telemetry', csv_file.name, stdout=StringIO(), stderr=StringIO())
+
+        self.assertEqual(Telemetry.objects.filter(machine=self.machine).count(), 6)
+
+class WarningIncidentTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="testuser", password="password")
+        self.machine = Machine.objects.create(
+            name="Test Machine",
+            serial_number="SN12345",
+            model="Model X",
+            manufacturer="Manufacturer Y",
+            status="operational",
+            installation_date="2025-04-01"
+        )
+        self.rule = WarningRule.objects.create(
+            name="High Temperature",
+            parameter="temperature",
+            comparison_operator=">",
+            threshold_value=85.0,
+            clear_threshold=80.0,
+            clear_after_samples=2,
+            severity="high",
+            created_by=self.user
+        )
+
+    def send(self, *values):
+        return self.client.post('/telemetry/receive/batch/', [
+            {'serial_number': 'SN12345', 'parameter': 'temperature', 'value': value} for value in values
+        ], content_type='application/json').json()['results']
+
+    def test_sustained_violation_updates_one_incident(self):
+        results = self.send(*[90.0 + i for i in range(50)])
+        results += self.send(95.0)
+
+        warning = Warning.objects.get()
+        self.assertEqual({result['warnings_triggered'][0] for result in results}, {warning.id})
+        self.assertEqual((warning.occurrence_count, warning.last_value), (51, 95.0))
+        self.assertIsNone(warning.resolved_at)
+        self.assertEqual(warning.telemetry_id, results[0]['telemetry_id'])
+
+    def test_incident_closes_after_clear_streak_outside_band(self):
+        self.send(90.0)
+        # Inside the hysteresis band (80-85]: stays open and resets the streak
+        self.send(79.0, 83.0, 79.0)
+        self.assertTrue(Warning.objects.get().is_active)
+
+        self.send(78.0)
+        warning = Warning.objects.get()
+        self.assertFalse(warning.is_active)
+        self.assertEqual(warning.occurrence_count, 1)
+
+        # The next violation opens a new incident
+        self.send(78.0, 91.0)
+        self.assertEqual(Warning.objects.count(), 2)
+        self.assertEqual(Warning.objects.filter(resolved_at__isnull=True).count(), 1)
+
+    def test_open_incidents_are_unique(self):
+        from django.db import IntegrityError
+
+        Warning.objects.create(machine=self.machine, rule=self.rule, description="Open")
+        with self.assertRaises(IntegrityError):
+            Warning.objects.create(machine=self.machine, rule=self.rule, description="Duplicate")
+
+class WindowedRuleTestCase(TestCase):
+    def setUp(self):
+        window_store.clear()
+        self.user = User.objects.create_user(username="testuser", password="password")
+        self.machine = Machine.objects.create(
+            name="Test Machine",
+            serial_number="SN12345",
+            model="Model X",
+            manufacturer="Manufacturer Y",
+            status="operational",
+            installation_date="2025-04-01"
+        )
+
+    def tearDown(self):
+        window_store.clear()
+
+    def create_rule(self, **fields):
+        return WarningRule.objects.create(
+            name="Windowed Temperature",
+            parameter="temperature",
+            comparison_operator=">",
+            severity="high",
+            created_by=self.user,
+            **fields
+        )
+
+    def send(self, *values):
+        return self.client.post('/telemetry/receive/batch/', [
+            {'serial_number': 'SN12345', 'parameter': 'temperature', 'value': value} for value in values
+        ], content_type='application/json').json()['results']
+
+    def test_moving_average_ignores_single_spike(self):
+        self.create_rule(rule_type='moving_average', threshold_value=80.0, window_seconds=300, window_samples=3)
+
+        self.send(100.0)  # below the sample minimum
+        self.send(60.0, 60.0, 100.0, 60.0)
+        self.assertFalse(Warning.objects.exists())
+
+        self.send(*[95.0] * 5)
+        warning = Warning.objects.get()
+        self.assertTrue(warning.is_active)
+        self.assertIn('300s average of temperature > 80.0', warning.description)
+
+        self.send(*[50.0] * 10)
+        self.assertFalse(Warning.objects.get().is_active)
+
+    def test_moving_average_window_evicts_old_samples(self):
+        rule = WarningRule(rule_type='moving_average', comparison_operator='>', threshold_value=80.0, window_seconds=60)
+        window = MovingAverageWindow(rule)
+
+        self.assertEqual(window.push(rule, 0.0, 100.0)[:2], (100.0, True))
+        self.assertEqual(window.push(rule, 30.0, 60.0)[:2], (80.0, False))
+        # t=0 falls out of the 60 s window
+        self.assertEqual(window.push(rule, 60.0, 70.0)[:2], (65.0, False))
+        self.assertEqual(len(window.samples), 2)
+
+    def test_rate_of_change_within_window(self):
+        rule = WarningRule(rule_type='rate_of_change', comparison_operator='>', threshold_value=10.0, window_seconds=60)
+        window = RateOfChangeWindow(rule)
+
+        self.assertEqual(window.push(rule, 0.0, 50.0)[:2], (0.0, False))
+        self.assertEqual(window.push(rule, 30.0, 55.0)[:2], (5.0, False))
+        self.assertEqual(window.push(rule, 50.0, 62.0)[:2], (12.0, True))
+        # The 50.0 and 55.0 lows have left the window
+        self.assertEqual(window.push(rule, 100.0, 63.0)[:2], (1.0, False))
+
+        drop = WarningRule(rule_type='rate_of_change', comparison_operator='<', threshold_value=-10.0, window_seconds=60)
+        window = RateOfChangeWindow(drop)
+        window.push(drop, 0.0, 80.0)
+        self.assertEqual(window.push(drop, 10.0, 65.0)[:2], (-15.0, True))
+
+    def test_count_in_window(self):
+        self.create_rule(rule_type='count_in_window', threshold_value=85.0, window_samples=5, min_violations=3)
+
+        self.send(90.0, 70.0, 90.0, 70.0)
+        self.assertFalse(Warning.objects.exists())
+
+        results = self.send(90.0)
+        warning = Warning.objects.get()
+        self.assertEqual(results[0]['warnings_triggered'], [warning.id])
+        self.assertEqual(warning.description, "Warning: temperature > 85.0 in 3 of the last 5 samples")
+
+    def test_windows_resume_from_checkpoint(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        rule = self.create_rule(rule_type='count_in_window', threshold_value=85.0, window_samples=5, min_violations=3)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.send(90.0, 90.0)
+        self.assertEqual(window_store.checkpoint(force=True), 1)
+        state = RuleWindowState.objects.get(machine=self.machine, rule=rule)
+        self.assertEqual([flag for _, flag in state.state['samples']], [1, 1])
+
+        # A restarted worker picks up the checkpoint without reading telemetry back
+        window_store.clear()
+        with CaptureQueriesContext(connection) as queries:
+            self.send(90.0)
+        self.assertTrue(Warning.objects.filter(rule=rule).exists())
+        telemetry_table = connection.ops.quote_name(Telemetry._meta.db_table)
+        self.assertFalse(any(f'FROM {telemetry_table}' in query['sql'] for query in queries.captured_queries))
+
+    def test_changed_window_settings_start_over(self):
+        rule = self.create_rule(rule_type='count_in_window', threshold_value=85.0, window_samples=5, min_violations=3)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.send(90.0, 90.0)
+        window_store.checkpoint(force=True)
+        window_store.clear()
+
+        rule.window_samples = 4
+        rule.save()
+        self.send(90.0)
+        self.assertFalse(Warning.objects.exists())
+
+    def test_rolled_back_batch_leaves_windows(self):
+        rule = self.create_rule(rule_type='count_in_window', threshold_value=85.0, window_samples=5, min_violations=3)
+        sample = {'serial_number': 'SN12345', 'parameter': 'temperature', 'value': 90.0}
+        with self.captureOnCommitCallbacks(execute=True):
+            ingest_samples([sample])
+
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                # Judged with its own samples while the transaction is open
+                self.assertEqual(len(ingest_samples([sample, sample])[1]['warnings_triggered']), 1)
+                raise RuntimeError
+        self.assertFalse(Warning.objects.exists())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(ingest_samples([sample])[0]['warnings_triggered'], [])
+        self.assertEqual(window_store.checkpoint(force=True), 1)
+        state = RuleWindowState.objects.get(machine=self.machine, rule=rule)
+        self.assertEqual([flag for _, flag in state.state['samples']], [1, 1])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(len(ingest_samples([sample])[0]['warnings_triggered']), 1)
+
+    def test_late_samples_are_placed_in_time_order(self):
+        average = WarningRule(rule_type='moving_average', comparison_operator='>', threshold_value=80.0, window_seconds=60)
+        window = MovingAverageWindow(average)
+        window.push(average, 100.0, 60.0)
+        window.push(average, 130.0, 60.0)
+        # Late but inside the window: counted; older than the window: ignored
+        self.assertEqual(window.push(average, 110.0, 120.0)[:2], (80.0, False))
+        self.assertEqual(window.push(average, 20.0, 500.0)[:2], (80.0, False))
+        self.assertEqual([timestamp for timestamp, _ in window.samples], [100.0, 110.0, 130.0])
+
+        rise = WarningRule(rule_type='rate_of_change', comparison_operator='>', threshold_value=10.0, window_seconds=60)
+        window = RateOfChangeWindow(rise)
+        window.push(rise, 0.0, 50.0)
+        window.push(rise, 40.0, 58.0)
+        # A late low makes the newest value a rise of more than 10
+        self.assertEqual(window.push(rise, 20.0, 45.0)[:2], (13.0, True))
+        self.assertEqual(window.push(rise, 30.0, 47.0)[:2], (13.0, True))
+        # Dominated by a newer lower value, so not kept
+        window.push(rise, 10.0, 46.0)
+        self.assertEqual(list(window.extremes), [(20.0, 45.0), (30.0, 47.0), (40.0, 58.0)])
+
+        count = WarningRule(rule_type='count_in_window', comparison_operator='>', threshold_value=85.0,
+                            window_samples=2, min_violations=2)
+        window = CountInWindow(count)
+        window.push(count, 10.0, 90.0)
+        window.push(count, 30.0, 70.0)
+        self.assertEqual(window.push(count, 20.0, 90.0)[:2], (1, False))
+        self.assertEqual([timestamp for timestamp, _ in window.samples], [20.0, 30.0])
+        # Older than both samples kept
+        self.assertEqual(window.push(count, 5.0, 90.0)[:2], (1, False))
+
+    def test_rule_validation(self):
+        from django.core.exceptions import ValidationError
+
+        with self.assertRaises(ValidationError):
+            WarningRule(rule_type='moving_average', comparison_operator='>', threshold_value=1.0).clean()
+        with self.assertRaises(ValidationError):
+            WarningRule(rule_type='count_in_window', comparison_operator='>', threshold_value=1.0,
+                        window_samples=3, min_violations=4).clean()
+
+class IdempotentIngestionTestCase(TestCase):
+    def setUp(self):
+        recent_keys.clear()
+        self.user = User.objects.create_user(username="testuser", password="password")
+        self.machine = Machine.objects.create(
+            name="Test Machine",
+            serial_number="SN12345",
+            model="Model X",
+            manufacturer="Manufacturer Y",
+            status="operational",
+            installation_date="2025-04-01"
+        )
+        WarningRule.objects.create(
+            name="High Temperature",
+            parameter="temperature",
+            comparison_operator=">",
+            threshold_value=85.0,
+            severity="high",
+            created_by=self.user
+        )
+
+    def tearDown(self):
+        recent_keys.clear()
+
+    def sample(self, value, **keys):
+        return {'serial_number': 'SN12345', 'parameter': 'temperature', 'value': value, **keys}
+
+    def post_batch(self, body):
+        return self.client.post('/telemetry/receive/batch/', body, content_type='application/json')
+
+    def test_retried_sample_is_a_no_op(self):
+        first = self.client.post('/telemetry/receive/', self.sample(90.0, idempotency_key='abc'),
+                                 content_type='application/json')
+        retry = self.client.post('/telemetry/receive/', self.sample(90.0, idempotency_key='abc'),
+                                 content_type='application/json')
+
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(retry.status_code, 200)
+        self.assertTrue(retry.json()['duplicate'])
+        self.assertEqual(retry.json()['telemetry_id'], first.json()['telemetry_id'])
+        self.assertEqual(Telemetry.objects.count(), 1)
+        self.assertEqual(Warning.objects.get().occurrence_count, 1)
+
+    def test_gateway_sequences_in_batches(self):
+        samples = [self.sample(70.0 + i, sequence=i) for i in range(3)]
+        first = self.post_batch({'gateway_id': 'gw-1', 'samples': samples})
+        self.assertEqual(first.status_code, 201)
+
+        retry = self.post_batch({'gateway_id': 'gw-1', 'samples': samples + [self.sample(75.0, sequence=3)]})
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual((retry.json()['created'], retry.json()['duplicates']), (1, 3))
+        self.assertEqual(
+            [result['telemetry_id'] for result in retry.json()['results'][:3]],
+            [result['telemetry_id'] for result in first.json()['results']]
+        )
+
+        # The same sequence from another gateway is a different sample
+        other = self.post_batch({'gateway_id': 'gw-2', 'samples': samples})
+        self.assertEqual(other.json()['created'], 3)
+        self.assertEqual(Telemetry.objects.count(), 7)
+
+    def test_batch_key_and_repeats_within_a_batch(self):
+        body = {'idempotency_key': 'batch-1', 'samples': [self.sample(70.0), self.sample(71.0)]}
+        self.assertEqual(self.post_batch(body).status_code, 201)
+        retry = self.post_batch(body)
+        self.assertEqual(retry.status_code, 200)
+        self.assertEqual(retry.json()['duplicates'], 2)
+
+        results = self.post_batch([self.sample(72.0, idempotency_key='x'), self.sample(72.0, idempotency_key='x')]).json()['results']
+        self.assertEqual([result['status'] for result in results], ['created', 'duplicate'])
+        self.assertEqual(results[1]['telemetry_id'], results[0]['telemetry_id'])
+        self.assertEqual(Telemetry.objects.count(), 3)
+
+    def test_recent_keys_skip_the_database(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post_batch([self.sample(70.0, idempotency_key='k1')])
+        with CaptureQueriesContext(connection) as queries:
+            retry = self.post_batch([self.sample(70.0, idempotency_key='k1')])
+        self.assertEqual(retry.json()['duplicates'], 1)
+        self.assertFalse(any(IngestionKey._meta.db_table in query['sql'] for query in queries.captured_queries))
+
+    def test_gateway_id_requires_sequence(self):
+        response = self.post_batch([self.sample(70.0, gateway_id='gw-1')])
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Telemetry.objects.exists())
+
+    def test_compaction_prunes_expired_keys(self):
+        IngestionKey.objects.create(key='k:old', created_at=timezone.now() - timedelta(days=2))
+        IngestionKey.objects.create(key='k:new')
+        call_command('compact_telemetry', stdout=StringIO())
+        self.assertEqual(list(IngestionKey.objects.values_list('key', flat=True)), ['k:new'])
+
+class DeviceTimestampTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="testuser", password="password")
+        self.machine = Machine.objects.create(
+            name="Test Machine",
+            serial_number="SN12345",
+            model="Model X",
+            manufacturer="Manufacturer Y",
+            status="operational",
+            installation_date="2025-04-01"
+        )
+        self.rule = WarningRule.objects.create(
+            name="High Temperature",
+            parameter="temperature",
+            comparison_operator=">",
+            threshold_value=85.0,
+            severity="high",
+            created_by=self.user
+        )
+
+    def send(self, *samples):
+        return self.client.post('/telemetry/receive/batch/', [
+            {'serial_number': 'SN12345', 'parameter': 'temperature', 'value': value, 'timestamp': timestamp.isoformat()}
+            for value, timestamp in samples
+        ], content_type='application/json')
+
+    def test_device_timestamps_are_stored(self):
+        taken_at = timezone.now().replace(microsecond=0) - timedelta(minutes=5)
+        response = self.send((70.0, taken_at), (71.0, taken_at + timedelta(seconds=1)))
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(
+            list(Telemetry.objects.order_by('timestamp').values_list('timestamp', flat=True)),
+            [taken_at, taken_at + timedelta(seconds=1)]
+        )
+
+    def test_future_timestamps_are_rejected(self):
+        response = self.send((70.0, timezone.now() + timedelta(hours=1)))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('timestamp', response.json()['results'][0]['errors'])
+
+    @override_settings(TELEMETRY_LATENESS_WINDOW=600)
+    def test_samples_beyond_lateness_window_are_history(self):
+        now = timezone.now()
+        self.send((70.0, now - timedelta(minutes=1)))
+        results = self.send((99.0, now - timedelta(days=2))).json()['results']
+
+        self.assertTrue(results[0]['late'])
+        self.assertEqual(results[0]['warnings_triggered'], [])
+        self.assertFalse(Warning.objects.exists())
+        # Rolled up, but the current reading stays the newer sample
+        self.assertTrue(TelemetryRollup.objects.filter(resolution='1d', max_value=99.0).exists())
+        state = MachineParameterState.objects.get(machine=self.machine, parameter='temperature')
+        self.assertEqual((state.value, state.sample_count), (70.0, 2))
+
+    def test_out_of_order_batch_is_evaluated_in_time_order(self):
+        now = timezone.now()
+        # Arrives newest first: the violation at t-2m is cleared by the normal sample at t-1m
+        self.send((70.0, now - timedelta(minutes=1)), (90.0, now - timedelta(minutes=2)))
+
+        warning = Warning.objects.get()
+        self.assertEqual(warning.last_seen_at, now - timedelta(minutes=2))
+        self.assertEqual(warning.resolved_at, now - timedelta(minutes=1))
+
+    def test_late_sample_does_not_clear_a_newer_violation(self):
+        now = timezone.now()
+        self.send((90.0, now - timedelta(minutes=1)))
+        self.send((70.0, now - timedelta(minutes=3)))
+        self.assertTrue(Warning.objects.get().is_active)
+
+
+SLOW_LIMITS = {'machine': {'rate': 0.01, 'burst': 3}, 'client': {'rate': 0.01, 'burst': 1000}}
+
+
+@override_settings(TELEMETRY_RATE_LIMITS=SLOW_LIMITS)
+class RateLimitTestCase(TestCase):
+    def setUp(self):
+        rate_limiter.clear()
+        cache.clear()
+        self.machine = Machine.objects.create(
+            name="Test Machine",
+            serial_number="SN12345",
+            model="Model X",
+            manufacturer="Manufacturer Y",
+            status="operational",
+            installation_date="2025-04-01"
+        )
+
+    def tearDown(self):
+        rate_limiter.clear()
+        cache.clear()
+
+    def post_batch(self, count, **headers):
+        samples = [{'serial_number': 'SN12345', 'parameter': 'temperature', 'value': 70.0 + i} for i in range(count)]
+        return self.client.post('/telemetry/receive/batch/', samples, content_type='application/json', headers=headers)
+
+    def test_machine_over_burst_is_partially_admitted(self):
+        response = self.post_batch(5)
+
+        self.assertEqual(response.status_code, 207)
+        body = response.json()
+        self.assertEqual((body['created'], body['rate_limited']), (3, 2))
+        self.assertEqual([result['status'] for result in body['results']], ['created'] * 3 + ['rate_limited'] * 2)
+        self.assertGreaterEqual(int(response['Retry-After']), 1)
+        self.assertEqual(Telemetry.objects.count(), 3)
+
+        again = self.post_batch(2)
+        self.assertEqual(again.status_code, 429)
+        self.assertIn('Retry-After', again)
+
+        stats = self.client.get('/telemetry/stats/').json()['rate_limits']
+        self.assertEqual((stats['admitted']['machine'], stats['dropped']['machine']), (3, 4))
+        self.assertEqual(stats['dropped']['client'], 0)
+        self.assertEqual(stats['top_dropped'][0], {'kind': 'machine', 'key': 'SN12345', 'dropped': 4})
+
+    @override_settings(TELEMETRY_MACHINE_MODEL_RATE_LIMITS={'Model X': {'rate': 0.01, 'burst': 1}})
+    def test_limits_per_machine_model(self):
+        sample = {'serial_number': 'SN12345', 'parameter': 'temperature', 'value': 70.0}
+        first = self.client.post('/telemetry/receive/', sample, content_type='application/json')
+        second = self.client.post('/telemetry/receive/', sample, content_type='application/json')
+
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(second.status_code, 429)
+        self.assertEqual(second['Retry-After'], '100')
+
+    @override_settings(TELEMETRY_RATE_LIMITS={'machine': {'rate': 100, 'burst': 100},
+                                              'client': {'rate': 0.01, 'burst': 2}},
+                       TELEMETRY_TRUSTED_GATEWAY_ADDRESSES=['127.0.0.1'])
+    def test_client_limit_is_per_client(self):
+        body = self.post_batch(3, X_GATEWAY_ID='gw-1').json()
+        self.assertEqual([result['status'] for result in body['results']], ['created', 'created', 'rate_limited'])
+
+        self.assertEqual(self.post_batch(1, X_GATEWAY_ID='gw-1').status_code, 429)
+        self.assertEqual(self.post_batch(1, X_GATEWAY_ID='gw-2').status_code, 201)
+
+    @override_settings(TELEMETRY_RATE_LIMITS={'machine': {'rate': 100, 'burst': 100},
+                                              'client': {'rate': 0.01, 'burst': 2}})
+    def test_untrusted_gateway_header_does_not_split_the_limit(self):
+        self.assertEqual(self.post_batch(2, X_GATEWAY_ID='gw-1').status_code, 201)
+        # A new header value per request is still the same client
+        for gateway in ('gw-2', 'gw-3'):
+            self.assertEqual(self.post_batch(1, X_GATEWAY_ID=gateway).status_code, 429)
+        self.assertEqual(rate_limiter.stats()['top_dropped'][0],
+                         {'kind': 'client', 'key': 'addr:127.0.0.1', 'dropped': 2})
+
+    @override_settings(TELEMETRY_RATE_LIMIT_BACKEND='cache')
+    def test_shared_cache_backend(self):
+        self.assertEqual(self.post_batch(2).json()['created'], 2)
+        # A second worker (fresh local state) shares the window through the cache
+        rate_limiter.clear()
+        response = self.post_batch(2)
+
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual(response.json()['rate_limited'], 1)
+        self.assertEqual(Telemetry.objects.count(), 3)
+
+    @override_settings(TELEMETRY_RATE_LIMIT_ENABLED=False)
+    def test_disabled(self):
+        self.assertEqual(self.post_batch(10).status_code, 201)
+
+
+class LineProtocolListenerTestCase(TestCase):
+    def setUp(self):
+        rate_limiter.clear()
+        self.machine = Machine.objects.create(
+            name="Test Machine",
+            serial_number="SN12345",
+            model="Model X",
+            manufacturer="Manufacturer Y",
+            status="operational",
+            installation_date="2025-04-01"
+        )
+
+    def tearDown(self):
+        rate_limiter.clear()
+
+    def test_parse_line(self):
+        self.assertEqual(parse_line('SN12345 temperature 71.5'),
+                         {'serial_number': 'SN12345', 'parameter': 'temperature', 'value': '71.5'})
+        self.assertEqual(parse_line('SN12345 temperature 71.5 1750000000')['timestamp'],
+                         datetime(2025, 6, 15, 15, 6, 40, tzinfo=dt_timezone.utc))
+        self.assertEqual(parse_line('SN12345 rpm 1 2025-06-15T15:06:40Z')['timestamp'], '2025-06-15T15:06:40Z')
+        self.assertIsNone(parse_line('  '))
+        self.assertIsNone(parse_line('# comment'))
+        with self.assertRaises(ValueError):
+            parse_line('SN12345 temperature')
+        for timestamp in ('inf', 'nan', '1e20', '-1e20'):
+            with self.assertRaisesMessage(ValueError, 'timestamp out of range'):
+                parse_line(f'SN12345 temperature 71.5 {timestamp}')
+
+    def test_out_of_range_epoch_only_rejects_its_line(self):
+        class ListWriter:
+            def __init__(self):
+                self.samples = []
+
+            def submit(self, samples):
+                self.samples.extend(samples)
+                return list(range(1, len(samples) + 1))
+
+        writer = ListWriter()
+        replies = LineIngest(writer, ack=True).feed(
+            ['SN12345 temperature 70 1750000000', 'SN12345 temperature 71 inf', 'SN12345 temperature 72 1e20'],
+            'line:127.0.0.1'
+        )
+        self.assertEqual(replies, ['OK 1', 'ERR timestamp out of range: SN12345 temperature 71 inf',
+                                   'ERR timestamp out of range: SN12345 temperature 72 1e20'])
+        self.assertEqual([sample['value'] for sample in writer.samples], [70.0])
+
+    async def test_tcp_and_udp_lines_reach_the_writer(self):
+        writer = TelemetryWriter()
+        ingest = LineIngest(writer, ack=True)
+        server, transport = await start_listener(ingest, '127.0.0.1', 0, 0)
+        try:
+            reader, stream = await asyncio.open_connection('127.0.0.1', server.sockets[0].getsockname()[1])
+            stream.write(b'SN12345 temperature 70.5\nSN12345 temperature hot\nbogus\n# note\nSN12345 pressure 31 1750000000\n')
+            await stream.drain()
+            replies = [(await reader.readline()).decode().strip() for _ in range(4)]
+            stream.close()
+
+            udp = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            udp.sendto(b'SN12345 rpm 1200\nSN99999 rpm 1\n', transport.get_extra_info('sockname'))
+            udp.close()
+            for _ in range(100):
+                if ingest.lines == 6:
+                    break
+                await asyncio.sleep(0.01)
+        finally:
+            server.close()
+            transport.close()
+        await writer.stop()
+
+        self.assertEqual(replies[0], 'OK 1')
+        self.assertTrue(replies[1].startswith('ERR value:'))
+        self.assertTrue(replies[2].startswith('ERR expected:'))
+        self.assertEqual(replies[3], 'OK 2')
+        self.assertEqual(ingest.stats(), {'lines': 6, 'accepted': 4, 'invalid': 2, 'rate_limited': 0, 'busy': 0})
+        self.assertEqual((writer.written, writer.not_found), (3, 1))
+        self.assertEqual(await Telemetry.objects.filter(machine=self.machine).acount(), 3)
+        pressure = await Telemetry.objects.aget(parameter='pressure')
+        self.assertEqual(pressure.timestamp, datetime(2025, 6, 15, 15, 6, 40, tzinfo=dt_timezone.utc))
+
+    @override_settings(TELEMETRY_RATE_LIMITS={'machine': {'rate': 100, 'burst': 100},
+                                              'client': {'rate': 0.01, 'burst': 1}})
+    def test_client_rate_limit_per_peer(self):
+        class Writer:
+            def submit(self, samples):
+                return list(range(1, len(samples) + 1))
+
+        ingest = LineIngest(Writer())
+        replies = ingest.feed(['SN12345 rpm 1', 'SN12345 rpm 2'], 'line:10.0.0.1')
+        self.assertEqual(len(replies), 1)
+        self.assertTrue(replies[0].startswith('ERR rate limited'))
+        self.assertEqual(ingest.feed(['SN12345 rpm 3'], 'line:10.0.0.2'), [])
+
+
+class LiveEventsTestCase(TestCase):
+    def setUp(self):
+        event_bus.clear()
+        self.user = User.objects.create_user(username="testuser", password="password")
+        self.machine = Machine.objects.create(
+            name="Test Machine",
+            serial_number="SN12345",
+            model="Model X",
+            manufacturer="Manufacturer Y",
+            status="operational",
+            installation_date="2025-04-01"
+        )
+        WarningRule.objects.create(
+            name="Critical Temperature",
+            parameter="temperature",
+            comparison_operator=">",
+            threshold_value=100.0,
+            severity="critical",
+            created_by=self.user
+        )
+
+    def tearDown(self):
+        event_bus.clear()
+
+    def ingest(self, value):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/telemetry/receive/', {'serial_number': 'SN12345', 'parameter': 'temperature',
+                                                     'value': value}, content_type='application/json')
+
+    def test_ingestion_publishes_events_on_commit(self):
+        start = event_bus.last_id
+        self.ingest(120.0)
+        self.ingest(50.0)
+
+        frames = event_bus.replay(start)
+        self.assertEqual([frame.split('\n')[1] for frame in frames],
+                         ['event: warning_opened', 'event: machine_status_changed', 'event: warning_resolved'])
+        opened = json.loads(frames[0].split('data: ')[1])
+        self.assertEqual((opened['machine_id'], opened['severity'], opened['last_value']), (self.machine.id, 'critical', 120.0))
+        self.assertIn('"previous_status":"operational"', frames[1])
+        self.assertEqual(event_bus.replay(start, types={'machine_status_changed'}), [frames[1]])
+
+    def test_status_events_follow_the_database_not_the_cache(self):
+        machine_cache.clear()
+        machine_cache.resolve("SN12345")
+        # Changed behind the cache's back, as by another worker
+        Machine.objects.filter(id=self.machine.id).update(status="warning")
+
+        start = event_bus.last_id
+        self.ingest(120.0)
+        frames = event_bus.replay(start, types={'machine_status_changed'})
+        self.assertEqual(len(frames), 1)
+        self.assertIn('"previous_status":"warning"', frames[0])
+
+        # Already critical in the database: nothing changes, nothing is published
+        machine_cache.clear()
+        Machine.objects.filter(id=self.machine.id).update(status="operational")
+        machine_cache.resolve("SN12345")
+        Machine.objects.filter(id=self.machine.id).update(status="critical")
+        start = event_bus.last_id
+        self.ingest(130.0)
+        self.assertEqual(event_bus.replay(start, types={'machine_status_changed'}), [])
+
+    @override_settings(EVENTS_BUFFER_SIZE=2)
+    def test_resume_and_reset(self):
+        start = event_bus.last_id
+        for machine_id in range(3):
+            event_bus.publish('machine_status_changed', {'machine_id': machine_id, 'status': 'warning'})
+
+        self.assertEqual([frame_id(frame) for frame in event_bus.replay(start + 1)], [start + 2, start + 3])
+        self.assertEqual(event_bus.replay(start + 3), [])
+        # Event start + 1 is gone from the buffer, and ids from another process are unknown
+        self.assertIn('event: reset', event_bus.replay(start)[0])
+        self.assertIn('event: reset', event_bus.replay(start + 100)[0])
+
+        response = self.client.get('/events/', headers={'Last-Event-ID': str(start + 2)})
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        body = b''.join(response.streaming_content).decode()
+        self.assertTrue(body.startswith('retry: '))
+        self.assertIn(f'id: {start + 3}\n', body)
+        self.assertNotIn(f'id: {start + 2}\n', body)
+
+        self.assertEqual(self.client.get('/events/?types=bogus').status_code, 400)
+
+    async def test_stream_fans_out_events_from_other_threads(self):
+        start = event_bus.last_id
+        event_bus.publish('warning_opened', {'id': 1})
+
+        responses = [await self.async_client.get('/events/', headers={'Last-Event-ID': str(start)}) for _ in range(3)]
+        streams = [response.streaming_content.__aiter__() for response in responses]
+        self.assertEqual(event_bus.stats()['subscribers'], 3)
+
+        async def next_frame(stream):
+            return (await asyncio.wait_for(stream.__anext__(), 5)).decode()
+
+        for stream in streams:
+            self.assertTrue((await next_frame(stream)).startswith('retry: '))
+            self.assertIn(f'id: {start + 1}\n', await next_frame(stream))
+
+        publisher = threading.Thread(target=event_bus.publish, args=('warning_resolved', {'id': 1}))
+        publisher.start()
+        publisher.join()
+        for stream in streams:
+            self.assertIn('event: warning_resolved', await next_frame(stream))
+
+        # A client disconnecting cancels its pending read, as the ASGI handler does
+        for stream in streams:
+            read = asyncio.ensure_future(stream.__anext__())
+            await asyncio.sleep(0)
+            read.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await read
+        self.assertEqual(event_bus.stats()['subscribers'], 0)
+
+
+class MachineListTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="testuser", password="password")
+        self.rule = WarningRule.objects.create(
+            name="High Temperature",
+            parameter="temperature",
+            comparison_operator=">",
+            threshold_value=85.0,
+            severity="high",
+            created_by=self.user
+        )
+        self.location = Location.objects.create(latitude=52.2297, longitude=21.0122, address="Warszawa")
+
+    def create_machines(self, count, start=0, **fields):
+        machines = [Machine.objects.create(
+            name=f"Test Machine {i}",
+            serial_number=f"SN{i:05d}",
+            model=fields.get('model', "Model X"),
+            manufacturer=fields.get('manufacturer', "Manufacturer Y"),
+            status=fields.get('status', "operational"),
+            location=self.location if i % 2 else None,
+            installation_date="2025-04-01"
+        ) for i in range(start, start + count)]
+        for machine in machines:
+            # One open incident each, plus resolved history that must not be counted
+            Warning.objects.create(machine=machine, rule=self.rule, description="open")
+            Warning.objects.create(machine=machine, rule=self.rule, description="old", resolved_at=timezone.now())
+        return machines
+
+    def test_query_count_does_not_grow_with_the_fleet(self):
+        self.create_machines(3)
+        with self.assertNumQueries(2):
+            small = self.client.get('/machines/').json()
+        self.create_machines(20, start=3)
+        with self.assertNumQueries(2):
+            large = self.client.get('/machines/').json()
+
+        self.assertEqual((len(small), len(large)), (3, 23))
+        self.assertEqual({machine['active_warnings_count'] for machine in large}, {1})
+        self.assertEqual(large[1]['location'], {'lat': 52.2297, 'lng': 21.0122, 'address': 'Warszawa'})
+        self.assertIsNone(large[0]['location'])
+
+    def test_keyset_pagination(self):
+        machines = self.create_machines(5)
+        ids = [machine.id for machine in machines]
+
+        with self.assertNumQueries(2):
+            first = self.client.get('/machines/?limit=2').json()
+        self.assertEqual([machine['id'] for machine in first['results']], ids[:2])
+        self.assertEqual(first['next_after'], ids[1])
+
+        second = self.client.get(f"/machines/?limit=2&after={first['next_after']}").json()
+        third = self.client.get(f"/machines/?limit=2&after={second['next_after']}").json()
+        self.assertEqual([machine['id'] for machine in second['results'] + third['results']], ids[2:])
+        self.assertIsNone(third['next_after'])
+
+        self.assertEqual(self.client.get('/machines/?limit=0').status_code, 400)
+        self.assertEqual(self.client.get('/machines/?after=x').status_code, 400)
+
+    def test_filters(self):
+        self.create_machines(2)
+        self.create_machines(2, start=2, status="warning", model="Model Z")
+        self.create_machines(1, start=4, status="critical", manufacturer="Manufacturer Q")
+
+        def serials(query):
+            return [machine['serial_number'] for machine in self.client.get(f'/machines/?{query}').json()]
+
+        self.assertEqual(serials('status=warning,critical'), ['SN00002', 'SN00003', 'SN00004'])
+        self.assertEqual(serials('status=warning&status=critical&model=Model X'), ['SN00004'])
+        self.assertEqual(serials('manufacturer=Manufacturer Q'), ['SN00004'])
+        self.assertEqual(self.client.get('/machines/?status=broken').status_code, 400)
+
+    def test_machines_with_warnings_in_one_query(self):
+        machines = self.create_machines(3, status="warning")
+        self.create_machines(1, start=3)
+        critical = WarningRule.objects.create(name="Critical Temperature", parameter="temperature",
+                                              comparison_operator=">", threshold_value=100.0,
+                                              severity="critical", created_by=self.user)
+        latest = Warning.objects.create(machine=machines[0], rule=critical, description="latest")
+
+        with self.assertNumQueries(1):
+            data = self.client.get('/machines/warnings/').json()
+
+        self.assertEqual([machine['serial_number'] for machine in data], ['SN00000', 'SN00001', 'SN00002'])
+        self.assertEqual(data[0]['warnings_count'], 2)
+        self.assertEqual(data[0]['severity_counts'], {'low': 0, 'medium': 0, 'high': 1, 'critical': 1})
+        self.assertEqual(data[0]['latest_warning'], latest.description)
+        self.assertEqual(data[1]['severity_counts'], {'low': 0, 'medium': 0, 'high': 1, 'critical': 0})
+        self.assertEqual(data[1]['location']['address'], 'Warszawa')
+
+
+class RouteDetailsTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="testuser", password="password")
+        WarningRule.objects.create(
+            name="Critical Temperature",
+            parameter="temperature",
+            comparison_operator=">",
+            threshold_value=100.0,
+            severity="critical",
+            created_by=self.user
+        )
+        location = Location.objects.create(latitude=52.2297, longitude=21.0122, address="Warszawa")
+        self.route = Route.objects.create(name="Route 1", technician=self.user, date="2025-04-01", estimated_duration=4.0)
+        self.machines = []
+        for i in range(4):
+            machine = Machine.objects.create(
+                name=f"Test Machine {i}",
+                serial_number=f"SN1234{i}",
+                model="Model X",
+                manufacturer="Manufacturer Y",
+                status="operational",
+                location=location if i % 2 else None,
+                installation_date="2025-04-01"
+            )
+            RouteStop.objects.create(route=self.route, machine=machine, order=i + 1)
+            self.machines.append(machine)
+        Warning.objects.create(machine=self.machines[1], description="open")
+        Warning.objects.create(machine=self.machines[1], description="old", resolved_at=timezone.now())
+
+    def tearDown(self):
+        cache.clear()
+
+    def details(self):
+        return self.client.get(f'/routes/{self.route.id}/').json()
+
+    def ingest(self, serial_number, value):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/telemetry/receive/', {'serial_number': serial_number, 'parameter': 'temperature',
+                                                     'value': value}, content_type='application/json')
+
+    def test_queries_do_not_grow_with_stops(self):
+        with self.assertNumQueries(3):
+            data = self.details()
+        self.assertEqual([stop['warnings_count'] for stop in data['stops']], [0, 1, 0, 0])
+        self.assertEqual(data['stops'][1]['address'], 'Warszawa')
+        self.assertIsNone(data['stops'][0]['lat'])
+        self.assertEqual(data['technician']['name'], 'testuser')
+
+        # Cached: only the readings are read
+        with self.assertNumQueries(1):
+            self.assertEqual(self.details(), data)
+
+    @override_settings(ROUTE_DETAILS_CACHE_TIMEOUT=0)
+    def test_cache_can_be_disabled(self):
+        self.details()
+        with self.assertNumQueries(3):
+            self.details()
+
+    def test_cached_payload_follows_changes(self):
+        self.details()
+
+        # Readings are always fresh
+        self.ingest('SN12340', 70.0)
+        self.assertEqual(self.details()['stops'][0]['current_readings']['temperature']['value'], 70.0)
+
+        # Ingestion opening an incident and escalating the machine
+        self.ingest('SN12340', 120.0)
+        stop = self.details()['stops'][0]
+        self.assertEqual((stop['status'], stop['warnings_count']), ('critical', 1))
+
+        # Stop and machine edits
+        RouteStop.objects.filter(route=self.route, order=4).get().delete()
+        self.assertEqual(len(self.details()['stops']), 3)
+        self.machines[2].name = "Renamed"
+        self.machines[2].save()
+        self.assertEqual(self.details()['stops'][2]['machine_name'], "Renamed")
+
+        self.assertEqual(self.client.get('/routes/999999/').status_code, 404)
+
+
+class DashboardTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.machines = [
+            Machine.objects.create(
+                name=f"Test Machine {i}",
+                serial_number=f"SN1234{i}",
+                model="Model X",
+                manufacturer="Manufacturer Y",
+                status=status,
+                installation_date="2025-04-01"
+            )
+            for i, status in enumerate(["operational", "warning", "critical", "critical"])
+        ]
+        for i in range(3):
+            Warning.objects.create(machine=self.machines[2], description=f"open {i}")
+        Warning.objects.create(machine=self.machines[1], description="old", resolved_at=timezone.now())
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_queries_do_not_grow_with_machines(self):
+        # Summary, machine cards, their readings and the warnings page
+        with self.assertNumQueries(4):
+            response = self.client.get('/dashboard/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['summary']['statuses']['critical'], 2)
+        self.assertEqual(response.context['summary']['active_warnings'], 3)
+        self.assertContains(response, '<h2 id="status-count-warning">1</h2>', html=True)
+        self.assertEqual([machine.active_warnings_count for machine in response.context['machines']], [0, 0, 3, 0])
+
+        cache.clear()
+        for i in range(4, 20):
+            Machine.objects.create(name=f"Test Machine {i}", serial_number=f"SN1234{i}", model="Model X",
+                                   manufacturer="Manufacturer Y", status="warning", installation_date="2025-04-01")
+        with self.assertNumQueries(4):
+            self.client.get('/dashboard/')
+
+    def test_cached_fragments_follow_changes(self):
+        self.client.get('/dashboard/')
+        with self.assertNumQueries(0):
+            self.client.get('/dashboard/')
+
+        Warning.objects.create(machine=self.machines[0], description="new")
+        response = self.client.get('/dashboard/')
+        self.assertContains(response, '<h2 id="active-warnings-count">4</h2>', html=True)
+
+        self.machines[1].status = "critical"
+        self.machines[1].save()
+        response = self.client.get('/dashboard/')
+        self.assertContains(response, '<h2 id="status-count-critical">3</h2>', html=True)
+
+    @override_settings(DASHBOARD_WARNINGS_PAGE_SIZE=2)
+    def test_active_warnings_are_paginated(self):
+        response = self.client.get('/dashboard/')
+        self.assertEqual([warning.description for warning in response.context['active_warnings']], ["open 2", "open 1"])
+        self.assertContains(response, '?page=2')
+
+        response = self.client.get('/dashboard/?page=2')
+        self.assertEqual([warning.description for warning in response.context['active_warnings']], ["open 0"])
+        self.assertContains(response, '?page=1')
+        self.assertNotContains(response, '?page=3')
+
+        self.assertEqual(self.client.get('/dashboard/?page=x').context['page'], 1)
+
+
+class ConditionalGetTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="testuser", password="password")
+        self.machine = Machine.objects.create(
+            name="Test Machine",
+            serial_number="SN12345",
+            model="Model X",
+            manufacturer="Manufacturer Y",
+            status="operational",
+            installation_date="2025-04-01"
+        )
+        self.route = Route.objects.create(name="Route 1", technician=self.user, date="2025-04-01", estimated_duration=4.0)
+        RouteStop.objects.create(route=self.route, machine=self.machine, order=1)
+
+    def tearDown(self):
+        cache.clear()
+
+    def revalidate(self, path, etag):
+        return self.client.get(path, HTTP_IF_NONE_MATCH=etag)
+
+    def ingest(self, value):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/telemetry/receive/', {'serial_number': 'SN12345', 'parameter': 'temperature',
+                                                     'value': value}, content_type='application/json')
+
+    def test_readings_change_the_etag_at_most_every_max_age(self):
+        machines = self.client.get('/machines/')['ETag']
+        details = self.client.get(f'/routes/{self.route.id}/')['ETag']
+
+        # Telemetry keeps arriving between polls: still not modified
+        for value in (70.0, 71.0):
+            self.ingest(value)
+            with self.assertNumQueries(0):
+                self.assertEqual(self.revalidate('/machines/', machines).status_code, 304)
+            self.assertEqual(self.revalidate(f'/routes/{self.route.id}/', details).status_code, 304)
+
+        # Once API_READINGS_MAX_AGE has passed, the newest readings are served
+        cache.delete(SNAPSHOT_KEY_PREFIX + READINGS_VERSION)
+        response = self.revalidate('/machines/', machines)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()[0]['current_readings']['temperature']['value'], 71.0)
+        self.assertEqual(self.revalidate(f'/routes/{self.route.id}/', details).status_code, 200)
+        self.assertEqual(self.revalidate('/machines/', response['ETag']).status_code, 304)
+
+        # Other changes still show right away
+        Warning.objects.create(machine=self.machine, description="open")
+        self.assertEqual(self.revalidate('/machines/', response['ETag']).status_code, 200)
+
+    def test_unchanged_resources_are_not_modified(self):
+        for path in ('/machines/', '/routes/list/', f'/routes/{self.route.id}/'):
+            response = self.client.get(path)
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response['ETag'].startswith('W/"'))
+            self.assertIn('no-cache', response['Cache-Control'])
+            with self.assertNumQueries(0):
+                not_modified = self.revalidate(path, response['ETag'])
+            self.assertEqual(not_modified.status_code, 304)
+            self.assertEqual(not_modified.content, b'')
+            self.assertEqual(not_modified['ETag'], response['ETag'])
+
+        # Each query string is its own resource
+        self.assertEqual(self.revalidate('/machines/?status=critical', response['ETag']).status_code, 200)
+
+    def test_writes_change_the_etag(self):
+        machines = self.client.get('/machines/')['ETag']
+        details = self.client.get(f'/routes/{self.route.id}/')['ETag']
+        routes = self.client.get('/routes/list/')['ETag']
+
+        # Readings, from ingestion, when every change is followed
+        with override_settings(API_READINGS_MAX_AGE=0):
+            self.ingest(70.0)
+            self.assertEqual(self.revalidate('/machines/', machines).status_code, 200)
+            self.assertEqual(self.revalidate(f'/routes/{self.route.id}/', details).status_code, 200)
+            self.assertEqual(self.revalidate('/routes/list/', routes).status_code, 304)
+
+        # Warnings
+        machines = self.client.get('/machines/')['ETag']
+        Warning.objects.create(machine=self.machine, description="open")
+        response = self.revalidate('/machines/', machines)
+        self.assertEqual(response.json()[0]['active_warnings_count'], 1)
+
+        # Routes and their stops
+        details = self.client.get(f'/routes/{self.route.id}/')['ETag']
+        RouteStop.objects.filter(route=self.route).update(completed=True)
+        self.assertEqual(self.revalidate(f'/routes/{self.route.id}/', details).status_code, 304)
+        RouteStop.objects.get(route=self.route).save()
+        self.assertEqual(self.revalidate(f'/routes/{self.route.id}/', details).status_code, 200)
+        Route.objects.create(name="Route 2", technician=self.user, date="2025-04-02", estimated_duration=1.0)
+        self.assertEqual(self.revalidate('/routes/list/', routes).status_code, 200)
+
+        # Technicians, but not their logins
+        routes = self.client.get('/routes/list/')['ETag']
+        self.client.login(username="testuser", password="password")
+        self.assertEqual(self.revalidate('/routes/list/', routes).status_code, 304)
+        self.user.first_name = "Jan"
+        self.user.save()
+        response = self.revalidate('/routes/list/', routes)
+        self.assertEqual(response.json()[0]['technician']['first_name'], "Jan")
+
+    @override_settings(API_RESPONSE_CACHE_TIMEOUT=60)
+    def test_responses_are_cached_under_their_versions(self):
+        data = self.client.get('/machines/').json()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get('/machines/').json(), data)
+
+        self.machine.name = "Renamed"
+        self.machine.save()
+        self.assertEqual(self.client.get('/machines/').json()[0]['name'], "Renamed")
+
+        # Errors are not cached
+        self.assertEqual(self.client.get('/routes/999999/').status_code, 404)
+        with self.assertNumQueries(1):
+            self.client.get('/routes/999999/')
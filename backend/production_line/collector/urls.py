@@ -10,8 +10,14 @@ urlpatterns = [
     
     # Apply csrf_exempt to ALL API endpoints
     path('machines/', csrf_exempt(views.get_machines), name='api_get_machines'),
+    path('machines/<int:machine_id>/telemetry/', csrf_exempt(views.machine_telemetry), name='api_machine_telemetry'),
     path('machines/warnings/', csrf_exempt(views.get_machines_with_warnings), name='api_machines_warnings'),
     path('telemetry/receive/', csrf_exempt(views.receive_telemetry), name='api_receive_telemetry'),
+    path('telemetry/receive/batch/', csrf_exempt(views.receive_telemetry_batch), name='api_receive_telemetry_batch'),
+    path('telemetry/receive/async/', views.receive_telemetry_async, name='api_receive_telemetry_async'),
+    path('telemetry/export/', views.export_telemetry, name='api_export_telemetry'),
+    path('events/', views.live_events, name='api_live_events'),
+    path('telemetry/stats/', csrf_exempt(views.ingestion_stats), name='api_ingestion_stats'),
     path('routes/<int:route_id>/', csrf_exempt(views.route_details), name='api_route_details'),
     path('routes/optimize/', csrf_exempt(views.optimize_route), name='api_optimize_route'),
     path('routes/create/', csrf_exempt(views.create_route), name='api_create_route'),
@@ -0,0 +1,74 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+VERSION_KEY_PREFIX = 'collector:version:'
+SNAPSHOT_KEY_PREFIX = 'collector:version_snapshot:'
+
+# Anything shown about a machine besides its telemetry readings: its fields, location, status and
+# open warnings. Machine, Location and Warning saves bump it, and so does ingestion when it opens or
+# resolves incidents or escalates a status.
+MACHINE_STATE_VERSION = 'machine_state'
+
+# Current readings (MachineParameterState), bumped once each write of them commits.
+READINGS_VERSION = 'readings'
+
+# The route list: any route saved or deleted. A single route's stops have their own version.
+ROUTES_VERSION = 'routes'
+
+# Users as shown on routes (technician names).
+TECHNICIANS_VERSION = 'technicians'
+
+
+def _fresh_version():
+    # Start from the clock rather than 1 so a cache flush never brings a
+    # counter back to a value some process has already seen.
+    return int(time.time() * 1000)
+
+
+def get_version(name):
+    """
+    Return the current version stamp for ``name``.
+
+    Stamps live in the default cache so every worker process sharing that
+    cache observes the same value.
+    """
+    key = VERSION_KEY_PREFIX + name
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _fresh_version(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(name):
+    """Advance the version stamp for ``name`` and return the new value."""
+    key = VERSION_KEY_PREFIX + name
+    try:
+        return cache.incr(key)
+    except ValueError:
+        version = _fresh_version()
+        cache.set(key, version, timeout=None)
+        return version
+
+
+def version_stamp(name):
+    """
+    The version of ``name`` to derive ETags and response cache keys from.
+
+    Readings change with nearly every ingested batch, so their stamp is a
+    snapshot of the version taken at most ``API_READINGS_MAX_AGE`` seconds
+    ago: responses showing readings stay valid for that long while telemetry
+    keeps arriving, and pick up new readings once it has passed. 0 follows
+    every change.
+    """
+    max_age = settings.API_READINGS_MAX_AGE if name == READINGS_VERSION else 0
+    if not max_age:
+        return get_version(name)
+    key = SNAPSHOT_KEY_PREFIX + name
+    stamp = cache.get(key)
+    if stamp is None:
+        cache.add(key, get_version(name), timeout=max_age)
+        stamp = cache.get(key)
+    return stamp
@@ -1,35 +1,63 @@
 from django.shortcuts import render, get_object_or_404
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
+from django.conf import settings
 from django.views.decorators.csrf import csrf_exempt
-from rest_framework.decorators import api_view, permission_classes
+from django.views.decorators.http import require_GET, require_POST
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import SimpleLazyObject
+from django.core.handlers.asgi import ASGIRequest
+from asgiref.sync import sync_to_async
+from rest_framework.decorators import api_view, permission_classes, parser_classes
+from rest_framework.parsers import JSONParser
 from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
 from rest_framework import status
+import asyncio
 import json
-from datetime import datetime, date, timedelta
+from datetime import datetime, date, timedelta, timezone as dt_timezone
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
 
 from django.contrib.auth.models import User
+from django.db.models import Count, FilteredRelation, OuterRef, Q, Subquery
 
 from .models import Machine, Location, Telemetry, Warning, WarningRule, ServiceRecord, Route, RouteStop
 from .serializers import (MachineSerializer, LocationSerializer, TelemetrySerializer, 
                          WarningSerializer, TelemetryInputSerializer)
+from .async_writer import QueueFull, telemetry_writer
+from .dashboard import active_warnings_page, dashboard_summary, machine_cards
+from .decorators import versioned
+from .events import EVENT_TYPES, event_bus, frame_id, id_frame
+from .export import ENCODERS, FORMATS, async_chunks, export_rows, gzip_stream
+from .history import load_series
+from .idempotency import recent_keys, sample_key
+from .ingestion import apply_batch_keys, ingest_samples, ingest_validated, validate_samples
+from .machine_cache import machine_cache
+from .parameter_states import current_readings
+from .parsers import NDJSONParser
+from .rate_limit import admit_client, limited_result, rate_limiter, retry_after_header
+from .route_payload import route_payload, route_version_name
+from .versions import MACHINE_STATE_VERSION, READINGS_VERSION, ROUTES_VERSION, TECHNICIANS_VERSION, get_version
 
 def dashboard(request):
-    machines = Machine.objects.all()
-    active_warnings = Warning.objects.filter(resolved_at=None)
-    
-    machine_warnings_count = {}
-    for machine in machines:
-        machine_warnings_count[machine.id] = machine.warnings.filter(resolved_at=None).count()
+    try:
+        page = max(1, int(request.GET.get('page', 1)))
+    except ValueError:
+        page = 1
     
+    # Evaluated only for template fragments that are not cached
+    summary = SimpleLazyObject(dashboard_summary)
     context = {
-        'machines': machines,
-        'active_warnings': active_warnings,
-        'machine_warnings_count': machine_warnings_count,
-        'machines_with_warnings_count': Machine.objects.filter(status='warning').count(),
-        'machines_critical_count': Machine.objects.filter(status='critical').count(),
+        'cache_timeout': settings.DASHBOARD_CACHE_TIMEOUT,
+        'data_version': get_version(MACHINE_STATE_VERSION),
+        'summary': summary,
+        'machines': SimpleLazyObject(machine_cards),
+        'active_warnings': SimpleLazyObject(lambda: active_warnings_page(page)),
+        'page': page,
+        'has_next_page': SimpleLazyObject(
+            lambda: page * settings.DASHBOARD_WARNINGS_PAGE_SIZE < summary['active_warnings']
+        ),
     }
     
     return render(request, 'collector/dashboard.html', context)
@@ -285,59 +313,33 @@ def optimize_route(request):
                     'status': openapi.Schema(type=openapi.TYPE_STRING),
                     'estimated_duration': openapi.Schema(type=openapi.TYPE_NUMBER),
                     'is_delegation': openapi.Schema(type=openapi.TYPE_BOOLEAN),
-                    'stops': openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Schema(type=openapi.TYPE_OBJECT))
+                    'stops': openapi.Schema(
+                        type=openapi.TYPE_ARRAY,
+                        items=openapi.Schema(type=openapi.TYPE_OBJECT),
+                        description="Stops in visiting order, each with the machine's current_readings"
+                    )
                 }
             )
         ),
+        304: "Not modified since the ETag given in If-None-Match",
         404: "Route not found"
     }
 )
 @csrf_exempt
 @api_view(['GET'])
 @permission_classes([AllowAny])
+@versioned(route_version_name, MACHINE_STATE_VERSION, READINGS_VERSION, TECHNICIANS_VERSION)
 def route_details(request, route_id):
-    try:
-        route = Route.objects.get(id=route_id)
-    except Route.DoesNotExist:
+    route_data = route_payload(route_id)
+    if route_data is None:
         return Response({'error': 'Route not found'}, status=status.HTTP_404_NOT_FOUND)
     
-    stops = route.routestop_set.all().order_by('order')
-    stops_data = []
-    
-    for stop in stops:
-        machine = stop.machine
-        warnings_count = machine.warnings.filter(resolved_at=None).count()
-        
-        stops_data.append({
-            'order': stop.order,
-            'machine_id': machine.id,
-            'machine_name': machine.name,
-            'status': machine.status,
-            'model': machine.model,
-            'address': machine.location.address if machine.location else None,
-            'lat': float(machine.location.latitude) if machine.location else None,
-            'lng': float(machine.location.longitude) if machine.location else None,
-            'service_time': stop.estimated_service_time,
-            'completed': stop.completed,
-            'warnings_count': warnings_count
-        })
-    
-    route_data = {
-        'id': route.id,
-        'name': route.name,
-        'technician': {
-            'id': route.technician.id,
-            'name': f"{route.technician.first_name} {route.technician.last_name}".strip() or route.technician.username
-        },
-        'date': route.date,
-        'status': route.status,
-        'estimated_duration': route.estimated_duration,
-        'is_delegation': route.is_delegation,
-        'start_location': route.start_location,
-        'stops': stops_data
-    }
-    
-    return Response(route_data)
+    # Readings change with every sample, so they are never part of the cached payload
+    readings = current_readings([stop['machine_id'] for stop in route_data['stops']])
+    return Response({
+        **route_data,
+        'stops': [{**stop, 'current_readings': readings[stop['machine_id']]} for stop in route_data['stops']]
+    })
 
 @swagger_auto_schema(
     method='get',
@@ -355,6 +357,10 @@ def route_details(request, route_id):
                         'status': openapi.Schema(type=openapi.TYPE_STRING),
                         'serial_number': openapi.Schema(type=openapi.TYPE_STRING),
                         'warnings_count': openapi.Schema(type=openapi.TYPE_INTEGER),
+                        'severity_counts': openapi.Schema(
+                            type=openapi.TYPE_OBJECT,
+                            description="Active warnings per rule severity (low, medium, high, critical)"
+                        ),
                         'latest_warning': openapi.Schema(type=openapi.TYPE_STRING, nullable=True),
                         'location': openapi.Schema(type=openapi.TYPE_OBJECT, nullable=True)
                     }
@@ -367,24 +373,38 @@ def route_details(request, route_id):
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def get_machines_with_warnings(request):
-    machines = Machine.objects.filter(status__in=['warning', 'critical'])
-    data = []
+    severities = [severity for severity, _ in WarningRule.SEVERITY_CHOICES]
+    latest_warning = Warning.objects.filter(
+        machine=OuterRef('pk'), resolved_at__isnull=True
+    ).order_by('-created_at', '-id').values('description')[:1]
     
-    for machine in machines:
-        active_warnings = machine.warnings.filter(resolved_at=None)
-        data.append({
-            'id': machine.id,
-            'name': machine.name,
-            'status': machine.status,
-            'serial_number': machine.serial_number,
-            'warnings_count': active_warnings.count(),
-            'latest_warning': active_warnings.first().description if active_warnings.exists() else None,
-            'location': {
-                'lat': float(machine.location.latitude) if machine.location else None,
-                'lng': float(machine.location.longitude) if machine.location else None,
-                'address': machine.location.address if machine.location else None,
-            } if machine.location else None
-        })
+    # One query: open warnings are counted over a join limited to them, the latest one is a subquery
+    rows = Machine.objects.filter(status__in=['warning', 'critical']).annotate(
+        open_warnings=FilteredRelation('warnings', condition=Q(warnings__resolved_at__isnull=True)),
+        warnings_count=Count('open_warnings'),
+        **{f'{severity}_count': Count('open_warnings', filter=Q(open_warnings__rule__severity=severity))
+           for severity in severities},
+        latest_warning=Subquery(latest_warning),
+    ).order_by('id').values(
+        'id', 'name', 'status', 'serial_number', 'warnings_count', 'latest_warning',
+        'location_id', 'location__latitude', 'location__longitude', 'location__address',
+        *(f'{severity}_count' for severity in severities),
+    )
+    
+    data = [{
+        'id': row['id'],
+        'name': row['name'],
+        'status': row['status'],
+        'serial_number': row['serial_number'],
+        'warnings_count': row['warnings_count'],
+        'severity_counts': {severity: row[f'{severity}_count'] for severity in severities},
+        'latest_warning': row['latest_warning'],
+        'location': {
+            'lat': float(row['location__latitude']),
+            'lng': float(row['location__longitude']),
+            'address': row['location__address'],
+        } if row['location_id'] else None
+    } for row in rows]
     
     return Response(data)
 
@@ -403,73 +423,268 @@ def get_machines_with_warnings(request):
                 }
             )
         ),
+        200: "Duplicate of a sample already saved under the same idempotency key - nothing written",
         400: "Invalid input data",
-        404: "Machine not found"
+        404: "Machine not found",
+        429: "Rate limit exceeded for the client or the machine - see Retry-After"
     }
 )
 @csrf_exempt
 @api_view(['POST'])
 @permission_classes([AllowAny])
 def receive_telemetry(request):
+    admitted, retry_after = admit_client(request, 1)
+    if not admitted:
+        return _rate_limited(Response({'error': 'Rate limit exceeded for client'}, status=status.HTTP_429_TOO_MANY_REQUESTS),
+                             retry_after)
+    
     try:
-        data = request.data
-        serial_number = data.get('serial_number')
-        parameter = data.get('parameter')
-        value = data.get('value')
-        
-        try:
-            machine = Machine.objects.get(serial_number=serial_number)
-        except Machine.DoesNotExist:
-            return Response({'error': f'Machine with serial {serial_number} not found'}, status=status.HTTP_404_NOT_FOUND)
-        
-        telemetry = Telemetry.objects.create(
-            machine=machine,
-            parameter=parameter,
-            value=value
-        )
-        
-        rules = WarningRule.objects.filter(parameter=parameter)
-        triggered_warnings = []
-        
-        for rule in rules:
-            is_triggered = False
-            
-            if rule.comparison_operator == '>':
-                is_triggered = value > rule.threshold_value
-            elif rule.comparison_operator == '>=':
-                is_triggered = value >= rule.threshold_value
-            elif rule.comparison_operator == '<':
-                is_triggered = value < rule.threshold_value
-            elif rule.comparison_operator == '<=':
-                is_triggered = value <= rule.threshold_value
-            elif rule.comparison_operator == '==':
-                is_triggered = value == rule.threshold_value
-            elif rule.comparison_operator == '!=':
-                is_triggered = value != rule.threshold_value
-                
-            if is_triggered:
-                warning = Warning.objects.create(
-                    machine=machine,
-                    rule=rule,
-                    telemetry=telemetry,
-                    description=f"Warning: {parameter} {rule.comparison_operator} {rule.threshold_value} (Actual: {value})"
-                )
-                triggered_warnings.append(warning.id)
-                
-                if rule.severity == 'critical' and machine.status != 'critical':
-                    machine.status = 'critical'
-                elif rule.severity in ['high', 'medium'] and machine.status not in ['critical']:
-                    machine.status = 'warning'
-                
-                machine.save()
-        
+        result = ingest_samples([request.data])[0]
+    except Exception as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    if result['status'] == 'not_found':
+        return Response({'error': result['error']}, status=status.HTTP_404_NOT_FOUND)
+    if result['status'] == 'rate_limited':
+        return _rate_limited(Response({'error': result['error']}, status=status.HTTP_429_TOO_MANY_REQUESTS),
+                             result['retry_after'])
+    if result['status'] == 'duplicate':
         return Response({
-            'telemetry_id': telemetry.id,
-            'warnings_triggered': triggered_warnings
-        }, status=status.HTTP_201_CREATED)
-        
+            'telemetry_id': result['telemetry_id'],
+            'warnings_triggered': [],
+            'duplicate': True
+        }, status=status.HTTP_200_OK)
+    if result['status'] != 'created':
+        return Response({'error': result['errors']}, status=status.HTTP_400_BAD_REQUEST)
+    
+    return Response({
+        'telemetry_id': result['telemetry_id'],
+        'warnings_triggered': result['warnings_triggered']
+    }, status=status.HTTP_201_CREATED)
+
+@swagger_auto_schema(
+    method='post',
+    request_body=openapi.Schema(
+        type=openapi.TYPE_OBJECT,
+        required=['samples'],
+        properties={
+            'samples': openapi.Schema(
+                type=openapi.TYPE_ARRAY,
+                items=openapi.Schema(
+                    type=openapi.TYPE_OBJECT,
+                    properties={
+                        'serial_number': openapi.Schema(type=openapi.TYPE_STRING),
+                        'parameter': openapi.Schema(type=openapi.TYPE_STRING),
+                        'value': openapi.Schema(type=openapi.TYPE_NUMBER),
+                        'timestamp': openapi.Schema(type=openapi.TYPE_STRING, format=openapi.FORMAT_DATETIME,
+                                                    description="Device time; defaults to arrival time"),
+                        'idempotency_key': openapi.Schema(type=openapi.TYPE_STRING),
+                        'gateway_id': openapi.Schema(type=openapi.TYPE_STRING),
+                        'sequence': openapi.Schema(type=openapi.TYPE_INTEGER)
+                    }
+                )
+            ),
+            'idempotency_key': openapi.Schema(type=openapi.TYPE_STRING,
+                                              description="Batch key; sample N gets '<key>:N' unless it has its own"),
+            'gateway_id': openapi.Schema(type=openapi.TYPE_STRING,
+                                         description="Default gateway_id for samples carrying a sequence")
+        }
+    ),
+    operation_description="Receive a batch of telemetry samples. Accepts a JSON array, "
+                          "an object with a 'samples' array, or an application/x-ndjson body. "
+                          "Samples repeating an idempotency key (or gateway_id and sequence) that was "
+                          "already ingested are reported as 'duplicate' and not written again. "
+                          "Samples over the client's or their machine's rate limit are reported as "
+                          "'rate_limited' with a 'retry_after' in seconds.",
+    responses={
+        201: openapi.Response(
+            description="All samples saved (or duplicates of saved ones)",
+            schema=openapi.Schema(
+                type=openapi.TYPE_OBJECT,
+                properties={
+                    'created': openapi.Schema(type=openapi.TYPE_INTEGER),
+                    'duplicates': openapi.Schema(type=openapi.TYPE_INTEGER),
+                    'rate_limited': openapi.Schema(type=openapi.TYPE_INTEGER),
+                    'failed': openapi.Schema(type=openapi.TYPE_INTEGER),
+                    'results': openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Schema(type=openapi.TYPE_OBJECT))
+                }
+            )
+        ),
+        200: "Every sample was a duplicate - nothing written",
+        207: "Some samples were rejected - see per-item results",
+        400: "Invalid batch or no sample could be saved",
+        429: "Every sample was rate limited - see Retry-After"
+    }
+)
+@csrf_exempt
+@api_view(['POST'])
+@permission_classes([AllowAny])
+@parser_classes([JSONParser, NDJSONParser])
+def receive_telemetry_batch(request):
+    samples = request.data
+    batch = {}
+    if isinstance(samples, dict):
+        batch = samples
+        samples = batch.get('samples')
+    
+    if not isinstance(samples, list) or not samples:
+        return Response({'error': 'Expected a non-empty list of samples'}, status=status.HTTP_400_BAD_REQUEST)
+    samples = apply_batch_keys(samples, batch)
+    
+    max_size = settings.TELEMETRY_BATCH_MAX_SIZE
+    if len(samples) > max_size:
+        return Response({'error': f'Batch too large: {len(samples)} samples (max {max_size})'},
+                        status=status.HTTP_400_BAD_REQUEST)
+    
+    admitted, retry_after = admit_client(request, len(samples))
+    if not admitted:
+        return _rate_limited(Response({'error': 'Rate limit exceeded for client'}, status=status.HTTP_429_TOO_MANY_REQUESTS),
+                             retry_after)
+    
+    try:
+        results = ingest_samples(samples[:admitted])
     except Exception as e:
         return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    results.extend(limited_result(index, 'Rate limit exceeded for client', retry_after)
+                   for index in range(admitted, len(samples)))
+    
+    created = sum(1 for result in results if result['status'] == 'created')
+    duplicates = sum(1 for result in results if result['status'] == 'duplicate')
+    limited = [result['retry_after'] for result in results if result['status'] == 'rate_limited']
+    if created + duplicates == len(results):
+        response_status = status.HTTP_201_CREATED if created else status.HTTP_200_OK
+    elif created or duplicates:
+        response_status = status.HTTP_207_MULTI_STATUS
+    elif len(limited) == len(results):
+        response_status = status.HTTP_429_TOO_MANY_REQUESTS
+    else:
+        response_status = status.HTTP_400_BAD_REQUEST
+    
+    response = Response({
+        'created': created,
+        'duplicates': duplicates,
+        'rate_limited': len(limited),
+        'failed': len(results) - created - duplicates,
+        'results': results
+    }, status=response_status)
+    if limited:
+        _rate_limited(response, min(limited))
+    return response
+
+@csrf_exempt
+@require_POST
+async def receive_telemetry_async(request):
+    """
+    Accepts a sample, a list of samples or {"samples": [...]} and queues the
+    valid ones for the background writer, answering 202 with their sequence
+    ids. Answers 429 when the queue is full or the client is over its rate
+    limit; machine rate limits apply when the writer flushes. Outside ASGI
+    there is no event loop that outlives the request, so samples are written
+    synchronously.
+    """
+    try:
+        samples = json.loads(request.body)
+    except ValueError as e:
+        return JsonResponse({'error': f'Invalid JSON: {e}'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    batch = {}
+    if isinstance(samples, dict):
+        if 'samples' in samples:
+            batch = samples
+        samples = samples.get('samples', [samples])
+    if not isinstance(samples, list) or not samples:
+        return JsonResponse({'error': 'Expected a sample or a non-empty list of samples'},
+                            status=status.HTTP_400_BAD_REQUEST)
+    samples = apply_batch_keys(samples, batch)
+    
+    max_size = settings.TELEMETRY_BATCH_MAX_SIZE
+    if len(samples) > max_size:
+        return JsonResponse({'error': f'Batch too large: {len(samples)} samples (max {max_size})'},
+                            status=status.HTTP_400_BAD_REQUEST)
+    
+    admitted, retry_after = admit_client(request, len(samples), user=await request.auser())
+    if not admitted:
+        return _rate_limited(JsonResponse({'error': 'Rate limit exceeded for client'},
+                                          status=status.HTTP_429_TOO_MANY_REQUESTS), retry_after)
+    limited = [limited_result(index, 'Rate limit exceeded for client', retry_after)
+               for index in range(admitted, len(samples))]
+    
+    valid, invalid = validate_samples(samples[:admitted])
+    invalid.update((result['index'], result) for result in limited)
+    if not valid:
+        return JsonResponse({'error': 'No valid samples', 'rejected': list(invalid.values())},
+                            status=status.HTTP_400_BAD_REQUEST)
+    
+    validated = [data for _, data in valid]
+    
+    if not isinstance(request, ASGIRequest):
+        results = await sync_to_async(ingest_validated)(validated)
+        return JsonResponse({
+            'created': sum(1 for result in results if result['status'] == 'created'),
+            'results': results,
+            'rejected': list(invalid.values())
+        }, status=status.HTTP_201_CREATED)
+    
+    # Retries of samples this worker already wrote never reach the queue
+    keys = [sample_key(data) for data in validated]
+    known = recent_keys.get_many([key for key in keys if key])
+    duplicates = sum(1 for key in keys if key in known)
+    if duplicates:
+        validated = [data for data, key in zip(validated, keys) if key not in known]
+    if not validated:
+        return JsonResponse({'accepted': 0, 'duplicates': duplicates, 'rejected': list(invalid.values())},
+                            status=status.HTTP_200_OK)
+    
+    try:
+        sequences = telemetry_writer.submit(validated)
+    except QueueFull as e:
+        response = JsonResponse({'error': str(e)}, status=status.HTTP_429_TOO_MANY_REQUESTS)
+        response['Retry-After'] = '1'
+        return response
+    
+    return JsonResponse({
+        'accepted': len(sequences),
+        'duplicates': duplicates,
+        'sequence': sequences[-1],
+        'first_sequence': sequences[0],
+        'rejected': list(invalid.values())
+    }, status=status.HTTP_202_ACCEPTED)
+
+@swagger_auto_schema(
+    method='get',
+    operation_description="Get ingestion counters for this worker process",
+    responses={
+        200: openapi.Response(
+            description="Ingestion statistics",
+            schema=openapi.Schema(
+                type=openapi.TYPE_OBJECT,
+                properties={
+                    'machine_cache': openapi.Schema(type=openapi.TYPE_OBJECT),
+                    'async_writer': openapi.Schema(type=openapi.TYPE_OBJECT),
+                    'idempotency': openapi.Schema(type=openapi.TYPE_OBJECT),
+                    'rate_limits': openapi.Schema(type=openapi.TYPE_OBJECT),
+                    'events': openapi.Schema(type=openapi.TYPE_OBJECT)
+                }
+            )
+        )
+    }
+)
+@csrf_exempt
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def ingestion_stats(request):
+    return Response({
+        'machine_cache': machine_cache.stats(),
+        'async_writer': telemetry_writer.stats(),
+        'idempotency': recent_keys.stats(),
+        'rate_limits': rate_limiter.stats(),
+        'events': event_bus.stats()
+    })
+
+
+def _rate_limited(response, retry_after):
+    response['Retry-After'] = retry_after_header(retry_after)
+    return response
 
 @swagger_auto_schema(
     method='get',
@@ -496,12 +711,14 @@ def receive_telemetry(request):
                     }
                 )
             )
-        )
+        ),
+        304: "Not modified since the ETag given in If-None-Match"
     }
 )
 @csrf_exempt
 @api_view(['GET'])
 @permission_classes([AllowAny])
+@versioned(ROUTES_VERSION, TECHNICIANS_VERSION)
 def routes_list(request):
     routes = Route.objects.select_related('technician').all().order_by('date')
     
@@ -534,7 +751,17 @@ def routes_list(request):
 
 @swagger_auto_schema(
     method='get',
-    operation_description="Get all machines with their locations and status information",
+    operation_description="Get machines with their locations and status information, ordered by id. "
+                          "Passing 'after' or 'limit' switches to keyset pagination: the response becomes "
+                          "{'results': [...], 'next_after': <id or null>} and the next page is "
+                          "?after=<next_after>. Filters can be repeated to match any of several values.",
+    manual_parameters=[
+        openapi.Parameter('status', openapi.IN_QUERY, description="Filter by status (comma-separated or repeated)", type=openapi.TYPE_STRING),
+        openapi.Parameter('manufacturer', openapi.IN_QUERY, description="Filter by manufacturer", type=openapi.TYPE_STRING),
+        openapi.Parameter('model', openapi.IN_QUERY, description="Filter by model", type=openapi.TYPE_STRING),
+        openapi.Parameter('after', openapi.IN_QUERY, description="Return machines with id greater than this", type=openapi.TYPE_INTEGER),
+        openapi.Parameter('limit', openapi.IN_QUERY, description="Page size", type=openapi.TYPE_INTEGER),
+    ],
     responses={
         200: openapi.Response(
             description="List of machines",
@@ -550,39 +777,266 @@ def routes_list(request):
                         'model': openapi.Schema(type=openapi.TYPE_STRING),
                         'manufacturer': openapi.Schema(type=openapi.TYPE_STRING),
                         'active_warnings_count': openapi.Schema(type=openapi.TYPE_INTEGER),
+                        'current_readings': openapi.Schema(
+                            type=openapi.TYPE_OBJECT,
+                            description="Last known value, timestamp and sample count per parameter"
+                        ),
                         'location': openapi.Schema(type=openapi.TYPE_OBJECT, nullable=True),
                     }
                 )
             )
-        )
+        ),
+        304: "Not modified since the ETag given in If-None-Match",
+        400: "Invalid filter or pagination parameter"
     }
 )
 @csrf_exempt
 @api_view(['GET'])
 @permission_classes([AllowAny])
+@versioned(MACHINE_STATE_VERSION, READINGS_VERSION)
 def get_machines(request):
-    machines = Machine.objects.select_related('location').all()
-    data = []
+    machines = Machine.objects.all()
     
-    for machine in machines:
-        active_warnings_count = machine.warnings.filter(resolved_at=None).count()
-        data.append({
-            'id': machine.id,
-            'name': machine.name,
-            'status': machine.status,
-            'serial_number': machine.serial_number,
-            'model': machine.model,
-            'manufacturer': machine.manufacturer,
-            'active_warnings_count': active_warnings_count,
-            'location': {
-                'lat': float(machine.location.latitude) if machine.location else None,
-                'lng': float(machine.location.longitude) if machine.location else None,
-                'address': machine.location.address if machine.location else None,
-            } if machine.location else None
-        })
+    statuses = [value for param in request.GET.getlist('status') for value in param.split(',') if value]
+    if statuses:
+        unknown = set(statuses) - {choice for choice, _ in Machine.STATUS_CHOICES}
+        if unknown:
+            return Response({'error': f"Unknown status: {', '.join(sorted(unknown))}"}, status=status.HTTP_400_BAD_REQUEST)
+        machines = machines.filter(status__in=statuses)
+    for field in ('manufacturer', 'model'):
+        values = request.GET.getlist(field)
+        if values:
+            machines = machines.filter(**{f'{field}__in': values})
     
+    paginated = 'after' in request.GET or 'limit' in request.GET
+    if paginated:
+        try:
+            after = int(request.GET.get('after', 0))
+            limit = int(request.GET.get('limit', settings.MACHINES_PAGE_SIZE))
+        except ValueError:
+            return Response({'error': "'after' and 'limit' must be integers"}, status=status.HTTP_400_BAD_REQUEST)
+        if limit < 1:
+            return Response({'error': "'limit' must be positive"}, status=status.HTTP_400_BAD_REQUEST)
+        limit = min(limit, settings.MACHINES_PAGE_MAX_SIZE)
+    
+    # The join only reaches open warnings (the partial index), not the whole warning history
+    rows = machines.annotate(
+        open_warnings=FilteredRelation('warnings', condition=Q(warnings__resolved_at__isnull=True)),
+        active_warnings_count=Count('open_warnings'),
+    ).order_by('id').values(
+        'id', 'name', 'status', 'serial_number', 'model', 'manufacturer', 'active_warnings_count',
+        'location_id', 'location__latitude', 'location__longitude', 'location__address',
+    )
+    
+    if paginated:
+        # One row past the page tells whether there is a next one
+        rows = list(rows.filter(id__gt=after)[:limit + 1])
+        has_next = len(rows) > limit
+        rows = rows[:limit]
+        readings = current_readings([row['id'] for row in rows])
+    else:
+        rows = list(rows)
+        readings = current_readings(machines.values('id'))
+    
+    data = [{
+        'id': row['id'],
+        'name': row['name'],
+        'status': row['status'],
+        'serial_number': row['serial_number'],
+        'model': row['model'],
+        'manufacturer': row['manufacturer'],
+        'active_warnings_count': row['active_warnings_count'],
+        'current_readings': readings[row['id']],
+        'location': {
+            'lat': float(row['location__latitude']),
+            'lng': float(row['location__longitude']),
+            'address': row['location__address'],
+        } if row['location_id'] else None
+    } for row in rows]
+    
+    if paginated:
+        return Response({'results': data, 'next_after': rows[-1]['id'] if has_next else None})
     return Response(data)
 
+def _parse_query_datetime(value, name):
+    try:
+        parsed = parse_datetime(value)
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise ValueError(f"'{name}' must be an ISO 8601 datetime")
+    if timezone.is_naive(parsed):
+        parsed = parsed.replace(tzinfo=dt_timezone.utc)
+    return parsed
+
+@swagger_auto_schema(
+    method='get',
+    operation_description="Get the history of one machine parameter, downsampled server-side with LTTB. "
+                          "Short ranges are read from raw telemetry, longer ones from 1m/1h/1d rollups.",
+    manual_parameters=[
+        openapi.Parameter('parameter', openapi.IN_QUERY, description="Parameter name", type=openapi.TYPE_STRING, required=True),
+        openapi.Parameter('from', openapi.IN_QUERY, description="Range start, ISO 8601 (default: 24 hours before 'to')", type=openapi.TYPE_STRING),
+        openapi.Parameter('to', openapi.IN_QUERY, description="Range end, ISO 8601 (default: now)", type=openapi.TYPE_STRING),
+        openapi.Parameter('points', openapi.IN_QUERY, description="Maximum number of points returned", type=openapi.TYPE_INTEGER)
+    ],
+    responses={
+        200: openapi.Response(
+            description="Downsampled series",
+            schema=openapi.Schema(
+                type=openapi.TYPE_OBJECT,
+                properties={
+                    'machine_id': openapi.Schema(type=openapi.TYPE_INTEGER),
+                    'parameter': openapi.Schema(type=openapi.TYPE_STRING),
+                    'from': openapi.Schema(type=openapi.TYPE_STRING, format='date-time'),
+                    'to': openapi.Schema(type=openapi.TYPE_STRING, format='date-time'),
+                    'source': openapi.Schema(type=openapi.TYPE_STRING, description="raw, 1m, 1h or 1d"),
+                    'total': openapi.Schema(type=openapi.TYPE_INTEGER, description="Samples or buckets in the range"),
+                    'downsampled': openapi.Schema(type=openapi.TYPE_BOOLEAN),
+                    'points': openapi.Schema(
+                        type=openapi.TYPE_ARRAY,
+                        items=openapi.Schema(type=openapi.TYPE_OBJECT),
+                        description="timestamp and value; rollup points also carry min, max and count"
+                    )
+                }
+            )
+        ),
+        400: "Invalid query parameters",
+        404: "Machine not found"
+    }
+)
+@csrf_exempt
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def machine_telemetry(request, machine_id):
+    if not Machine.objects.filter(id=machine_id).exists():
+        return Response({'error': 'Machine not found'}, status=status.HTTP_404_NOT_FOUND)
+    
+    parameter = request.query_params.get('parameter')
+    if not parameter:
+        return Response({'error': "'parameter' is required"}, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        end = _parse_query_datetime(request.query_params['to'], 'to') if 'to' in request.query_params else timezone.now()
+        start = (_parse_query_datetime(request.query_params['from'], 'from') if 'from' in request.query_params
+                 else end - timedelta(hours=24))
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    if start >= end:
+        return Response({'error': "'from' must be before 'to'"}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        points = int(request.query_params.get('points', settings.TELEMETRY_HISTORY_DEFAULT_POINTS))
+    except ValueError:
+        points = 0
+    if not 2 <= points <= settings.TELEMETRY_HISTORY_MAX_POINTS:
+        return Response(
+            {'error': f"'points' must be between 2 and {settings.TELEMETRY_HISTORY_MAX_POINTS}"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    series = load_series(machine_id, parameter, start, end, points)
+    return Response({
+        'machine_id': machine_id,
+        'parameter': parameter,
+        'from': start,
+        'to': end,
+        **series
+    })
+
+@require_GET
+async def live_events(request):
+    """
+    Server-Sent Events stream of warning_opened, warning_resolved and
+    machine_status_changed events. ``?types=`` narrows it to a comma-separated
+    list of event types. Resumes after ``Last-Event-ID`` (or
+    ``?last_event_id=``) from the replay buffer.
+
+    Outside ASGI a response cannot stay open without holding a worker
+    thread, so only the events buffered since Last-Event-ID are sent and
+    the client reconnects after the advertised retry delay.
+    """
+    types = set(filter(None, request.GET.get('types', '').split(','))) or None
+    if types and not types <= set(EVENT_TYPES):
+        return JsonResponse({'error': f"Unknown event types: {', '.join(sorted(types - set(EVENT_TYPES)))}"},
+                            status=status.HTTP_400_BAD_REQUEST)
+    last_event_id = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        return JsonResponse({'error': 'Last-Event-ID must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    retry = f'retry: {settings.EVENTS_RETRY_MS}\n\n'
+    if not isinstance(request, ASGIRequest):
+        # Without a resume point, start the client from the current event
+        if last_event_id is None:
+            frames = [id_frame(event_bus.last_id)]
+        else:
+            frames = event_bus.replay(last_event_id, types)
+        response = StreamingHttpResponse([retry, *frames], content_type='text/event-stream')
+    else:
+        queue = asyncio.Queue(maxsize=settings.EVENTS_SUBSCRIBER_QUEUE_SIZE)
+        subscription, backlog = event_bus.subscribe(asyncio.get_running_loop(), queue, last_event_id, types)
+        
+        async def stream():
+            sent = last_event_id or 0
+            try:
+                yield retry
+                for frame in backlog:
+                    sent = frame_id(frame)
+                    yield frame
+                while not subscription.overflowed:
+                    try:
+                        frame = await asyncio.wait_for(queue.get(), settings.EVENTS_HEARTBEAT_INTERVAL)
+                    except asyncio.TimeoutError:
+                        yield ': keep-alive\n\n'
+                        continue
+                    if frame_id(frame) > sent:
+                        sent = frame_id(frame)
+                        yield frame
+            finally:
+                event_bus.unsubscribe(subscription)
+        
+        response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+@csrf_exempt
+@require_GET
+def export_telemetry(request):
+    """
+    Streams telemetry as CSV (default) or NDJSON, optionally gzip-compressed
+    (gzip=1). Filters: machine (id, repeatable), parameter (repeatable),
+    from and to (ISO 8601). A plain Django view: DRF would treat ?format= as
+    a renderer override.
+    """
+    export_format = request.GET.get('format', 'csv')
+    if export_format not in FORMATS:
+        return JsonResponse({'error': f"'format' must be one of: {', '.join(FORMATS)}"},
+                            status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        machine_ids = [int(machine_id) for machine_id in request.GET.getlist('machine')]
+        start = _parse_query_datetime(request.GET['from'], 'from') if 'from' in request.GET else None
+        end = _parse_query_datetime(request.GET['to'], 'to') if 'to' in request.GET else None
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    rows = export_rows(machine_ids=machine_ids, parameters=request.GET.getlist('parameter'), start=start, end=end)
+    chunks = ENCODERS[export_format](rows)
+    content_type = f'{FORMATS[export_format]}; charset=utf-8'
+    filename = f'telemetry.{export_format}'
+    
+    if request.GET.get('gzip') in ('1', 'true'):
+        chunks = gzip_stream(chunks)
+        content_type = 'application/gzip'
+        filename += '.gz'
+    if isinstance(request, ASGIRequest):
+        chunks = async_chunks(chunks)
+    response = StreamingHttpResponse(chunks, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
 @swagger_auto_schema(
     method='post',
     operation_description="Create a new service route from optimized data",
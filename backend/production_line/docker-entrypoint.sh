@@ -13,5 +13,6 @@ python manage.py collectstatic --noinput
 echo "Loading test data..."
 python manage.py load_test_data
 
-echo "Starting Django server..."
-python manage.py runserver 0.0.0.0:8000
+echo "Starting Django server (ASGI)..."
+# ASGI, so queued ingestion and live event streams work and the telemetry writer is flushed on shutdown
+exec uvicorn production_line.asgi:application --host 0.0.0.0 --port 8000 --lifespan on
@@ -13,4 +13,22 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'production_line.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from collector.async_writer import telemetry_writer  # noqa: E402  (needs the app registry)
+
+
+async def application(scope, receive, send):
+    # Django ignores the lifespan protocol, so handle it here to flush the
+    # buffered telemetry writer before the server exits.
+    if scope['type'] != 'lifespan':
+        return await django_application(scope, receive, send)
+
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await telemetry_writer.stop()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
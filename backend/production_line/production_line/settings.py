@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 
 from pathlib import Path
 import os
+import json
 import dj_database_url
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -74,6 +75,16 @@ DATABASES = {
     'default': dj_database_url.config(default=os.environ.get('DATABASE_URL'))
 }
 
+# Cache
+# Version stamps used to invalidate in-process caches live here, so
+# multi-worker deployments must point this at a shared backend (e.g. Redis).
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', ''),
+    }
+}
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -140,3 +151,94 @@ REDOC_SETTINGS = {
 }
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Telemetry ingestion
+TELEMETRY_BATCH_MAX_SIZE = int(os.environ.get('TELEMETRY_BATCH_MAX_SIZE', 10000))
+RULE_ENGINE_VERSION_CHECK_INTERVAL = float(os.environ.get('RULE_ENGINE_VERSION_CHECK_INTERVAL', 1.0))
+RULE_WINDOW_CHECKPOINT_INTERVAL = float(os.environ.get('RULE_WINDOW_CHECKPOINT_INTERVAL', 30.0))
+RULE_WINDOW_MAX_SAMPLES = int(os.environ.get('RULE_WINDOW_MAX_SAMPLES', 10000))
+MACHINE_CACHE_SIZE = int(os.environ.get('MACHINE_CACHE_SIZE', 50000))
+MACHINE_CACHE_NEGATIVE_TTL = float(os.environ.get('MACHINE_CACHE_NEGATIVE_TTL', 60.0))
+MACHINE_CACHE_VERSION_CHECK_INTERVAL = float(os.environ.get('MACHINE_CACHE_VERSION_CHECK_INTERVAL', 1.0))
+TELEMETRY_QUEUE_SIZE = int(os.environ.get('TELEMETRY_QUEUE_SIZE', 50000))
+TELEMETRY_FLUSH_BATCH_SIZE = int(os.environ.get('TELEMETRY_FLUSH_BATCH_SIZE', 500))
+TELEMETRY_FLUSH_INTERVAL = float(os.environ.get('TELEMETRY_FLUSH_INTERVAL', 0.2))
+TELEMETRY_COPY_THRESHOLD = int(os.environ.get('TELEMETRY_COPY_THRESHOLD', 1000))
+TELEMETRY_EXPORT_CHUNK_SIZE = int(os.environ.get('TELEMETRY_EXPORT_CHUNK_SIZE', 5000))
+# Device timestamps: samples up to TELEMETRY_LATENESS_WINDOW seconds old still go through warning rules
+# (older ones are stored and rolled up only); timestamps further than the clock skew in the future are rejected
+TELEMETRY_LATENESS_WINDOW = float(os.environ.get('TELEMETRY_LATENESS_WINDOW', 3600))
+TELEMETRY_MAX_CLOCK_SKEW = float(os.environ.get('TELEMETRY_MAX_CLOCK_SKEW', 300))
+# Idempotency keys remembered in memory per worker, and how long they are kept in the database
+TELEMETRY_IDEMPOTENCY_CACHE_SIZE = int(os.environ.get('TELEMETRY_IDEMPOTENCY_CACHE_SIZE', 100000))
+TELEMETRY_IDEMPOTENCY_WINDOW_HOURS = float(os.environ.get('TELEMETRY_IDEMPOTENCY_WINDOW_HOURS', 24))
+# Rate limiting: token buckets of `burst` samples refilled at `rate` samples/s per machine and per API client.
+# Machine limits per model as JSON, e.g. TELEMETRY_MACHINE_MODEL_RATE_LIMITS='{"Model X": {"rate": 10, "burst": 50}}'.
+# Backend 'local' keeps buckets per worker; 'cache' shares approximate limits through the default cache.
+TELEMETRY_RATE_LIMIT_ENABLED = os.environ.get('TELEMETRY_RATE_LIMIT_ENABLED', 'True') == 'True'
+TELEMETRY_RATE_LIMIT_BACKEND = os.environ.get('TELEMETRY_RATE_LIMIT_BACKEND', 'local')
+TELEMETRY_RATE_LIMITS = {
+    'machine': {
+        'rate': float(os.environ.get('TELEMETRY_MACHINE_RATE', 100)),
+        'burst': int(os.environ.get('TELEMETRY_MACHINE_BURST', 1000)),
+    },
+    'client': {
+        'rate': float(os.environ.get('TELEMETRY_CLIENT_RATE', 5000)),
+        'burst': int(os.environ.get('TELEMETRY_CLIENT_BURST', 20000)),
+    },
+}
+TELEMETRY_MACHINE_MODEL_RATE_LIMITS = json.loads(os.environ.get('TELEMETRY_MACHINE_MODEL_RATE_LIMITS', '{}'))
+TELEMETRY_RATE_LIMIT_MAX_BUCKETS = int(os.environ.get('TELEMETRY_RATE_LIMIT_MAX_BUCKETS', 100000))
+# Addresses (comma-separated) whose X-Gateway-Id header is trusted to tell clients behind them apart
+TELEMETRY_TRUSTED_GATEWAY_ADDRESSES = [
+    address.strip() for address in os.environ.get('TELEMETRY_TRUSTED_GATEWAY_ADDRESSES', '').split(',') if address.strip()
+]
+
+# Live events (Server-Sent Events): events kept for Last-Event-ID resume, per-stream queue length,
+# keep-alive comment interval (seconds) and the reconnect delay suggested to clients (milliseconds)
+EVENTS_BUFFER_SIZE = int(os.environ.get('EVENTS_BUFFER_SIZE', 1000))
+EVENTS_SUBSCRIBER_QUEUE_SIZE = int(os.environ.get('EVENTS_SUBSCRIBER_QUEUE_SIZE', 1000))
+EVENTS_HEARTBEAT_INTERVAL = float(os.environ.get('EVENTS_HEARTBEAT_INTERVAL', 15.0))
+EVENTS_RETRY_MS = int(os.environ.get('EVENTS_RETRY_MS', 3000))
+
+# Telemetry partitioning (PostgreSQL only)
+TELEMETRY_PARTITION_INTERVAL = os.environ.get('TELEMETRY_PARTITION_INTERVAL', 'daily')  # 'daily' or 'weekly'
+TELEMETRY_PARTITIONS_AHEAD = int(os.environ.get('TELEMETRY_PARTITIONS_AHEAD', 7))
+TELEMETRY_PARTITION_RETENTION_DAYS = int(os.environ['TELEMETRY_PARTITION_RETENTION_DAYS']) if os.environ.get('TELEMETRY_PARTITION_RETENTION_DAYS') else None
+
+# Telemetry retention: days to keep per tier ('raw' telemetry and each rollup resolution), None keeps forever.
+# Per-parameter overrides as JSON, e.g. TELEMETRY_RETENTION_OVERRIDES='{"vibration": {"raw": 7, "1m": 14}}'
+TELEMETRY_RETENTION_DAYS = {
+    'raw': int(os.environ.get('TELEMETRY_RAW_RETENTION_DAYS', 14)),
+    '1m': int(os.environ.get('TELEMETRY_1M_RETENTION_DAYS', 30)),
+    '1h': int(os.environ.get('TELEMETRY_1H_RETENTION_DAYS', 730)),
+    '1d': None,
+}
+TELEMETRY_RETENTION_OVERRIDES = json.loads(os.environ.get('TELEMETRY_RETENTION_OVERRIDES', '{}'))
+
+# Machine listing: page size for keyset pagination (?after=&limit=) and its upper bound
+MACHINES_PAGE_SIZE = int(os.environ.get('MACHINES_PAGE_SIZE', 100))
+MACHINES_PAGE_MAX_SIZE = int(os.environ.get('MACHINES_PAGE_MAX_SIZE', 1000))
+
+# Dashboard: active warnings per page, and how long its template fragments are cached. Fragments are keyed
+# on the machine state version, so the timeout only bounds how stale readings and occurrence counts get.
+DASHBOARD_WARNINGS_PAGE_SIZE = int(os.environ.get('DASHBOARD_WARNINGS_PAGE_SIZE', 50))
+DASHBOARD_CACHE_TIMEOUT = int(os.environ.get('DASHBOARD_CACHE_TIMEOUT', 15))
+
+# Route details payload (without readings) cached per route version, in seconds; 0 disables
+ROUTE_DETAILS_CACHE_TIMEOUT = int(os.environ.get('ROUTE_DETAILS_CACHE_TIMEOUT', 300))
+
+# Read API responses (machines, routes, route details) cached under the data versions their ETags come
+# from, in seconds; 0 disables and only answers conditional GETs
+API_RESPONSE_CACHE_TIMEOUT = int(os.environ.get('API_RESPONSE_CACHE_TIMEOUT', 0))
+# How old (seconds) current readings in those responses may get before their ETag changes; 0 follows every
+# ingested batch, which under continuous telemetry leaves nearly no request to answer with 304
+API_READINGS_MAX_AGE = int(os.environ.get('API_READINGS_MAX_AGE', 30))
+
+# Telemetry history API: ranges up to TELEMETRY_HISTORY_RAW_MAX_HOURS read raw rows, longer ones (or ones holding
+# more samples than points * TELEMETRY_HISTORY_OVERSAMPLING) the finest rollup resolution yielding at most that
+# many buckets; LTTB reduces the rest
+TELEMETRY_HISTORY_DEFAULT_POINTS = int(os.environ.get('TELEMETRY_HISTORY_DEFAULT_POINTS', 1000))
+TELEMETRY_HISTORY_MAX_POINTS = int(os.environ.get('TELEMETRY_HISTORY_MAX_POINTS', 10000))
+TELEMETRY_HISTORY_RAW_MAX_HOURS = float(os.environ.get('TELEMETRY_HISTORY_RAW_MAX_HOURS', 6))
+TELEMETRY_HISTORY_OVERSAMPLING = int(os.environ.get('TELEMETRY_HISTORY_OVERSAMPLING', 10))